@@ -61,9 +61,7 @@ class TransferOrbitComp(om.ExplicitComponent):
         self.add_output('vp', val=0.0, desc='periapsis velocity', units='km/s')
         self.add_output('va', val=0.0, desc='apoapsis velocity', units='km/s')
 
-        # We're going to be lazy and ask OpenMDAO to approximate our
-        # partials with finite differencing here.
-        self.declare_partials(of='*', wrt='*', method='fd')
+        self.declare_partials(of='*', wrt='*')
 
     def compute(self, inputs, outputs):
         mu = inputs['mu']
@@ -77,6 +75,30 @@ class TransferOrbitComp(om.ExplicitComponent):
 
         outputs['vp'] = h / rp
         outputs['va'] = h / ra
+
+    def compute_partials(self, inputs, partials):
+        mu = inputs['mu']
+        rp = inputs['rp']
+        ra = inputs['ra']
+
+        # p = a * (1 - e**2) simplifies to 2 * ra * rp / (ra + rp)
+        p = 2.0 * ra * rp / (ra + rp)
+        h = np.sqrt(mu * p)
+
+        dp_drp = 2.0 * ra ** 2 / (ra + rp) ** 2
+        dp_dra = 2.0 * rp ** 2 / (ra + rp) ** 2
+
+        dh_dmu = 0.5 * p / h
+        dh_drp = 0.5 * mu / h * dp_drp
+        dh_dra = 0.5 * mu / h * dp_dra
+
+        partials['vp', 'mu'] = dh_dmu / rp
+        partials['vp', 'rp'] = dh_drp / rp - h / rp ** 2
+        partials['vp', 'ra'] = dh_dra / rp
+
+        partials['va', 'mu'] = dh_dmu / ra
+        partials['va', 'rp'] = dh_drp / ra
+        partials['va', 'ra'] = dh_dra / ra - h / ra ** 2
         
 
 class DeltaVComp(om.ExplicitComponent):
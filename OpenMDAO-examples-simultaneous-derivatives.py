@@ -1,6 +1,8 @@
 import numpy as np
 import openmdao.api as om
 
+from coloring_cache import TotalColoringCache
+
 SIZE = 10
 
 p = om.Problem()
@@ -61,6 +63,10 @@ p.model.add_objective('circle.area', ref=-1)
 
 p.setup(mode='fwd')
 
+# reuse the total coloring from a previous run if the model structure and SIZE match
+coloring_cache = TotalColoringCache(p, 'circle_packing', extra={'SIZE': SIZE})
+coloring_cache.load()
+
 # the following were randomly generated using np.random.random(10)*2-1 to randomly
 # disperse them within a unit circle centered at the origin.
 p.set_val('x', np.array([ 0.55994437, -0.95923447,  0.21798656, -0.02158783,  0.62183717,
@@ -71,4 +77,6 @@ p.set_val('r', .7)
 
 p.run_driver()
 
+coloring_cache.store()
+
 print(p['circle.area'])
\ No newline at end of file
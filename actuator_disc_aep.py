@@ -0,0 +1,208 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+
+
+HOURS_PER_YEAR = 8760.0
+
+
+class ActuatorDisc(om.ExplicitComponent):
+    """Simple wind turbine model based on actuator disc theory, evaluated at num_nodes
+    upstream velocities at once"""
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        # Inputs
+        self.add_input('a', 0.5 * np.ones(nn), desc="Induced Velocity Factor")
+        self.add_input('Area', 10.0, units="m**2", desc="Rotor disc area")
+        self.add_input('rho', 1.225, units="kg/m**3", desc="air density")
+        self.add_input('Vu', 10.0 * np.ones(nn), units="m/s",
+                       desc="Freestream air velocity, upstream of rotor")
+
+        # Outputs
+        self.add_output('Vr', np.zeros(nn), units="m/s",
+                        desc="Air velocity at rotor exit plane")
+        self.add_output('Vd', np.zeros(nn), units="m/s",
+                        desc="Slipstream air velocity, downstream of rotor")
+        self.add_output('Ct', np.zeros(nn), desc="Thrust Coefficient")
+        self.add_output('thrust', np.zeros(nn), units="N",
+                        desc="Thrust produced by the rotor")
+        self.add_output('Cp', np.zeros(nn), desc="Power Coefficient")
+        self.add_output('power', np.zeros(nn), units="W", desc="Power produced by the rotor")
+
+        ar = np.arange(nn)
+        zeros = np.zeros(nn, dtype=int)
+
+        # Every output depends on `a`, node by node
+        self.declare_partials(of='*', wrt='a', rows=ar, cols=ar)
+
+        # Other dependencies
+        self.declare_partials(of=['Vr', 'Vd'], wrt='Vu', rows=ar, cols=ar)
+        self.declare_partials(of=['thrust', 'power'], wrt='Vu', rows=ar, cols=ar)
+
+        # Area and rho are shared by all nodes, so their partials are a single column
+        self.declare_partials(of=['thrust', 'power'], wrt=['Area', 'rho'], rows=ar, cols=zeros)
+
+    def compute(self, inputs, outputs):
+        """ Considering the entire rotor as a single disc that extracts
+        velocity uniformly from the incoming flow and converts it to
+        power."""
+
+        a = inputs['a']
+        Vu = inputs['Vu']
+
+        qA = .5 * inputs['rho'] * inputs['Area'] * Vu ** 2
+
+        outputs['Vd'] = Vd = Vu * (1 - 2 * a)
+        outputs['Vr'] = .5 * (Vu + Vd)
+
+        outputs['Ct'] = Ct = 4 * a * (1 - a)
+        outputs['thrust'] = Ct * qA
+
+        outputs['Cp'] = Cp = Ct * (1 - a)
+        outputs['power'] = Cp * qA * Vu
+
+    def compute_partials(self, inputs, partials):
+        a = inputs['a']
+        Vu = inputs['Vu']
+        rho = inputs['rho']
+        Area = inputs['Area']
+
+        qA = .5 * rho * Area * Vu ** 2
+        Ct = 4 * a * (1 - a)
+        Cp = Ct * (1 - a)
+        dCt_da = 4 - 8 * a
+        dCp_da = 4 * (1 - a) * (1 - 3 * a)
+
+        partials['Vr', 'a'] = -Vu
+        partials['Vr', 'Vu'] = 1 - a
+
+        partials['Vd', 'a'] = -2 * Vu
+        partials['Vd', 'Vu'] = 1 - 2 * a
+
+        partials['Ct', 'a'] = dCt_da
+        partials['Cp', 'a'] = dCp_da
+
+        partials['thrust', 'a'] = dCt_da * qA
+        partials['thrust', 'Vu'] = Ct * rho * Area * Vu
+        partials['thrust', 'rho'] = Ct * .5 * Area * Vu ** 2
+        partials['thrust', 'Area'] = Ct * .5 * rho * Vu ** 2
+
+        partials['power', 'a'] = dCp_da * qA * Vu
+        partials['power', 'Vu'] = Cp * 1.5 * rho * Area * Vu ** 2
+        partials['power', 'rho'] = Cp * .5 * Area * Vu ** 3
+        partials['power', 'Area'] = Cp * .5 * rho * Vu ** 3
+
+
+class AEPComp(om.ExplicitComponent):
+    """Annual energy production from the power in each wind speed bin and the
+    probability of that bin"""
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_input('power', np.zeros(nn), units="W", desc="Power produced in each wind bin")
+        self.add_input('bin_prob', np.ones(nn) / nn, desc="Probability of each wind bin")
+
+        self.add_output('AEP', 0.0, units="W*h", desc="Annual energy production")
+
+        self.declare_partials('AEP', ['power', 'bin_prob'])
+
+    def compute(self, inputs, outputs):
+        outputs['AEP'] = HOURS_PER_YEAR * np.dot(inputs['bin_prob'], inputs['power'])
+
+    def compute_partials(self, inputs, partials):
+        partials['AEP', 'power'] = HOURS_PER_YEAR * inputs['bin_prob']
+        partials['AEP', 'bin_prob'] = HOURS_PER_YEAR * inputs['power']
+
+
+def weibull_bins(k, c, v_min=0.0, v_max=30.0, num_bins=100):
+    """
+    Bin a Weibull wind speed distribution.
+
+    Parameters
+    ----------
+    k : float
+        Weibull shape factor.
+    c : float
+        Weibull scale factor in m/s.
+    v_min : float
+        Lower edge of the first bin in m/s.
+    v_max : float
+        Upper edge of the last bin in m/s.
+    num_bins : int
+        Number of bins.
+
+    Returns
+    -------
+    tuple of ndarray
+        Bin center speeds (m/s) and bin probabilities.
+    """
+    edges = np.linspace(v_min, v_max, num_bins + 1)
+    cdf = 1.0 - np.exp(-(edges / c) ** k)
+    return .5 * (edges[:-1] + edges[1:]), np.diff(cdf)
+
+
+class AEPGroup(om.Group):
+    """Actuator disc evaluated over num_nodes wind bins with a single induction factor,
+    integrated into annual energy production"""
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_subsystem('a_disk', ActuatorDisc(num_nodes=nn),
+                           promotes_inputs=['Area', 'rho', 'Vu'])
+
+        # A single `a` drives every bin
+        self.promotes('a_disk', inputs=['a'], src_indices=np.zeros(nn, dtype=int), src_shape=(1,))
+
+        self.add_subsystem('aep', AEPComp(num_nodes=nn), promotes_inputs=['bin_prob'],
+                           promotes_outputs=['AEP'])
+        self.connect('a_disk.power', 'aep.power')
+
+        self.set_input_defaults('a', 0.5)
+
+
+if __name__ == '__main__':
+
+    Vu, bin_prob = weibull_bins(k=2.0, c=8.0, num_bins=100)
+    nn = Vu.size
+
+    prob = om.Problem()
+    prob.model.add_subsystem('farm', AEPGroup(num_nodes=nn), promotes=['*'])
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+
+    prob.model.add_design_var('a', lower=0., upper=1.)
+
+    # negative ref so we maximize the objective
+    prob.model.add_objective('AEP', ref=-1e6)
+
+    prob.setup()
+
+    prob.set_val('a', .5)
+    prob.set_val('Area', 10.0, units='m**2')
+    prob.set_val('rho', 1.225, units='kg/m**3')
+    prob.set_val('Vu', Vu, units='m/s')
+    prob.set_val('bin_prob', bin_prob)
+
+    st = time.time()
+    fail = prob.run_driver()
+    print('time', time.time() - st)
+
+    print('AEP (MW*h):', prob.get_val('AEP', units='MW*h'))
+    print('a:', prob.get_val('a'))
+    # Betz limit: optimum at a = 1/3 for every bin
+    print('Cp:', prob.get_val('a_disk.Cp')[0])
@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+
+from vehicle_timeseries import Motor, PowerSplitter, FuelCell, BatterySoC, Battery, TotalMass, \
+    drive_cycle
+
+
+class BranchingBattery(Battery):
+    """
+    Battery that raises when the C-rate limit is exceeded, like the original test4.py.
+    """
+    def compute(self, inputs, outputs):
+        super().compute(inputs, outputs)
+        tolerance = 1e-14
+        if np.any(outputs['P_margin'] > tolerance):
+            raise ValueError('Battery power exceeds maximum power allowed by C-rate')
+
+
+def build_sizing_problem(battery_class=Battery, num_nodes=1, constraint=None):
+    """
+    The battery sizing problem of test4.py: minimize mass over E_capacity_batt.
+
+    Parameters
+    ----------
+    battery_class : class
+        Battery or BranchingBattery.
+    num_nodes : int
+        Number of time steps of the drive cycle.
+    constraint : str or None
+        'P_margin' (every step), 'P_margin_KS' (aggregated) or None for no power-limit
+        constraint.
+    """
+    nn = num_nodes
+    prob = om.Problem()
+    model = prob.model
+
+    ivc = model.add_subsystem('ivc', om.IndepVarComp(), promotes=['*'])
+    ivc.add_output('SoC_initial', val=1.0)
+    ivc.add_output('P_req_shaft', val=100 * np.ones(nn), units='W')
+    ivc.add_output('dt', val=np.ones(nn), units='s')
+    ivc.add_output('x', val=0.7)
+    ivc.add_output('E_capacity_batt', val=60*3600, units='J')
+    ivc.add_output('C_rate_batt', val=1.0)
+    ivc.add_output('P_fuelcell_rated', val=400.0, units='W')
+
+    model.add_subsystem('motor', Motor(num_nodes=nn))
+    model.add_subsystem('powersplitter', PowerSplitter(num_nodes=nn))
+    model.add_subsystem('fuelcell', FuelCell(num_nodes=nn))
+    model.add_subsystem('soc', BatterySoC(num_nodes=nn))
+    model.add_subsystem('battery', battery_class(num_nodes=nn))
+    model.add_subsystem('total_mass', TotalMass())
+
+    model.connect('P_req_shaft', 'motor.P_req_shaft')
+    model.connect('motor.P_in', 'powersplitter.P_out')
+    model.connect('x', 'powersplitter.x')
+    model.connect('powersplitter.P_fuelcell', 'fuelcell.P_fc')
+    model.connect('powersplitter.P_battery', ['soc.P_batt', 'battery.P_batt'])
+    model.connect('SoC_initial', 'soc.SoC_initial')
+    model.connect('dt', 'soc.dt')
+    model.connect('soc.SoC', 'battery.SoC')
+    model.connect('E_capacity_batt', ['soc.E_capacity_batt', 'battery.E_capacity_batt'])
+    model.connect('C_rate_batt', 'battery.C_rate_batt')
+    model.connect('P_fuelcell_rated', 'total_mass.P_fuelcell')
+    model.connect('battery.E_in_battery', 'total_mass.E_battery')
+
+    # 1 to 100 Wh, scaled to order one; in J the gradient is too small for SLSQP to move.
+    model.add_design_var('E_capacity_batt', lower=1*60*60, upper=100*60*60, ref=50*3600)
+    model.add_objective('total_mass.mass_total')
+    model.add_constraint('fuelcell.P_fuelcell', upper=400.0)
+    if constraint is not None:
+        model.add_constraint('battery.' + constraint, upper=0.0, ref=100.0)
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+    prob.driver.options['maxiter'] = 1000
+    prob.driver.options['tol'] = 1e-6
+    prob.driver.options['disp'] = False
+
+    return prob
+
+
+def run_case(label, prob, P_req_shaft=None):
+    prob.setup()
+    if P_req_shaft is not None:
+        prob.set_val('P_req_shaft', P_req_shaft, units='W')
+
+    st = time.time()
+    try:
+        prob.run_driver()
+        outcome = 'success' if prob.driver.result.success else 'not converged'
+    except ValueError as err:
+        outcome = 'failed: %s' % err
+    elapsed = time.time() - st
+
+    print('%-32s %4d iterations %5d model evals %8.4f s  E = %7.3f Wh  mass = %.3f kg  '
+          'max P_margin = %8.3f W  %s' %
+          (label, prob.driver.iter_count, prob.model.iter_count, elapsed,
+           prob.get_val('E_capacity_batt', units='W*h')[0],
+           prob.get_val('total_mass.mass_total', units='kg')[0],
+           prob.get_val('battery.P_margin', units='W').max(), outcome))
+
+
+if __name__ == '__main__':
+
+    # Single time step, as in test4.py. The optimum sits on the C-rate limit, so the
+    # branching battery raises as soon as SLSQP steps across it.
+    run_case('branching, no constraint', build_sizing_problem(BranchingBattery))
+    run_case('smooth P_margin constraint', build_sizing_problem(constraint='P_margin'))
+
+    # A full drive cycle: one constraint per step, or a single aggregated one.
+    nn = 2000
+    P_req_shaft, _ = drive_cycle(nn)
+    run_case('P_margin, %d steps' % nn,
+             build_sizing_problem(num_nodes=nn, constraint='P_margin'), P_req_shaft)
+    run_case('P_margin_KS, %d steps' % nn,
+             build_sizing_problem(num_nodes=nn, constraint='P_margin_KS'), P_req_shaft)
@@ -0,0 +1,435 @@
+import argparse
+import ast
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import openmdao
+import openmdao.api as om
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PHASES = ('setup', 'run_model', 'compute_totals', 'run_driver')
+COUNTS = ('model_evals', 'linearizations')
+
+
+def load_script(filename):
+    """
+    Imports, classes and functions of an example script, without running its module-level
+    code (most of them build and run a Problem when executed).
+
+    Returns
+    -------
+    dict
+        Namespace of the definitions.
+    """
+    path = os.path.join(HERE, filename)
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+
+    body = [node for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom, ast.ClassDef, ast.FunctionDef))]
+    namespace = {'__name__': 'benchmark_' + os.path.splitext(filename)[0].replace('-', '_')}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, 'exec'), namespace)
+    return namespace
+
+
+def _scipy_driver(prob, optimizer='SLSQP', **options):
+    prob.driver = om.ScipyOptimizeDriver(optimizer=optimizer, disp=False, **options)
+
+
+# Every benchmark returns a Problem that is set up and has its initial values.
+
+def _paraboloid():
+    Paraboloid = load_script('n2-paraboloid.py')['Paraboloid']
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('parab', Paraboloid(), promotes_inputs=['x', 'y'])
+    prob.model.add_subsystem('const', om.ExecComp('g = x + y'), promotes_inputs=['x', 'y'])
+    prob.model.set_input_defaults('x', 3.0)
+    prob.model.set_input_defaults('y', -4.0)
+
+    _scipy_driver(prob, 'COBYLA')
+    prob.model.add_design_var('x', lower=-50, upper=50)
+    prob.model.add_design_var('y', lower=-50, upper=50)
+    prob.model.add_objective('parab.f_xy')
+    prob.model.add_constraint('const.g', lower=0, upper=10.)
+    prob.setup()
+    return prob
+
+
+def _sellar():
+    SellarMDAConnect = load_script('OpenMDAO-basic-userguide-5.py')['SellarMDAConnect']
+
+    prob = om.Problem(SellarMDAConnect(), reports=False)
+    # The starting z is below its lower bound, as in the user guide; don't warn every run.
+    _scipy_driver(prob, tol=1e-8, invalid_desvar_behavior='ignore')
+    prob.model.add_design_var('x', lower=0, upper=10)
+    prob.model.add_design_var('z', lower=0, upper=10)
+    prob.model.add_objective('obj_cmp.obj')
+    prob.model.add_constraint('con_cmp1.con1', upper=0)
+    prob.model.add_constraint('con_cmp2.con2', upper=0)
+    prob.setup()
+
+    prob.set_val('x', 2.0)
+    prob.set_val('z', [-1., -1.])
+    return prob
+
+
+def _circuit():
+    Circuit = load_script('OpenMDAO-advanced-userguide-2.py')['Circuit']
+
+    prob = om.Problem(reports=False)
+    model = prob.model
+    model.add_subsystem('ground', om.IndepVarComp('V', 0., units='V'))
+    model.add_subsystem('batt', om.IndepVarComp('V', 1.5, units='V'))
+    bal = model.add_subsystem('batt_balance', om.BalanceComp())
+    bal.add_balance('I', units='A', eq_units='V')
+    model.add_subsystem('circuit', Circuit())
+    model.add_subsystem('batt_deltaV', om.ExecComp('dV = V1 - V2', V1={'units': 'V'},
+                                                   V2={'units': 'V'}, dV={'units': 'V'}))
+    model.connect('batt_balance.I', 'circuit.I_in')
+    model.connect('ground.V', ['circuit.Vg', 'batt_deltaV.V2'])
+    model.connect('circuit.n1.V', 'batt_deltaV.V1')
+    model.connect('batt.V', 'batt_balance.rhs:I')
+    model.connect('batt_deltaV.dV', 'batt_balance.lhs:I')
+    prob.setup()
+
+    model.circuit.nonlinear_solver = om.NonlinearRunOnce()
+    model.circuit.linear_solver = om.LinearRunOnce()
+    newton = model.nonlinear_solver = om.NewtonSolver(solve_subsystems=True, maxiter=20)
+    newton.linesearch = om.ArmijoGoldsteinLS(maxiter=10)
+    model.linear_solver = om.DirectSolver()
+
+    prob['circuit.n1.V'] = 9.8
+    prob['circuit.n2.V'] = .7
+    return prob
+
+
+def _cantilever():
+    from openmdao.test_suite.test_examples.beam_optimization.beam_group import BeamGroup
+
+    prob = om.Problem(BeamGroup(E=1., L=1., b=0.1, volume=0.01, num_elements=50), reports=False)
+    _scipy_driver(prob, tol=1e-9)
+    prob.setup()
+    return prob
+
+
+def _hohmann():
+    from hohmann_porkchop import HohmannGroup
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('hohmann', HohmannGroup(num_nodes=1), promotes=['*'])
+    _scipy_driver(prob)
+    prob.model.add_design_var('dinc1', lower=0, upper=28.5)
+    prob.model.add_objective('delta_v_mean')
+    prob.setup()
+    return prob
+
+
+def _actuator_disc():
+    from actuator_disc_aep import AEPGroup, weibull_bins
+
+    Vu, bin_prob = weibull_bins(k=2.0, c=8.0, num_bins=100)
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('farm', AEPGroup(num_nodes=Vu.size), promotes=['*'])
+    _scipy_driver(prob)
+    prob.model.add_design_var('a', lower=0., upper=1.)
+    prob.model.add_objective('AEP', ref=-1e6)
+    prob.setup()
+
+    prob.set_val('a', .5)
+    prob.set_val('Area', 10.0, units='m**2')
+    prob.set_val('rho', 1.225, units='kg/m**3')
+    prob.set_val('Vu', Vu, units='m/s')
+    prob.set_val('bin_prob', bin_prob)
+    return prob
+
+
+def _circle_packing():
+    from circle_packing import build_circle_packing, set_initial_values
+
+    prob = build_circle_packing(SIZE=10)
+    prob.driver.options['disp'] = False
+    prob.setup(mode='fwd')
+    set_initial_values(prob, SIZE=10)
+    return prob
+
+
+def _vehicle():
+    from vehicle_carpet_sweep import build_sizing_problem
+    from vehicle_timeseries import drive_cycle
+
+    P_req_shaft, dt = drive_cycle(200)
+    prob = build_sizing_problem(num_nodes=P_req_shaft.size)
+    prob.set_val('P_req_shaft', P_req_shaft, units='W')
+    prob.set_val('dt', dt, units='s')
+    return prob
+
+
+BENCHMARKS = {
+    'paraboloid': _paraboloid,
+    'sellar': _sellar,
+    'circuit': _circuit,
+    'cantilever': _cantilever,
+    'hohmann': _hohmann,
+    'actuator_disc': _actuator_disc,
+    'circle_packing': _circle_packing,
+    'vehicle': _vehicle,
+}
+
+
+class _Counter(object):
+    """
+    Counts the calls of a method on one instance.
+    """
+
+    def __init__(self, owner, attr):
+        self.count = 0
+        orig = getattr(owner, attr)
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            return orig(*args, **kwargs)
+
+        setattr(owner, attr, counted)
+
+
+def run_once(name):
+    """
+    Time the phases of one benchmark, with the model evaluations and linearizations of
+    every phase.
+    """
+    times = {}
+    counts = {}
+
+    st = time.perf_counter()
+    prob = BENCHMARKS[name]()
+    prob.final_setup()
+    times['setup'] = time.perf_counter() - st
+    prob.set_solver_print(level=-1)
+
+    evals = _Counter(prob.model, '_solve_nonlinear')
+    lins = _Counter(prob.model, '_linearize')
+    has_driver = bool(prob.driver._designvars) and bool(prob.driver._responses)
+
+    for phase in PHASES[1:]:
+        if phase != 'run_model' and not has_driver:
+            times[phase] = None
+            counts[phase] = None
+            continue
+        evals.count = lins.count = 0
+        st = time.perf_counter()
+        if phase == 'run_model':
+            prob.run_model()
+        elif phase == 'compute_totals':
+            prob.compute_totals()
+        else:
+            prob.run_driver()
+        times[phase] = time.perf_counter() - st
+        counts[phase] = {'model_evals': evals.count, 'linearizations': lins.count}
+
+    return times, counts
+
+
+def _fresh(name):
+    prob = BENCHMARKS[name]()
+    prob.final_setup()
+    prob.set_solver_print(level=-1)
+    return prob
+
+
+def time_phase(name, phase, min_total=0.2, min_calls=5):
+    """
+    Best time of one call of a phase, out of as many calls as fit in min_total seconds and
+    at least min_calls. Background load only ever adds time, so the best call is the one
+    that comes closest to the time of the code itself; the median of a few runs still
+    moves by tens of percent on a busy machine.
+
+    setup and run_driver create or move the Problem, so each of their calls gets a fresh
+    one, built outside the timing. run_model always starts from the initial values.
+    """
+    if phase in ('run_model', 'compute_totals'):
+        prob = _fresh(name)
+        initial = prob.model._outputs.asarray().copy()
+        prob.run_model()
+
+    total = 0.
+    best = np.inf
+    calls = 0
+    while calls < min_calls or total < min_total:
+        if phase == 'setup':
+            st = time.perf_counter()
+            BENCHMARKS[name]().final_setup()
+        elif phase == 'run_driver':
+            prob = _fresh(name)
+            st = time.perf_counter()
+            prob.run_driver()
+        elif phase == 'run_model':
+            prob.model._outputs.set_val(initial)
+            st = time.perf_counter()
+            prob.run_model()
+        else:
+            st = time.perf_counter()
+            prob.compute_totals()
+        elapsed = time.perf_counter() - st
+        total += elapsed
+        calls += 1
+        best = min(best, elapsed)
+
+    return best
+
+
+def run_benchmark(name):
+    """
+    Result of one benchmark without the times: the evaluation counts of one run and the
+    peak traced memory of another. The phases that can be timed are set to inf, None the
+    others.
+    """
+    times, counts = run_once(name)
+
+    # tracemalloc slows everything down, so memory is measured separately.
+    tracemalloc.start()
+    try:
+        run_once(name)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = {phase: None if times[phase] is None else np.inf for phase in PHASES}
+    for phase in PHASES[1:]:
+        for key in COUNTS:
+            result['%s.%s' % (phase, key)] = counts[phase][key] if counts[phase] else None
+    result['peak_mb'] = peak / 2**20
+    return result
+
+
+def run_all(names=None, repeat=5, outfile='benchmark_results.json', min_total=0.2):
+    """
+    Run the benchmarks (all of them if names is None) and write the results as JSON.
+
+    The time of a phase is its best time (see time_phase) over repeat rounds. Every round
+    goes through all benchmarks, so the rounds of a phase are spread over the whole run
+    and a slow spell of the machine, which can last tens of seconds, only hits some of
+    them.
+    """
+    names = names or list(BENCHMARKS)
+    results = {name: run_benchmark(name) for name in names}
+    for _ in range(repeat):
+        for name in names:
+            r = results[name]
+            for phase in PHASES:
+                if r[phase] is not None:
+                    r[phase] = min(r[phase], time_phase(name, phase, min_total))
+
+    for name in names:
+        r = results[name]
+        print('%-15s ' % name + '  '.join('%s %s' % (phase, '-' if r[phase] is None else
+                                                     '%.4f s' % r[phase]) for phase in PHASES) +
+              '  peak %.1f MB' % r['peak_mb'])
+
+    data = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                     'python': platform.python_version(),
+                     'openmdao': openmdao.__version__,
+                     'numpy': np.__version__,
+                     'machine': platform.platform(),
+                     'repeat': repeat,
+                     'min_total': min_total,
+                     'hash_seed': os.environ.get('PYTHONHASHSEED')},
+            'results': results}
+    with open(outfile, 'w') as f:
+        json.dump(data, f, indent=2)
+    return data
+
+
+def compare(baseline, results, threshold=0.25, min_time=5e-3):
+    """
+    Regressions of results against baseline, both as written by run_all.
+
+    A phase regresses when it is more than threshold (relative) and min_time (absolute)
+    slower, peak memory when it grew by more than threshold. Evaluation counts are
+    deterministic, so any increase is reported.
+
+    Even best times of phases of a few milliseconds vary by tens of percent between runs on
+    a busy machine, so slowdowns smaller than min_time are left to the evaluation counts.
+
+    Returns
+    -------
+    list of str
+    """
+    regressions = []
+    base_results = baseline['results']
+    for name, new in results['results'].items():
+        base = base_results.get(name)
+        if base is None:
+            continue
+        for phase in PHASES:
+            old_t, new_t = base.get(phase), new.get(phase)
+            if old_t is None or new_t is None:
+                continue
+            if new_t > old_t * (1 + threshold) and new_t - old_t > min_time:
+                regressions.append('%s %s: %.4f s -> %.4f s (+%.0f%%)' %
+                                   (name, phase, old_t, new_t, 100 * (new_t / old_t - 1)))
+        for key in new:
+            if key.endswith(COUNTS) and base.get(key) is not None and new[key] is not None \
+                    and new[key] > base[key]:
+                regressions.append('%s %s: %d -> %d' % (name, key, base[key], new[key]))
+        if new['peak_mb'] > base['peak_mb'] * (1 + threshold):
+            regressions.append('%s peak memory: %.1f MB -> %.1f MB' %
+                               (name, base['peak_mb'], new['peak_mb']))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the example models')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='run benchmarks and write the results')
+    run_parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    run_parser.add_argument('-o', '--outfile', default='benchmark_results.json')
+    run_parser.add_argument('-r', '--repeat', type=int, default=5)
+    run_parser.add_argument('-m', '--min-total', type=float, default=0.2,
+                            help='seconds each phase is repeated for in every round')
+
+    cmp_parser = sub.add_parser('compare', help='compare results against a baseline')
+    cmp_parser.add_argument('baseline')
+    cmp_parser.add_argument('results')
+    cmp_parser.add_argument('-t', '--threshold', type=float, default=0.25)
+    cmp_parser.add_argument('--min-time', type=float, default=5e-3,
+                            help='smallest slowdown in seconds that counts')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        unknown = sorted(set(args.names) - set(BENCHMARKS))
+        if unknown:
+            parser.error('unknown benchmarks %s, choose from %s' % (unknown, list(BENCHMARKS)))
+        # Some of the models do more or less work depending on the iteration order of sets
+        # of names, so the string hashes are fixed for runs that are compared.
+        if os.environ.get('PYTHONHASHSEED') is None:
+            os.environ['PYTHONHASHSEED'] = '0'
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        # The builders imported from other modules create Problems with the default reports.
+        os.environ['OPENMDAO_REPORTS'] = '0'
+        run_all(args.names, args.repeat, args.outfile, args.min_total)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.results) as f:
+            results = json.load(f)
+        if baseline['meta']['machine'] != results['meta']['machine']:
+            print('Warning: baseline from %s, results from %s' %
+                  (baseline['meta']['machine'], results['meta']['machine']))
+        regressions = compare(baseline, results, args.threshold, args.min_time)
+        for line in regressions:
+            print('REGRESSION', line)
+        print('%d regressions' % len(regressions))
+        sys.exit(1 if regressions else 0)
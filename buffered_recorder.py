@@ -0,0 +1,337 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import weakref
+
+import numpy as np
+import openmdao.api as om
+
+
+# Recorders that may still hold buffered iterations, flushed at interpreter exit. The set
+# holds weak references, so it does not keep recorders alive.
+_RECORDERS = weakref.WeakSet()
+
+
+def _flush_all():
+    for recorder in list(_RECORDERS):
+        recorder.flush()
+
+
+atexit.register(_flush_all)
+
+
+def _json_template(shape):
+    """
+    %-format template of the JSON of an array of the given shape, one %r per entry.
+    """
+    if not shape:
+        return '%r'
+    return '[' + ', '.join([_json_template(shape[1:])] * shape[0]) + ']'
+
+
+class BufferedSqliteRecorder(om.SqliteRecorder):
+    """
+    SqliteRecorder that writes driver iterations from a background thread.
+
+    record_iteration_driver only copies the values into a preallocated ring buffer of
+    `capacity` rows. A writer thread with its own SQLite connection converts full batches
+    to JSON and inserts them with executemany in a single transaction. When the buffer is
+    full the driver waits for the writer, so memory use is bounded by capacity. Pending
+    rows are written by flush(), shutdown() and at interpreter exit.
+
+    The database has the same layout as with SqliteRecorder, so CaseReader reads it as usual.
+    Other record types (system, solver, problem, derivatives) are written directly, after
+    the buffered iterations, so the cases stay in execution order.
+    """
+
+    def __init__(self, filepath, capacity=1024, batch_size=256, **kwargs):
+        super().__init__(filepath, **kwargs)
+        self.capacity = capacity
+        self.batch_size = batch_size
+
+        self._layout = None
+        self._head = 0      # next row to write into
+        self._count = 0     # rows waiting for the writer
+        self._cond = threading.Condition()
+        self._writing = 0   # rows being written by the writer
+        self._stop = False
+        self._flushing = False
+        self._error = None
+        self._thread = None
+        _RECORDERS.add(self)
+
+    def _allocate(self, data):
+        """
+        Lay out the ring buffer for the variables of the first case.
+
+        Every kind gets its variable names, a template of its JSON text with a %r per
+        entry, and a block of the buffer. Returns False if the data can not be stored as
+        flat float arrays.
+        """
+        layout = {}
+        for kind in ('input', 'output', 'residual'):
+            vals = data.get(kind)
+            if vals is None:
+                layout[kind] = None
+                continue
+            size = 0
+            items = []
+            for name, val in vals.items():
+                val = np.asarray(val)
+                if val.dtype.kind not in 'fiub':
+                    return False
+                size += val.size
+                items.append('%s: %s' % (json.dumps(name).replace('%', '%%'),
+                                         _json_template(val.shape)))
+            layout[kind] = (tuple(vals), '{' + ', '.join(items) + '}',
+                            np.zeros((self.capacity, size)))
+
+        self._layout = layout
+        self._meta = [None] * self.capacity
+        return True
+
+    def _fits_layout(self, data):
+        for kind, spec in self._layout.items():
+            vals = data.get(kind)
+            if (vals is None) != (spec is None):
+                return False
+            if spec is not None and tuple(vals) != spec[0]:
+                return False
+        return True
+
+    def _start_writer(self):
+        self._thread = threading.Thread(target=self._writer, name='BufferedSqliteRecorder',
+                                        daemon=True)
+        self._thread.start()
+
+    def record_iteration_driver(self, driver, data, metadata):
+        if self.connection is None:
+            return
+
+        if self._layout is None and not self._allocate(data):
+            self._layout = False
+        if self._layout is False or not self._fits_layout(data):
+            # Values that do not fit the buffer (discrete variables, a changed set of
+            # variables) are written directly, after everything already buffered.
+            self.flush()
+            super().record_iteration_driver(driver, data, metadata)
+            return
+
+        if self._thread is None:
+            self._start_writer()
+
+        with self._cond:
+            while self._count + self._writing >= self.capacity and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+
+            row = self._head
+            for kind, spec in self._layout.items():
+                if spec is not None and spec[0]:
+                    spec[2][row] = np.concatenate(list(data[kind].values()), axis=None)
+            self._meta[row] = (self._counter, self._iteration_coordinate, metadata['timestamp'],
+                               metadata['success'], metadata['msg'], driver._get_name())
+
+            self._head = (row + 1) % self.capacity
+            self._count += 1
+            if self._count >= self.batch_size:
+                self._cond.notify_all()
+
+    def record_iteration_problem(self, problem, data, metadata):
+        self.flush()
+        super().record_iteration_problem(problem, data, metadata)
+
+    def record_iteration_system(self, system, data, metadata):
+        self.flush()
+        super().record_iteration_system(system, data, metadata)
+
+    def record_iteration_solver(self, solver, data, metadata):
+        self.flush()
+        super().record_iteration_solver(solver, data, metadata)
+
+    def record_derivatives_driver(self, recording_requester, data, metadata):
+        self.flush()
+        super().record_derivatives_driver(recording_requester, data, metadata)
+
+    def _to_json(self, kind, rows):
+        """
+        JSON texts of the values of kind in the given buffer rows.
+        """
+        spec = self._layout[kind]
+        if spec is None:
+            return ['null'] * len(rows)
+        _, template, buf = spec
+        block = buf[rows]
+        texts = []
+        for vals, finite in zip(block.tolist(), np.isfinite(block).all(axis=1)):
+            if finite:
+                texts.append(template % tuple(vals))
+            else:
+                # JSON spells inf and nan differently than repr.
+                texts.append(template.replace('%r', '%s') % tuple(map(json.dumps, vals)))
+        return texts
+
+    def _writer(self):
+        conn = sqlite3.connect(self._filepath, timeout=60.)
+        try:
+            while True:
+                with self._cond:
+                    while self._count < self.batch_size and not self._stop and \
+                            not (self._count and self._flushing):
+                        self._cond.wait()
+                    if self._count == 0 and self._stop:
+                        return
+                    n = self._count
+                    first = (self._head - n) % self.capacity
+                    self._count = 0
+                    self._writing = n
+
+                # The rows being written are not reused until _writing is reset.
+                rows = (first + np.arange(n)) % self.capacity
+                inputs = self._to_json('input', rows)
+                outputs = self._to_json('output', rows)
+                residuals = self._to_json('residual', rows)
+
+                with conn:
+                    # Read the next id here rather than once: iterations that did not fit
+                    # the buffer were inserted through the main connection in between.
+                    next_id = (conn.execute('SELECT MAX(id) FROM driver_iterations')
+                               .fetchone()[0] or 0) + 1
+                    records, sources = [], []
+                    for k, row in enumerate(rows.tolist()):
+                        counter, coord, timestamp, success, msg, source = self._meta[row]
+                        records.append((next_id + k, counter, coord, timestamp, success, msg,
+                                        inputs[k], outputs[k], residuals[k]))
+                        sources.append(('driver', next_id + k, source))
+                    conn.executemany('INSERT INTO driver_iterations(id, counter, '
+                                     'iteration_coordinate, timestamp, success, msg, inputs, '
+                                     'outputs, residuals) VALUES(?,?,?,?,?,?,?,?,?)', records)
+                    conn.executemany('INSERT INTO global_iterations(record_type, rowid, source) '
+                                     'VALUES(?,?,?)', sources)
+
+                with self._cond:
+                    self._writing = 0
+                    self._cond.notify_all()
+        except Exception as err:
+            with self._cond:
+                self._error = err
+                self._cond.notify_all()
+        finally:
+            conn.close()
+
+    def flush(self):
+        """
+        Block until every buffered iteration is in the database.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            if self._error is not None:
+                raise self._error
+            return
+
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while (self._count or self._writing) and self._error is None:
+                self._cond.wait()
+            self._flushing = False
+
+        if self._error is not None:
+            raise self._error
+
+    def shutdown(self):
+        """
+        Write everything that is buffered, stop the writer and close the database.
+        """
+        if self._thread is not None:
+            with self._cond:
+                self._stop = True
+                self._cond.notify_all()
+            self._thread.join()
+            self._thread = None
+        _RECORDERS.discard(self)
+        super().shutdown()
+
+        if self._error is not None:
+            raise self._error
+
+
+def _paraboloid_problem():
+    prob = om.Problem()
+    prob.model.add_subsystem('paraboloid', om.ExecComp('f = (x-3)**2 + x*y + (y+4)**2 - 3'),
+                             promotes=['*'])
+    prob.model.add_design_var('x', lower=-50, upper=50)
+    prob.model.add_design_var('y', lower=-50, upper=50)
+    prob.model.add_objective('f')
+    return prob
+
+
+def _sellar_problem():
+    from openmdao.test_suite.components.sellar import SellarDerivatives
+
+    prob = om.Problem(SellarDerivatives())
+    prob.model.nonlinear_solver = om.NonlinearBlockGS(iprint=0)
+    prob.model.add_design_var('z', lower=np.array([-10.0, 0.0]), upper=np.array([10.0, 10.0]))
+    prob.model.add_design_var('x', lower=0.0, upper=10.0)
+    prob.model.add_objective('obj')
+    prob.model.add_constraint('con1', upper=0.0)
+    prob.model.add_constraint('con2', upper=0.0)
+    return prob
+
+
+class _NullRecorder(om.SqliteRecorder):
+    """
+    Recorder that stores no iterations: the cost of collecting the values in the driver,
+    which no recorder can avoid.
+    """
+    def record_iteration_driver(self, driver, data, metadata):
+        pass
+
+
+def _time_doe(build, recorder, levels):
+    prob = build()
+    prob.driver = om.DOEDriver(om.FullFactorialGenerator(levels=levels))
+    if recorder is not None:
+        prob.driver.add_recorder(recorder)
+    prob.setup()
+
+    st = time.perf_counter()
+    prob.run_driver()
+    prob.cleanup()
+    return time.perf_counter() - st
+
+
+if __name__ == '__main__':
+
+    for label, build, levels in (('Paraboloid', _paraboloid_problem, 100),
+                                 ('Sellar', _sellar_problem, 12)):
+        # Best of three runs each, the machine noise is larger than the effect otherwise.
+        times = {}
+        recorders = {}
+        for key, make in (('none', lambda: None),
+                          ('collect', lambda: _NullRecorder('bench_null.sql')),
+                          ('plain', lambda: om.SqliteRecorder('bench_plain.sql')),
+                          ('buffered', lambda: BufferedSqliteRecorder('bench_buffered.sql'))):
+            times[key] = np.inf
+            for _ in range(3):
+                recorders[key] = make()
+                times[key] = min(times[key], _time_doe(build, recorders[key], levels))
+
+        # OpenMDAO 3.35 and later put the files in the output directory of the Problem.
+        cases = {}
+        for key in ('plain', 'buffered'):
+            cr = om.CaseReader(recorders[key]._filepath)
+            cases[key] = [cr.get_case(c) for c in cr.list_cases('driver', out_stream=None)]
+        same = all(a.name == b.name and
+                   all(np.array_equal(a.outputs[n], b.outputs[n]) for n in a.outputs)
+                   for a, b in zip(cases['plain'], cases['buffered']))
+        same = same and len(cases['plain']) == len(cases['buffered'])
+
+        base = times['none']
+        print('%-10s %6d cases: no recorder %.3f s, collecting the values only +%.1f%%, '
+              'SqliteRecorder +%.1f%%, buffered +%.1f%%, same cases: %s' %
+              (label, len(cases['buffered']), base,
+               *[100 * (times[key] - base) / base for key in ('collect', 'plain', 'buffered')],
+               same))
@@ -0,0 +1,208 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from case_stream import CaseStream
+
+
+MANIFEST = 'manifest.json'
+
+
+def _read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _column_file(name):
+    return name.replace(os.sep, '_').replace(':', '_') + '.f8'
+
+
+class ColumnWriter(object):
+    """
+    Appends cases to a columnar layout: one raw float64 file per variable, holding a
+    (num_cases, *shape) C-ordered array, plus the case counters in 'counter.i8'.
+
+    manifest.json records the shape of every variable and the number of complete cases.
+    It is rewritten (atomically) only after the data files are flushed, so readers never
+    see a partially written case and a crashed export can be resumed.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest = _read_manifest(out_dir) or {'num_cases': 0, 'last_counter': None,
+                                                    'variables': {}}
+        self._files = {}
+
+        # Drop anything written after the last complete case, including the columns of a
+        # run that crashed before its first commit, which the manifest does not list.
+        n = self.manifest['num_cases']
+        self._truncate('counter.i8', n * 8)
+        for name, meta in self.manifest['variables'].items():
+            self._truncate(meta['file'], n * 8 * int(np.prod(meta['shape'])))
+        listed = {meta['file'] for meta in self.manifest['variables'].values()}
+        for fname in os.listdir(out_dir):
+            if fname.endswith('.f8') and fname not in listed:
+                os.remove(os.path.join(out_dir, fname))
+
+    def _truncate(self, fname, nbytes):
+        path = os.path.join(self.out_dir, fname)
+        if os.path.isfile(path) and os.path.getsize(path) > nbytes:
+            with open(path, 'r+b') as f:
+                f.truncate(nbytes)
+
+    def _file(self, fname):
+        f = self._files.get(fname)
+        if f is None:
+            f = self._files[fname] = open(os.path.join(self.out_dir, fname), 'ab')
+        return f
+
+    def append(self, counter, vals):
+        """
+        Append one case.
+
+        Parameters
+        ----------
+        counter : int
+            Case counter.
+        vals : dict
+            {name: array_like}. Every case must have the same variables with the same shapes.
+        """
+        variables = self.manifest['variables']
+        if not variables and self.manifest['num_cases'] == 0:
+            for name, val in vals.items():
+                variables[name] = {'file': _column_file(name), 'shape': list(np.shape(val))}
+        elif set(vals) != set(variables):
+            raise ValueError('Case %d has variables %s, expected %s' %
+                             (counter, sorted(vals), sorted(variables)))
+
+        for name, val in vals.items():
+            val = np.asarray(val, dtype=np.float64)
+            if list(val.shape) != variables[name]['shape']:
+                raise ValueError("Case %d: '%s' has shape %s, expected %s" %
+                                 (counter, name, val.shape, tuple(variables[name]['shape'])))
+            self._file(variables[name]['file']).write(val.tobytes())
+
+        self._file('counter.i8').write(np.int64(counter).tobytes())
+        self.manifest['num_cases'] += 1
+        self.manifest['last_counter'] = int(counter)
+
+    def commit(self):
+        """
+        Flush the data files and publish the new cases in the manifest.
+        """
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        _write_manifest(self.out_dir, self.manifest)
+
+    def close(self):
+        self.commit()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def export_cases(filename, out_dir, variables=None, record_type='driver', source=None,
+                 commit_every=10000):
+    """
+    Export recorded cases to a columnar directory, appending only cases not exported yet.
+
+    Can be called repeatedly while the recording run is still going.
+
+    Parameters
+    ----------
+    filename : str
+        SqliteRecorder file.
+    out_dir : str
+        Output directory.
+    variables : list of str or None
+        Promoted or absolute names; all outputs of the first case if None. Must be the same
+        on every call for one out_dir.
+    record_type : str
+        'driver', 'system', 'solver' or 'problem'.
+    source : str or None
+        Only export cases recorded by this source.
+    commit_every : int
+        Cases between manifest updates.
+
+    Returns
+    -------
+    int
+        Number of cases appended.
+    """
+    writer = ColumnWriter(out_dir)
+    last = writer.manifest['last_counter']
+
+    with CaseStream(filename) as stream:
+        if variables is None:
+            variables = list(writer.manifest['variables']) or stream.recorded_variables(record_type)
+
+        counters = None if last is None else (last + 1, None)
+        n = 0
+        for counter, _, vals in stream.iter_cases(variables, record_type=record_type,
+                                                  counters=counters, source=source):
+            missing = [name for name, val in vals.items() if val is None]
+            if missing:
+                raise ValueError('Case %d has no value for %s' % (counter, missing))
+            writer.append(counter, vals)
+            n += 1
+            if n % commit_every == 0:
+                writer.commit()
+
+    writer.close()
+    return n
+
+
+def load_columns(out_dir):
+    """
+    Memory-map every variable of a columnar export, without copying.
+
+    Returns
+    -------
+    dict
+        {name: np.memmap of shape (num_cases, *shape)}, plus 'counter'.
+    """
+    manifest = _read_manifest(out_dir)
+    n = manifest['num_cases']
+
+    def _map(fname, dtype, shape):
+        if n == 0:
+            return np.zeros((0,) + tuple(shape), dtype=dtype)
+        return np.memmap(os.path.join(out_dir, fname), dtype=dtype, mode='r',
+                         shape=(n,) + tuple(shape))
+
+    columns = {'counter': _map('counter.i8', np.int64, ())}
+    for name, meta in manifest['variables'].items():
+        columns[name] = _map(meta['file'], np.float64, meta['shape'])
+    return columns
+
+
+if __name__ == '__main__':
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'cases.sql'
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(filename)[0] + '_columns'
+    record_type = sys.argv[3] if len(sys.argv) > 3 else 'driver'
+
+    st = time.time()
+    n = export_cases(filename, out_dir, record_type=record_type)
+    print('Appended %d cases to %s in %.3f s' % (n, out_dir, time.time() - st))
+
+    st = time.time()
+    columns = load_columns(out_dir)
+    print('Mapped %d variables in %.6f s' % (len(columns) - 1, time.time() - st))
+    for name, col in columns.items():
+        print('  %-30s %s' % (name, col.shape))
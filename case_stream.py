@@ -0,0 +1,270 @@
+import json
+import pickle
+import sqlite3
+import sys
+import zlib
+
+import numpy as np
+
+
+# Recorder tables by their record_type in global_iterations, with the column naming each
+# case and the columns holding values.
+_TABLES = {
+    'driver': ('driver_iterations', 'iteration_coordinate', ('outputs', 'inputs')),
+    'system': ('system_iterations', 'iteration_coordinate', ('outputs', 'inputs')),
+    'solver': ('solver_iterations', 'iteration_coordinate', ('solver_output', 'solver_inputs')),
+    'problem': ('problem_cases', 'case_name', ('outputs', 'inputs')),
+}
+
+
+def _load_blob(blob):
+    """
+    Metadata blobs are zlib-compressed JSON in recent recorder formats, pickles in older ones.
+    """
+    if blob is None:
+        return {}
+    try:
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+    except (zlib.error, UnicodeDecodeError, ValueError):
+        return pickle.loads(blob)
+
+
+def _decode(val):
+    """
+    Value of one variable as returned by json_extract (JSON text or a bare number).
+    """
+    if val is None:
+        return None
+    if isinstance(val, (bytes, str)):
+        val = json.loads(val)
+    return np.atleast_1d(np.asarray(val, dtype=float))
+
+
+class CaseStream(object):
+    """
+    Lazy, column-selective reader for SqliteRecorder files.
+
+    Unlike CaseReader, nothing is loaded up front and no Case objects are made: cases are
+    yielded one at a time from a cursor, with only the requested variables extracted
+    inside SQLite (json_extract), and counter range and source filters applied in the
+    WHERE clause. Memory use depends on the number of requested values per case, not on
+    the size of the file.
+
+    Usage::
+
+        stream = CaseStream('cases.sql')
+        for counter, coord, vals in stream.iter_cases(['obj_cmp.obj', 'z'], counters=(10, 500)):
+            ...
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._conn = sqlite3.connect('file:%s?mode=ro' % filename, uri=True)
+
+        row = self._conn.execute('SELECT format_version, abs2prom, prom2abs, conns '
+                                 'FROM metadata').fetchone()
+        self.format_version = row[0]
+        self._abs2prom = _load_blob(row[1])
+        self._prom2abs = _load_blob(row[2])
+        self._conns = _load_blob(row[3])
+
+        try:
+            self._conn.execute('''SELECT json_extract('{"a": 1}', '$.a')''').fetchone()
+            self._has_json = True
+        except sqlite3.OperationalError:
+            self._has_json = False
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _abs_names(self, name):
+        """
+        Absolute names a promoted or absolute variable name may be recorded under.
+
+        Outputs come first; an input is also looked up under the output it is connected to.
+        """
+        names = []
+        for io in ('output', 'input'):
+            names.extend(self._prom2abs.get(io, {}).get(name, []))
+        if not names:
+            names.append(name)
+        for abs_name in list(names):
+            src = self._conns.get(abs_name)
+            if src is not None and src not in names:
+                names.append(src)
+        return names
+
+    def sources(self, record_type='driver'):
+        """
+        Sources that recorded cases of record_type, with their number of cases.
+        """
+        return dict(self._conn.execute('SELECT source, COUNT(*) FROM global_iterations '
+                                       'WHERE record_type = ? GROUP BY source', (record_type,)))
+
+    def recorded_variables(self, record_type='driver'):
+        """
+        Promoted names of the outputs recorded in the first case of record_type, which
+        iter_cases accepts.
+        """
+        table, _, columns = _TABLES[record_type]
+        if not self._has_json:
+            row = self._conn.execute('SELECT %s FROM %s ORDER BY id LIMIT 1' %
+                                     (columns[0], table)).fetchone()
+            keys = list(self._decode_columns(row)) if row else []
+        else:
+            keys = [key for key, in self._conn.execute(
+                'SELECT j.key FROM %s t, json_each(t.%s) j WHERE t.id = (SELECT MIN(id) FROM %s)'
+                % (table, columns[0], table))]
+
+        return [self._promoted_output(key) for key in keys]
+
+    def _promoted_output(self, abs_name):
+        """
+        Promoted name of a recorded output. Auto-IVC outputs (design vars without an
+        IndepVarComp) get the promoted name of an input they are connected to.
+        """
+        prom = self._abs2prom.get('output', {}).get(abs_name, abs_name)
+        if not prom.startswith('_auto_ivc.'):
+            return prom
+        abs2prom_in = self._abs2prom.get('input', {})
+        for tgt in sorted(self._conns):
+            if self._conns[tgt] == abs_name and tgt in abs2prom_in:
+                return abs2prom_in[tgt]
+        return prom
+
+    def _query(self, variables, record_type, counters, source, count_only=False):
+        table, coord, columns = _TABLES[record_type]
+        params = []
+
+        if count_only:
+            select = 'COUNT(*)'
+        elif self._has_json:
+            exprs = []
+            for name in variables:
+                paths = ['$."%s"' % abs_name.replace('"', '\\"') for abs_name in self._abs_names(name)]
+                extracts = ['json_extract(t.%s, ?)' % col for path in paths for col in columns]
+                params.extend(path for path in paths for _ in columns)
+                exprs.append('COALESCE(%s)' % ', '.join(extracts) if len(extracts) > 1
+                             else extracts[0])
+            select = ', '.join(['t.counter', 't.' + coord] + exprs)
+        else:
+            select = ', '.join(['t.counter', 't.' + coord] +
+                               ['t.%s' % col for col in columns])
+
+        sql = 'SELECT %s FROM %s t' % (select, table)
+        where = []
+        if source is not None:
+            sql += ' JOIN global_iterations g ON g.rowid = t.id AND g.record_type = ?'
+            params.append(record_type)
+            where.append('g.source = ?')
+            params.append(source)
+        if counters is not None:
+            lower, upper = counters
+            if lower is not None:
+                where.append('t.counter >= ?')
+                params.append(lower)
+            if upper is not None:
+                where.append('t.counter <= ?')
+                params.append(upper)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if not count_only:
+            sql += ' ORDER BY t.counter'
+
+        return self._conn.execute(sql, params)
+
+    def count(self, record_type='driver', counters=None, source=None):
+        """
+        Number of cases that iter_cases would yield with the same filters.
+        """
+        return self._query(None, record_type, counters, source, count_only=True).fetchone()[0]
+
+    def iter_cases(self, variables, record_type='driver', counters=None, source=None,
+                   batch_size=256):
+        """
+        Yield the requested variables of every matching case.
+
+        Parameters
+        ----------
+        variables : list of str
+            Promoted or absolute variable names.
+        record_type : str
+            'driver', 'system', 'solver' or 'problem'.
+        counters : tuple or None
+            Inclusive (lower, upper) range of case counters; either end may be None.
+        source : str or None
+            Only cases recorded by this source (see sources()).
+        batch_size : int
+            Rows fetched from SQLite at a time.
+
+        Yields
+        ------
+        tuple
+            (counter, iteration_coordinate or case name, {name: ndarray or None}).
+        """
+        variables = list(variables)
+        cursor = self._query(variables, record_type, counters, source)
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                if self._has_json:
+                    vals = {name: _decode(val) for name, val in zip(variables, row[2:])}
+                else:
+                    vals = self._decode_full_row(variables, row[2:])
+                yield row[0], row[1], vals
+
+    def _decode_columns(self, columns):
+        data = {}
+        for col in columns:
+            if not col:
+                continue
+            col = json.loads(col) if isinstance(col, str) else pickle.loads(col)
+            # Old formats pickled a numpy structured array per column
+            names = getattr(getattr(col, 'dtype', None), 'names', None)
+            data.update({n: col[n] for n in names} if names else col)
+        return data
+
+    def _decode_full_row(self, variables, columns):
+        """
+        Fallback without the SQLite JSON functions: parse whole columns of one row.
+        """
+        data = self._decode_columns(columns)
+        vals = {}
+        for name in variables:
+            vals[name] = None
+            for abs_name in self._abs_names(name):
+                if abs_name in data:
+                    vals[name] = np.atleast_1d(np.asarray(data[abs_name], dtype=float))
+                    break
+        return vals
+
+    def history(self, name, **kwargs):
+        """
+        Values of one variable over all matching cases, stacked into an array.
+        """
+        return np.array([vals[name] for _, _, vals in self.iter_cases([name], **kwargs)
+                         if vals[name] is not None])
+
+
+if __name__ == '__main__':
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'cases.sql'
+    variables = sys.argv[2:] or ['obj_cmp.obj', 'z', 'x']
+
+    with CaseStream(filename) as stream:
+        for record_type in _TABLES:
+            n = stream.count(record_type)
+            if n == 0:
+                continue
+            print('%s cases: %d from %s' % (record_type, n, stream.sources(record_type)))
+            for counter, coord, vals in stream.iter_cases(variables, record_type=record_type):
+                print('  %5d %-40s %s' % (counter, coord, vals))
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+
+import numpy as np
+import openmdao.api as om
+
+from model_signature import structure_hash
+
+
+class ResumableScipyOptimizeDriver(om.ScipyOptimizeDriver):
+    """
+    ScipyOptimizeDriver that checkpoints its progress and resumes from the last checkpoint.
+
+    Every `checkpoint_every` gradient evaluations (for SLSQP, every major iteration) the
+    design vector, the model's output vector (the converged states, used as the initial
+    guess on restart) and the iteration counts are written atomically to an .npz file.
+    If that file exists when run_driver is called, and it belongs to a model with the same
+    structure, the design vars and states are restored first, so the optimization
+    continues from there and the restart costs one (already converged) model evaluation.
+
+    scipy does not expose the internal state of its optimizers, so quasi-Newton Hessian
+    approximations start again from the identity after a restart.
+    """
+
+    def __init__(self, checkpoint_file='optimization_checkpoint.npz', checkpoint_every=1,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_every = checkpoint_every
+        self.resumed = False
+        self.total_iter_count = 0
+        self._iter_offset = 0
+        self._grad_count = 0
+        self._key = None
+
+    def _save_checkpoint(self):
+        model = self._problem().model
+        dv_vals = self.get_design_var_values()
+
+        data = {'key': np.array(self._key),
+                'iter_count': np.array(self._iter_offset + self.iter_count),
+                'outputs': model._outputs.asarray().copy()}
+        for name, val in dv_vals.items():
+            data['dv:' + name] = np.asarray(val)
+
+        tmp = self.checkpoint_file + '.tmp.npz'
+        np.savez(tmp, **data)
+        os.replace(tmp, self.checkpoint_file)
+
+    def _load_checkpoint(self):
+        if not os.path.isfile(self.checkpoint_file):
+            return False
+
+        with np.load(self.checkpoint_file) as data:
+            if str(data['key']) != self._key:
+                print('Checkpoint %s is for a different model, starting over' %
+                      self.checkpoint_file)
+                return False
+
+            model = self._problem().model
+            model._outputs.set_val(data['outputs'])
+            # set_design_var became _set_design_var in OpenMDAO 3.45.
+            set_design_var = getattr(self, '_set_design_var', None) or self.set_design_var
+            for name in self._designvars:
+                set_design_var(name, data['dv:' + name])
+            self._iter_offset = int(data['iter_count'])
+
+        print('Resuming from %s after %d iterations' % (self.checkpoint_file, self._iter_offset))
+        return True
+
+    def _gradfunc(self, x_new):
+        grad = super()._gradfunc(x_new)
+
+        # The gradient is evaluated at a point the optimizer accepted, after the model has
+        # been run there, so the outputs vector holds its converged states.
+        self._grad_count += 1
+        if self._grad_count % self.checkpoint_every == 0:
+            self._save_checkpoint()
+
+        return grad
+
+    def run(self):
+        self._key = structure_hash(self._problem())
+        self._iter_offset = 0
+        self._grad_count = 0
+        self.resumed = self._load_checkpoint()
+
+        result = super().run()
+
+        self.total_iter_count = self._iter_offset + self.iter_count
+        if self.result.success and os.path.isfile(self.checkpoint_file):
+            # Done, so a later run starts from scratch
+            os.remove(self.checkpoint_file)
+        return result
+
+
+def _sellar_problem(checkpoint_file, maxiter):
+    from openmdao.test_suite.components.sellar import SellarDerivatives
+
+    prob = om.Problem(SellarDerivatives())
+    prob.model.nonlinear_solver = om.NewtonSolver(solve_subsystems=False, iprint=0)
+    prob.model.linear_solver = om.DirectSolver()
+    prob.model.add_design_var('z', lower=np.array([-10.0, 0.0]), upper=np.array([10.0, 10.0]))
+    prob.model.add_design_var('x', lower=0.0, upper=10.0)
+    prob.model.add_objective('obj')
+    prob.model.add_constraint('con1', upper=0.0)
+    prob.model.add_constraint('con2', upper=0.0)
+
+    prob.driver = ResumableScipyOptimizeDriver(checkpoint_file=checkpoint_file,
+                                               optimizer='SLSQP', tol=1e-9, maxiter=maxiter,
+                                               disp=False)
+    prob.setup()
+    return prob
+
+
+if __name__ == '__main__':
+
+    checkpoint_file = sys.argv[1] if len(sys.argv) > 1 else 'sellar_checkpoint.npz'
+    if os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    # Stop early, as if the process had died, then resume.
+    for maxiter in (3, 200):
+        prob = _sellar_problem(checkpoint_file, maxiter)
+        st = time.time()
+        prob.run_driver()
+        print('maxiter %3d: resumed %s, %d iterations this run (%d total), %d model runs, '
+              '%.3f s, obj = %.6f' % (maxiter, prob.driver.resumed, prob.driver.iter_count,
+                                      prob.driver.total_iter_count, prob.model.iter_count,
+                                      time.time() - st, prob.get_val('obj')[0]))
@@ -0,0 +1,77 @@
+import numpy as np
+import openmdao.api as om
+
+
+def build_circle_packing(SIZE=10):
+    """
+    The circle packing problem from OpenMDAO-examples-simultaneous-derivatives.py for any SIZE.
+
+    Returns a Problem that has a driver, design vars and responses but has not been set up.
+    Call set_initial_values() after setup.
+    """
+    p = om.Problem()
+
+    p.model.add_subsystem('arctan_yox', om.ExecComp('g=arctan(y/x)', has_diag_partials=True,
+                                                    g=np.ones(SIZE), x=np.ones(SIZE),
+                                                    y=np.ones(SIZE)),
+                          promotes_inputs=['x', 'y'])
+
+    p.model.add_subsystem('circle', om.ExecComp('area=pi*r**2'), promotes_inputs=['r'])
+
+    p.model.add_subsystem('r_con', om.ExecComp('g=x**2 + y**2 - r', has_diag_partials=True,
+                                               g=np.ones(SIZE), x=np.ones(SIZE), y=np.ones(SIZE)),
+                          promotes_inputs=['r', 'x', 'y'])
+
+    thetas = np.linspace(0, np.pi/4, SIZE)
+    p.model.add_subsystem('theta_con', om.ExecComp('g = x - theta', has_diag_partials=True,
+                                                   g=np.ones(SIZE), x=np.ones(SIZE),
+                                                   theta=thetas))
+    p.model.add_subsystem('delta_theta_con', om.ExecComp('g = even - odd', has_diag_partials=True,
+                                                         g=np.ones(SIZE//2), even=np.ones(SIZE//2),
+                                                         odd=np.ones(SIZE//2)))
+
+    p.model.add_subsystem('l_conx', om.ExecComp('g=x-1', has_diag_partials=True, g=np.ones(SIZE),
+                                                x=np.ones(SIZE)),
+                          promotes_inputs=['x'])
+
+    IND = np.arange(SIZE, dtype=int)
+    ODD_IND = IND[1::2]  # all odd indices
+    EVEN_IND = IND[0::2]  # all even indices
+
+    p.model.connect('arctan_yox.g', 'theta_con.x')
+    p.model.connect('arctan_yox.g', 'delta_theta_con.even', src_indices=EVEN_IND)
+    p.model.connect('arctan_yox.g', 'delta_theta_con.odd', src_indices=ODD_IND)
+
+    p.driver = om.ScipyOptimizeDriver()
+    p.driver.options['optimizer'] = 'SLSQP'
+    p.driver.options['disp'] = False
+
+    p.model.add_design_var('x')
+    p.model.add_design_var('y')
+    p.model.add_design_var('r', lower=.5, upper=10)
+
+    # nonlinear constraints
+    p.model.add_constraint('r_con.g', equals=0)
+
+    p.model.add_constraint('theta_con.g', lower=-1e-5, upper=1e-5, indices=EVEN_IND)
+    p.model.add_constraint('delta_theta_con.g', lower=-1e-5, upper=1e-5)
+
+    # this constrains x[0] to be 1 (see definition of l_conx)
+    p.model.add_constraint('l_conx.g', equals=0, linear=False, indices=[0,])
+
+    # linear constraint
+    p.model.add_constraint('y', equals=0, indices=[0,], linear=True)
+
+    p.model.add_objective('circle.area', ref=-1)
+
+    return p
+
+
+def set_initial_values(p, SIZE=10, seed=0):
+    """
+    Random starting points within a unit circle centered at the origin.
+    """
+    rng = np.random.default_rng(seed)
+    p.set_val('x', rng.random(SIZE) * 2 - 1)
+    p.set_val('y', rng.random(SIZE) * 2 - 1)
+    p.set_val('r', .7)
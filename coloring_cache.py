@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import time
+
+from openmdao.utils.coloring import Coloring
+
+from model_signature import structure_hash
+
+
+class TotalColoringCache(object):
+    """
+    Persistent total coloring for a driver, keyed on the structure of the model.
+
+    The key is a hash of the system tree, variables, connections, design vars and
+    responses (plus anything passed in extra, e.g. SIZE). If the cached coloring has the
+    same key it is handed to the driver as a fixed coloring, otherwise the driver's
+    dynamic coloring runs as usual and its result replaces the cached one.
+
+    Usage, between setup and run_driver::
+
+        p.driver.declare_coloring()
+        p.setup()
+        cache = TotalColoringCache(p, 'circle_packing', extra={'SIZE': SIZE})
+        cache.load()
+        p.run_driver()
+        cache.store()
+    """
+
+    def __init__(self, prob, name='total_coloring', extra=None, cache_dir=None):
+        self._prob = prob
+        self.key = structure_hash(prob, extra=extra)
+        self.coloring_dir = prob.options['coloring_dir']
+        self.cache_dir = cache_dir or os.path.join(self.coloring_dir, 'cache')
+        # OpenMDAO 3.35 and later write the colorings they compute into the output
+        # directory of the Problem rather than into coloring_dir.
+        if hasattr(prob, 'get_coloring_dir'):
+            self.output_dir = str(prob.get_coloring_dir('output'))
+        else:
+            self.output_dir = self.coloring_dir
+        self.path = os.path.join(self.cache_dir, name + '.pkl')
+        self.meta_path = os.path.join(self.cache_dir, name + '.json')
+        self.hit = False
+
+    def _read_meta(self):
+        if not os.path.isfile(self.meta_path) or not os.path.isfile(self.path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def load(self):
+        """
+        Use the cached coloring if its key matches the model.
+
+        Returns
+        -------
+        bool
+            True if the cached coloring was used.
+        """
+        meta = self._read_meta()
+        if meta is not None and meta['key'] == self.key:
+            self._prob.driver.use_fixed_coloring(self.path)
+            self.hit = True
+            print('Loaded cached total coloring %s (saves ~%.3f s of coloring)' %
+                  (self.path, meta['coloring_time']))
+        elif meta is not None:
+            print('Cached total coloring %s is stale, recomputing' % self.path)
+        else:
+            print('No cached total coloring at %s, computing' % self.path)
+        return self.hit
+
+    def store(self):
+        """
+        Save the coloring computed during run_driver, replacing any stale one.
+        """
+        if self.hit:
+            return
+
+        src = os.path.join(self.output_dir, 'total_coloring.pkl')
+        if not os.path.isfile(src):
+            raise RuntimeError("No total coloring found at %s. Call store() after run_driver "
+                               "on a driver with declare_coloring()." % src)
+
+        coloring = Coloring.load(src)
+        coloring_time = coloring._meta.get('sparsity_time', 0.) + \
+            coloring._meta.get('coloring_time', 0.)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to temporary files and rename so readers never see half a cache entry.
+        shutil.copyfile(src, self.path + '.tmp')
+        with open(self.meta_path + '.tmp', 'w') as f:
+            json.dump({'key': self.key, 'coloring_time': coloring_time,
+                       'created': time.time()}, f, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(self.meta_path + '.tmp', self.meta_path)
+
+        print('Cached total coloring at %s (took %.3f s to compute)' % (self.path, coloring_time))
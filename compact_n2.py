@@ -0,0 +1,340 @@
+import base64
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import openmdao
+import openmdao.api as om
+from openmdao.visualization.n2_viewer.n2_viewer import _get_viewer_data
+
+
+MODEL_MARKER = '__COMPACT_N2_MODEL__'
+ASSETS_MARKER = '__COMPACT_N2_ASSETS__'
+
+# Part of the cached skeleton names, changed whenever the skeleton layout does.
+SKELETON_VERSION = 2
+
+_SCRIPT_RE = re.compile(r'<script type="text/javascript">(.*?)</script>', re.S)
+_STYLE_RE = re.compile(r'<style type="text/css">(.*?)</style>', re.S)
+_MODEL_RE = re.compile(r'var compressedModel = "[^"]*";?')
+_IMAGE_RE = re.compile(r'data:image/([a-z+]+);base64,([A-Za-z0-9+/=]+)')
+_IMAGE_EXT = {'png': '.png', 'jpeg': '.jpg', 'gif': '.gif', 'svg+xml': '.svg'}
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.number):
+        return obj.item()
+    return str(obj)
+
+
+def compress_model(data):
+    """
+    Model data in the form the N2 viewer expects: base64 of zlib-compressed JSON.
+    """
+    text = json.dumps(data, default=_json_default, separators=(',', ':'))
+    return base64.b64encode(zlib.compress(text.encode('utf-8'), 9)).decode('ascii')
+
+
+def decompress_model(compressed):
+    return json.loads(zlib.decompress(base64.b64decode(compressed)))
+
+
+def _strip_values(node):
+    for child in node.get('children', []):
+        if child['type'] in ('input', 'output'):
+            child['val'] = None
+            for key in ('val_min', 'val_max', 'val_min_indices', 'val_max_indices'):
+                child.pop(key, None)
+        else:
+            _strip_values(child)
+
+
+def _viewer_data(prob, values):
+    """
+    N2 model data of prob, with or without the variable values.
+
+    Older OpenMDAO versions have no values argument and always include them, so they are
+    removed afterwards.
+    """
+    if 'values' in inspect.signature(_get_viewer_data).parameters:
+        return _get_viewer_data(prob, values=values)
+    data = _get_viewer_data(prob)
+    if not values:
+        _strip_values(data['tree'])
+    return data
+
+
+def _write_asset(assets_dir, content, ext):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    name = hashlib.sha1(content).hexdigest()[:16] + ext
+    path = os.path.join(assets_dir, name)
+    if not os.path.isfile(path):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+    return name
+
+
+def n2_skeleton(assets_dir='n2_assets'):
+    """
+    N2 page with every inline script, stylesheet and image moved to shared files in
+    assets_dir.
+
+    The scripts, styles and images (the data: URIs of the page, 150 KB of icons and
+    logo) are written once per OpenMDAO version under content-hashed names, so any number
+    of diagrams share one copy and each page only carries its model data. Asset references
+    in the returned HTML start with ASSETS_MARKER and the model data is MODEL_MARKER.
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    path = os.path.join(assets_dir, 'skeleton_%s_%d.html' % (openmdao.__version__,
+                                                             SKELETON_VERSION))
+    if os.path.isfile(path):
+        with open(path) as f:
+            return f.read()
+
+    # The page around the model data does not depend on the model, so take it from the
+    # diagram of a trivial one.
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('ivc', om.IndepVarComp('x', 0.0))
+    prob.setup()
+    prob.final_setup()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = os.path.join(tmpdir, 'n2.html')
+        om.n2(prob, outfile=tmp, show_browser=False)
+        with open(tmp) as f:
+            html = f.read()
+
+    html = _MODEL_RE.sub('var compressedModel = "%s";' % MODEL_MARKER, html, count=1)
+
+    def _script(match):
+        if MODEL_MARKER in match.group(1):
+            return match.group(0)
+        return '<script type="text/javascript" src="%s/%s"></script>' % \
+            (ASSETS_MARKER, _write_asset(assets_dir, match.group(1), '.js'))
+
+    def _style(match):
+        return '<link rel="stylesheet" type="text/css" href="%s/%s">' % \
+            (ASSETS_MARKER, _write_asset(assets_dir, match.group(1), '.css'))
+
+    def _image(match):
+        ext = _IMAGE_EXT.get(match.group(1), '.' + match.group(1))
+        image = base64.b64decode(match.group(2))
+        return '%s/%s' % (ASSETS_MARKER, _write_asset(assets_dir, image, ext))
+
+    html = _STYLE_RE.sub(_style, _SCRIPT_RE.sub(_script, html))
+    html = _IMAGE_RE.sub(_image, html)
+
+    with open(path + '.tmp', 'w') as f:
+        f.write(html)
+    os.replace(path + '.tmp', path)
+    return html
+
+
+def _write_page(outfile, data, assets_dir, title=None):
+    html = n2_skeleton(assets_dir)
+    rel = os.path.relpath(assets_dir, os.path.dirname(os.path.abspath(outfile)))
+    html = html.replace(ASSETS_MARKER, rel.replace(os.sep, '/'))
+    html = html.replace(MODEL_MARKER, compress_model(data))
+    if title is not None:
+        html = re.sub(r'<title>.*?</title>', '<title>%s</title>' % title, html, count=1)
+    with open(outfile, 'w') as f:
+        f.write(html)
+
+
+def _leaves(node, prefix=''):
+    """
+    (path relative to node, leaf) for every variable below node.
+    """
+    for child in node.get('children', []):
+        path = prefix + child['name']
+        if child['type'] in ('input', 'output'):
+            yield path, child
+        else:
+            yield from _leaves(child, path + '.')
+
+
+def _inside(path, sys_path):
+    return path.startswith(sys_path + '.')
+
+
+def prune_model_data(data, max_depth):
+    """
+    Cut the system tree of N2 model data below max_depth.
+
+    A group at max_depth keeps as direct children only the variables that are connected
+    to something outside of it, renamed to their path relative to it (the viewer builds
+    paths by joining names, so connections still line up). Everything else below it is
+    left out of the returned data and returned as a separate chunk.
+
+    Returns
+    -------
+    tuple
+        (visible model data, {system path: model data of that subtree}).
+    """
+    conns = data['connections_list']
+    pruned = {}
+
+    def _walk(node, path, depth):
+        children = node.get('children')
+        if not children:
+            return
+        # Components keep their variables; only groups are collapsed.
+        if depth == max_depth and node['type'] != 'root' and \
+                any(child['type'] not in ('input', 'output') for child in children):
+            pruned[path] = dict(node)
+            node['children'] = []
+            for rel, leaf in _leaves(pruned[path]):
+                full = path + '.' + rel
+                if any((c['src'] == full and not _inside(c['tgt'], path)) or
+                       (c['tgt'] == full and not _inside(c['src'], path)) for c in conns):
+                    node['children'].append(dict(leaf, name=rel))
+            return
+        for child in children:
+            if child['type'] not in ('input', 'output'):
+                _walk(child, child['name'] if not path else path + '.' + child['name'],
+                      depth + 1)
+
+    visible = dict(data)
+    visible['tree'] = json.loads(json.dumps(data['tree'], default=_json_default))
+    _walk(visible['tree'], '', 0)
+
+    names = {path for path, _ in _leaves(visible['tree'])}
+
+    def _keep_partial(entry):
+        of, _, wrt = entry.partition(' > ')
+        return of in names and wrt in names
+
+    visible['connections_list'] = [c for c in conns if c['src'] in names and c['tgt'] in names]
+    visible['declare_partials_list'] = [p for p in data['declare_partials_list']
+                                        if _keep_partial(p)]
+    visible['abs2prom'] = {io: {k: v for k, v in a2p.items() if k in names}
+                           for io, a2p in data['abs2prom'].items()}
+    visible['sys_pathnames_list'] = [s for s in data.get('sys_pathnames_list', [])
+                                     if s.count('.') < max_depth]
+
+    chunks = {}
+    for path, node in pruned.items():
+        # Keep the chain of ancestors so absolute paths are unchanged.
+        tree = node
+        parts = path.split('.')
+        for i in range(len(parts) - 1, 0, -1):
+            ancestor = _find(data['tree'], parts[:i])
+            tree = dict(ancestor, children=[tree])
+        root = dict(data['tree'], children=[tree])
+
+        chunk = dict(data)
+        chunk['tree'] = root
+        chunk['connections_list'] = [c for c in conns if _inside(c['src'], path) and
+                                     _inside(c['tgt'], path)]
+        chunk['declare_partials_list'] = [p for p in data['declare_partials_list']
+                                          if _inside(p.partition(' > ')[0], path)]
+        chunk['abs2prom'] = {io: {k: v for k, v in a2p.items() if _inside(k, path)}
+                             for io, a2p in data['abs2prom'].items()}
+        chunks[path] = chunk
+
+    return visible, chunks
+
+
+def _find(tree, parts):
+    node = tree
+    for name in parts:
+        node = next(child for child in node['children'] if child['name'] == name)
+    return node
+
+
+def _chunk_dir(outfile):
+    return os.path.splitext(outfile)[0] + '_subtrees'
+
+
+def compact_n2(prob, outfile='n2.html', assets_dir='n2_assets', max_depth=None, values=False,
+               title=None):
+    """
+    Write a small N2 diagram that loads shared scripts and styles from assets_dir.
+
+    Parameters
+    ----------
+    prob : Problem
+        A Problem that has been set up.
+    outfile : str
+        Output HTML file.
+    assets_dir : str
+        Directory for the scripts and styles shared by all diagrams.
+    max_depth : int or None
+        Systems deeper than this are collapsed into their connected variables. Their full
+        contents are saved next to outfile and opened as separate diagrams with
+        expand_n2_subtree.
+    values : bool
+        Include variable values, which dominate the model data of large models.
+    title : str or None
+        Title of the page.
+
+    Returns
+    -------
+    list of str
+        Paths of the collapsed systems.
+    """
+    data = _viewer_data(prob, values)
+
+    if max_depth is None:
+        _write_page(outfile, data, assets_dir, title)
+        return []
+
+    visible, chunks = prune_model_data(data, max_depth)
+    _write_page(outfile, visible, assets_dir, title)
+
+    chunk_dir = _chunk_dir(outfile)
+    os.makedirs(chunk_dir, exist_ok=True)
+    for path, chunk in chunks.items():
+        with open(os.path.join(chunk_dir, path + '.z'), 'w') as f:
+            f.write(compress_model(chunk))
+    return sorted(chunks)
+
+
+def expand_n2_subtree(outfile, path, assets_dir='n2_assets'):
+    """
+    Write the diagram of a system that compact_n2 collapsed, from its saved data.
+
+    Returns
+    -------
+    str
+        Path of the new HTML file, next to outfile.
+    """
+    with open(os.path.join(_chunk_dir(outfile), path + '.z')) as f:
+        chunk = decompress_model(f.read())
+
+    sub_outfile = '%s.%s.html' % (os.path.splitext(outfile)[0], path)
+    _write_page(sub_outfile, chunk, assets_dir, title=path)
+    return sub_outfile
+
+
+if __name__ == '__main__':
+
+    from wind_farm import build_farm
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    prob = build_farm(n, n)
+    prob.setup()
+    prob.final_setup()
+
+    st = time.time()
+    om.n2(prob, outfile='farm_full_n2.html', show_browser=False)
+    print('om.n2:       %.3f s, %8d bytes' % (time.time() - st, os.path.getsize('farm_full_n2.html')))
+
+    n2_skeleton()  # assets are written once, not per diagram
+    st = time.time()
+    collapsed = compact_n2(prob, outfile='farm_n2.html', max_depth=1)
+    print('compact_n2:  %.3f s, %8d bytes, %d collapsed systems' %
+          (time.time() - st, os.path.getsize('farm_n2.html'), len(collapsed)))
+
+    if collapsed:
+        print('expanded %s' % expand_n2_subtree('farm_n2.html', collapsed[0]))
@@ -0,0 +1,210 @@
+import sys
+import time
+
+import openmdao.api as om
+
+
+# Methods timed on every component and group, where the class has them. The Group methods
+# include the data transfers; the solvers are timed separately.
+COMPONENT_METHODS = ('compute', 'compute_partials', 'compute_jacvec_product',
+                     'apply_nonlinear', 'solve_nonlinear', 'guess_nonlinear', 'linearize',
+                     'apply_linear', 'solve_linear')
+GROUP_METHODS = ('_solve_nonlinear', '_apply_nonlinear', '_linearize', '_apply_linear',
+                 '_solve_linear', '_transfer')
+SOLVER_METHODS = ('solve', '_linearize')
+
+
+class ComponentProfiler(object):
+    """
+    Per-system timing of a Problem.
+
+    start() replaces the methods listed in COMPONENT_METHODS, GROUP_METHODS and
+    SOLVER_METHODS on the systems and solvers of one Problem by timed wrappers, set on the
+    instances only, so other Problems are unaffected; stop() removes them again. Can also
+    be used as a context manager.
+
+    For every (system path, method) the profiler counts calls, inclusive time and exclusive
+    time (without the timed calls made inside it), and it accumulates exclusive time per
+    call stack for a flame graph. The profiler's own bookkeeping around a call is left out
+    of the exclusive time of the caller too.
+
+    With count_blocks, it also counts the net number of memory blocks allocated by every
+    call (sys.getallocatedblocks). That walks the allocator arenas on every call, tens of
+    microseconds each, so it is off by default.
+    """
+
+    def __init__(self, prob, count_blocks=False):
+        self.prob = prob
+        self.count_blocks = count_blocks
+        self.stats = {}
+        self.folded = {}
+        self._stack = []
+        self._wrapped = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _wrap(self, owner, attr, path, label):
+        orig = getattr(owner, attr)
+        stack = self._stack
+        stats = self.stats
+        folded = self.folded
+        key = (path, label)
+        perf_counter = time.perf_counter
+        getallocatedblocks = sys.getallocatedblocks if self.count_blocks else lambda: 0
+
+        def timed(*args, **kwargs):
+            enter = perf_counter()
+            frame = [stack[-1][0] + ';' + path + ' ' + label if stack else
+                     (path or '<model>') + ' ' + label, 0.0]
+            stack.append(frame)
+            blocks = getallocatedblocks()
+            start = perf_counter()
+            try:
+                return orig(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                blocks = getallocatedblocks() - blocks
+                stack.pop()
+                exclusive = elapsed - frame[1]
+
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = [0, 0.0, 0.0, 0]
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] += exclusive
+                entry[3] += blocks
+                folded[frame[0]] = folded.get(frame[0], 0.0) + exclusive
+
+                if stack:
+                    # Everything since entering this wrapper is a timed call to the caller.
+                    stack[-1][1] += perf_counter() - enter
+
+        setattr(owner, attr, timed)
+        self._wrapped.append((owner, attr))
+
+    def start(self):
+        """
+        Instrument the Problem; it is set up first if needed.
+        """
+        if self._wrapped:
+            return
+        self.prob.final_setup()
+
+        for system in self.prob.model.system_iter(include_self=True, recurse=True):
+            path = system.pathname
+            if isinstance(system, om.Group):
+                for attr in GROUP_METHODS:
+                    self._wrap(system, attr, path, attr.lstrip('_'))
+            else:
+                for attr in COMPONENT_METHODS:
+                    if hasattr(system, attr):
+                        self._wrap(system, attr, path, attr)
+
+            for solver in (system.nonlinear_solver, system.linear_solver):
+                if solver is None:
+                    continue
+                for attr in SOLVER_METHODS:
+                    if hasattr(solver, attr):
+                        self._wrap(solver, attr, path,
+                                   '%s.%s' % (solver.SOLVER, attr.lstrip('_')))
+
+    def stop(self):
+        """
+        Remove the instrumentation, keeping the statistics collected so far.
+        """
+        for owner, attr in self._wrapped:
+            delattr(owner, attr)
+        self._wrapped = []
+
+    def reset(self):
+        self.stats.clear()
+        self.folded.clear()
+
+    def report(self, sort='exclusive', limit=30, file=sys.stdout):
+        """
+        Print the hottest (system, method) pairs.
+
+        Parameters
+        ----------
+        sort : str
+            'exclusive', 'inclusive', 'calls' or 'blocks' (with count_blocks).
+        limit : int or None
+            Number of rows, all if None.
+        file : file-like
+            Where to print.
+        """
+        column = {'calls': 0, 'inclusive': 1, 'exclusive': 2, 'blocks': 3}[sort]
+        rows = sorted(self.stats.items(), key=lambda item: item[1][column], reverse=True)
+        total = sum(entry[2] for entry in self.stats.values())
+
+        print('%-40s %-24s %9s %11s %11s %7s' %
+              ('system', 'method', 'calls', 'incl (s)', 'excl (s)', 'excl %') +
+              (' %11s' % 'net blocks' if self.count_blocks else ''), file=file)
+        for (path, label), (calls, incl, excl, blocks) in rows[:limit]:
+            print('%-40s %-24s %9d %11.6f %11.6f %6.1f%%' %
+                  (path or '<model>', label, calls, incl, excl,
+                   100. * excl / total if total else 0.) +
+                  (' %11d' % blocks if self.count_blocks else ''), file=file)
+
+    def write_folded(self, filename):
+        """
+        Write the exclusive time per call stack, in microseconds, in the folded format read
+        by flamegraph.pl and speedscope.
+        """
+        with open(filename, 'w') as f:
+            for stack, seconds in sorted(self.folded.items()):
+                us = int(round(seconds * 1e6))
+                if us > 0:
+                    f.write('%s %d\n' % (stack, us))
+
+
+if __name__ == '__main__':
+
+    from openmdao.test_suite.components.sellar import SellarDerivatives
+
+    from wind_farm import build_farm
+
+    prob = om.Problem(reports=False)
+    prob.model = SellarDerivatives()
+    prob.model.nonlinear_solver = om.NewtonSolver(solve_subsystems=False)
+    prob.model.linear_solver = om.DirectSolver()
+    prob.setup()
+    prob.set_solver_print(level=-1)
+
+    farm = build_farm(6, 6)
+    farm.setup()
+    farm.set_val('V_inf', 10.0, units='m/s')
+    farm.set_val('rho', 1.225, units='kg/m**3')
+
+    sellar_totals = {'of': ['obj', 'con1', 'con2'], 'wrt': ['x', 'z']}
+    repeat = 5
+
+    def run(p, totals):
+        st = time.perf_counter()
+        p.run_model()
+        p.compute_totals(**totals)
+        return time.perf_counter() - st
+
+    for label, p, totals in (('Sellar', prob, sellar_totals), ('wind farm', farm, {})):
+        # The first run also sets up the total jacobian; best of the repeated runs after it.
+        run(p, totals)
+        plain = min(run(p, totals) for _ in range(repeat))
+
+        with ComponentProfiler(p) as profiler:
+            run(p, totals)
+            profiler.reset()
+            profiled = min(run(p, totals) for _ in range(repeat))
+
+        print('\n%s: best of %d runs %.4f s unprofiled, %.4f s profiled (+%.0f%%), '
+              'statistics of the %d runs:' % (label, repeat, plain, profiled,
+                                              100. * (profiled - plain) / plain, repeat))
+        profiler.report(limit=15)
+        fname = '%s.folded' % label.replace(' ', '_')
+        profiler.write_folded(fname)
+        print('Flame graph stacks written to %s' % fname)
@@ -0,0 +1,303 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import openmdao.api as om
+
+
+# Maps the corner values and scaled derivatives of a cell to the coefficients of
+# p(t, u) = sum a[i, j] t**i u**j on the unit square.
+_BICUBIC = np.array([[1., 0., 0., 0.],
+                     [0., 0., 1., 0.],
+                     [-3., 3., -2., -1.],
+                     [2., -2., 1., 1.]])
+
+
+def bicubic_coefficients(x, y, z):
+    """
+    Bicubic coefficients of every cell of the table z(x, y).
+
+    The derivatives at the grid points are finite differences of the table, so the
+    interpolant and its first derivatives are continuous across cells.
+
+    Parameters
+    ----------
+    x, y : ndarray
+        Strictly increasing breakpoints, sizes nx and ny.
+    z : ndarray
+        Table values, shape (nx, ny).
+
+    Returns
+    -------
+    ndarray
+        Coefficients, shape (nx - 1, ny - 1, 4, 4).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
+
+    zx, zy = np.gradient(z, x, y)
+    zxy = np.gradient(zx, y, axis=1)
+
+    hx = np.diff(x)[:, None]
+    hy = np.diff(y)[None, :]
+
+    # Derivatives scaled to the unit square of every cell
+    F = np.empty((x.size - 1, y.size - 1, 4, 4))
+    for di, dj, k, l in ((0, 0, 0, 0), (0, 1, 0, 1), (1, 0, 1, 0), (1, 1, 1, 1)):
+        sl = (slice(di, x.size - 1 + di), slice(dj, y.size - 1 + dj))
+        F[:, :, k, l] = z[sl]
+        F[:, :, k, l + 2] = zy[sl] * hy
+        F[:, :, k + 2, l] = zx[sl] * hx
+        F[:, :, k + 2, l + 2] = zxy[sl] * hx * hy
+
+    return np.einsum('ik,xykl,jl->xyij', _BICUBIC, F, _BICUBIC)
+
+
+class BicubicTable(object):
+    """
+    Vectorized bicubic interpolation of a 2-D table, with analytic first derivatives.
+
+    The cubic of an edge cell quickly leaves the range of the data, so queries outside the
+    breakpoints are not extrapolated: with out_of_bounds='clip' they take the value at the
+    nearest edge (and a zero derivative across it), with 'raise' they raise a ValueError.
+    """
+
+    def __init__(self, x, y, coeffs, out_of_bounds='clip'):
+        if out_of_bounds not in ('clip', 'raise'):
+            raise ValueError("out_of_bounds must be 'clip' or 'raise', not '%s'" % out_of_bounds)
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.coeffs = coeffs
+        self.out_of_bounds = out_of_bounds
+
+    def __call__(self, xq, yq):
+        """
+        Interpolate at the points (xq, yq).
+
+        Returns
+        -------
+        tuple of ndarray
+            Value, derivative with respect to x and derivative with respect to y.
+        """
+        xq = np.asarray(xq, dtype=float)
+        yq = np.asarray(yq, dtype=float)
+
+        x_in = (xq >= self.x[0]) & (xq <= self.x[-1])
+        y_in = (yq >= self.y[0]) & (yq <= self.y[-1])
+        if self.out_of_bounds == 'raise' and not (np.all(x_in) and np.all(y_in)):
+            raise ValueError('%d of %d points are outside the table, x in [%g, %g] and '
+                             'y in [%g, %g]' % (np.count_nonzero(~(x_in & y_in)), xq.size,
+                                                self.x[0], self.x[-1], self.y[0], self.y[-1]))
+        xq = np.clip(xq, self.x[0], self.x[-1])
+        yq = np.clip(yq, self.y[0], self.y[-1])
+
+        ix = np.clip(np.searchsorted(self.x, xq, side='right') - 1, 0, self.x.size - 2)
+        iy = np.clip(np.searchsorted(self.y, yq, side='right') - 1, 0, self.y.size - 2)
+        hx = self.x[ix + 1] - self.x[ix]
+        hy = self.y[iy + 1] - self.y[iy]
+        t = (xq - self.x[ix]) / hx
+        u = (yq - self.y[iy]) / hy
+
+        one = np.ones_like(t)
+        zero = np.zeros_like(t)
+        T = np.stack([one, t, t * t, t * t * t], axis=-1)
+        U = np.stack([one, u, u * u, u * u * u], axis=-1)
+        dT = np.stack([zero, one, 2 * t, 3 * t * t], axis=-1)
+        dU = np.stack([zero, one, 2 * u, 3 * u * u], axis=-1)
+
+        # Only the cells that are hit are read, so a memory-mapped table stays on disk.
+        a = np.asarray(self.coeffs[ix, iy])
+        aU = np.einsum('...ij,...j->...i', a, U)
+
+        val = np.einsum('...i,...i->...', T, aU)
+        dval_dx = np.einsum('...i,...i->...', dT, aU) / hx * x_in
+        dval_dy = np.einsum('...i,...ij,...j->...', T, a, dU) / hy * y_in
+        return val, dval_dx, dval_dy
+
+
+def cached_table(name, x, y, z, cache_dir='table_cache', out_of_bounds='clip'):
+    """
+    BicubicTable for z(x, y) whose coefficients are cached in cache_dir.
+
+    The cache file is keyed on a hash of the table, so it is recomputed when the data
+    changes. The coefficients are memory-mapped, so loading a large table costs nothing
+    until it is interpolated.
+    """
+    x = np.ascontiguousarray(x, dtype=float)
+    y = np.ascontiguousarray(y, dtype=float)
+    z = np.ascontiguousarray(z, dtype=float)
+
+    sha = hashlib.sha1()
+    for arr in (x, y, z):
+        sha.update(repr(arr.shape).encode('utf-8'))
+        sha.update(arr.tobytes())
+    path = os.path.join(cache_dir, '%s_%s.npy' % (name, sha.hexdigest()[:16]))
+
+    if not os.path.isfile(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + '.tmp.npy'
+        np.save(tmp, bicubic_coefficients(x, y, z))
+        os.replace(tmp, path)
+
+    return BicubicTable(x, y, np.load(path, mmap_mode='r'), out_of_bounds)
+
+
+def polarization_table(num_j=60, num_T=20):
+    """
+    Synthetic PEM fuel cell polarization map: cell voltage (V) over current density (A/cm**2)
+    and temperature (degK), from the usual activation, ohmic and concentration losses.
+
+    The concentration loss grows as the current density approaches the limiting current
+    density of 1.8 A/cm**2, so the voltage stays between about 0.4 and 1.05 V.
+    """
+    j = np.linspace(0.01, 1.6, num_j)
+    T = np.linspace(313., 353., num_T)
+    jj, TT = np.meshgrid(j, T, indexing='ij')
+
+    E_rev = 1.229 - 8.5e-4 * (TT - 298.15)
+    activation = 8.314 * TT / (2 * 0.5 * 96485.) * np.log(jj / 1e-4)
+    ohmic = (0.25 - 1.5e-3 * (TT - 313.)) * jj
+    concentration = -0.06 * np.log(1. - jj / 1.8)
+    return j, T, E_rev - activation - ohmic - concentration
+
+
+def motor_efficiency_table(num_torque=40, num_speed=40, max_torque=2.0, max_speed=1000.):
+    """
+    Synthetic electric motor efficiency map over torque (N*m) and speed (rad/s), from
+    copper, iron, windage and constant losses.
+    """
+    torque = np.linspace(0.01 * max_torque, max_torque, num_torque)
+    speed = np.linspace(0.01 * max_speed, max_speed, num_speed)
+    tt, ww = np.meshgrid(torque, speed, indexing='ij')
+
+    P_shaft = tt * ww
+    losses = 8. * tt ** 2 + 0.01 * ww + 2e-9 * ww ** 3 + 1.0
+    return torque, speed, P_shaft / (P_shaft + losses)
+
+
+class FuelCellPolarization(om.ExplicitComponent):
+    """
+    Cell voltage and efficiency of a fuel cell stack from a polarization table.
+
+    The efficiency is the cell voltage over the thermoneutral voltage of hydrogen (LHV).
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('table', default=None, allow_none=True,
+                             desc='BicubicTable of cell voltage over current density and '
+                                  'temperature; the synthetic map if None')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self._table = self.options['table']
+        if self._table is None:
+            self._table = cached_table('polarization', *polarization_table())
+
+        self.add_input('current_density', val=0.5 * np.ones(nn), units='A/cm**2')
+        self.add_input('temperature', val=343. * np.ones(nn), units='degK')
+        self.add_output('cell_voltage', val=np.ones(nn), units='V')
+        self.add_output('efficiency', val=np.ones(nn))
+
+        ar = np.arange(nn)
+        self.declare_partials(['cell_voltage', 'efficiency'], ['current_density', 'temperature'],
+                              rows=ar, cols=ar)
+
+    def compute(self, inputs, outputs):
+        V, _, _ = self._table(inputs['current_density'], inputs['temperature'])
+        outputs['cell_voltage'] = V
+        outputs['efficiency'] = V / 1.253
+
+    def compute_partials(self, inputs, partials):
+        _, dV_dj, dV_dT = self._table(inputs['current_density'], inputs['temperature'])
+        partials['cell_voltage', 'current_density'] = dV_dj
+        partials['cell_voltage', 'temperature'] = dV_dT
+        partials['efficiency', 'current_density'] = dV_dj / 1.253
+        partials['efficiency', 'temperature'] = dV_dT / 1.253
+
+
+class MotorEfficiencyMap(om.ExplicitComponent):
+    """
+    Motor with a torque x speed efficiency map, a drop-in for the constant efficiency Motor.
+
+    P_in = P_req_shaft / efficiency(P_req_shaft / speed, speed)
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('table', default=None, allow_none=True,
+                             desc='BicubicTable of efficiency over torque and speed; the '
+                                  'synthetic map if None')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self._table = self.options['table']
+        if self._table is None:
+            self._table = cached_table('motor_efficiency', *motor_efficiency_table())
+
+        self.add_input('P_req_shaft', val=np.zeros(nn), units='W')
+        self.add_input('speed', val=500. * np.ones(nn), units='rad/s')
+        self.add_output('P_in', val=np.zeros(nn), units='W')
+        self.add_output('efficiency', val=np.ones(nn))
+
+        ar = np.arange(nn)
+        self.declare_partials(['P_in', 'efficiency'], ['P_req_shaft', 'speed'], rows=ar, cols=ar)
+
+    def compute(self, inputs, outputs):
+        P = inputs['P_req_shaft']
+        speed = inputs['speed']
+        eta, _, _ = self._table(P / speed, speed)
+        outputs['efficiency'] = eta
+        outputs['P_in'] = P / eta
+
+    def compute_partials(self, inputs, partials):
+        P = inputs['P_req_shaft']
+        speed = inputs['speed']
+        eta, deta_dtorque, deta_dspeed = self._table(P / speed, speed)
+
+        # torque = P / speed
+        deta_dP = deta_dtorque / speed
+        deta_dw = deta_dspeed - deta_dtorque * P / speed ** 2
+
+        partials['efficiency', 'P_req_shaft'] = deta_dP
+        partials['efficiency', 'speed'] = deta_dw
+        partials['P_in', 'P_req_shaft'] = 1.0 / eta - P * deta_dP / eta ** 2
+        partials['P_in', 'speed'] = -P * deta_dw / eta ** 2
+
+
+if __name__ == '__main__':
+
+    nn = 100000
+    rng = np.random.default_rng(0)
+
+    prob = om.Problem()
+    prob.model.add_subsystem('motor', MotorEfficiencyMap(num_nodes=nn), promotes_inputs=['*'])
+    prob.model.add_subsystem('stack', FuelCellPolarization(num_nodes=nn), promotes_inputs=['*'])
+    prob.setup()
+
+    # Operating points inside both tables: torques up to the 2 N*m of the motor map.
+    speed = rng.uniform(100., 900., nn)
+    prob.set_val('P_req_shaft', rng.uniform(0.05, 2.0, nn) * speed, units='W')
+    prob.set_val('speed', speed, units='rad/s')
+    prob.set_val('current_density', rng.uniform(0.05, 1.5, nn), units='A/cm**2')
+    prob.set_val('temperature', rng.uniform(315., 350., nn), units='degK')
+
+    st = time.time()
+    prob.run_model()
+    print('run_model for %d nodes: %.4f s' % (nn, time.time() - st))
+
+    st = time.time()
+    prob.model.run_linearize()
+    print('linearize: %.4f s' % (time.time() - st))
+
+    print('mean motor efficiency: %.4f' % prob.get_val('motor.efficiency').mean())
+    print('mean stack efficiency: %.4f' % prob.get_val('stack.efficiency').mean())
+
+    # Check the analytic derivatives on a small problem
+    check = om.Problem()
+    check.model.add_subsystem('motor', MotorEfficiencyMap(num_nodes=5))
+    check.model.add_subsystem('stack', FuelCellPolarization(num_nodes=5))
+    check.setup()
+    check.set_val('motor.P_req_shaft', np.linspace(100., 900., 5))
+    check.run_model()
+    check.check_partials(compact_print=True, method='fd')
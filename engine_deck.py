@@ -0,0 +1,200 @@
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import openmdao.api as om
+
+from case_columns import MANIFEST, ColumnWriter, load_columns
+from pycycle_parallel_od import CYCLE_PARAMS, des_od_connections
+from pycycle_turbojet import Turbojet, set_design_point, set_off_design_guesses
+from vehicle_carpet_sweep import serpentine
+
+
+# Off-design outputs written to the deck for every point.
+DECK_OUTPUTS = ('perf.Fn', 'perf.TSFC', 'perf.OPR', 'burner.Wfuel', 'balance.W',
+                'balance.Nmech', 'balance.FAR')
+
+
+def pressure_ratio(alt):
+    """
+    Ambient pressure over sea level pressure of the standard atmosphere, alt in ft.
+    """
+    alt = np.asarray(alt, dtype=float)
+    tropo = (1.0 - 6.8756e-6 * alt) ** 5.2559
+    strato = 0.22336 * np.exp(-4.8063e-5 * (alt - 36089.0))
+    return np.where(alt < 36089.0, tropo, strato)
+
+
+def build_od_problem(tab_spec=None):
+    """
+    A set-up Problem with one off-design Turbojet, whose flight conditions, thrust target
+    and design values are all set with set_val.
+    """
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('OD', Turbojet(design=False, tab_spec=tab_spec))
+    prob.model.set_input_defaults('OD.fc.MN', 0.000001)
+    prob.model.set_input_defaults('OD.fc.alt', 0.0, units='ft')
+    prob.model.set_input_defaults('OD.balance.Fn_target', 11000.0, units='lbf')
+    prob.setup(check=False)
+    prob.set_solver_print(level=-1)
+    # A point that stops at maxiter without meeting the tolerances has not converged.
+    prob.model.OD.nonlinear_solver.options['err_on_non_converge'] = True
+
+    for name, val in CYCLE_PARAMS.items():
+        prob.set_val('OD.' + name, val)
+    set_off_design_guesses(prob, 'OD')
+    prob.final_setup()
+    return prob
+
+
+def design_values(od_prob, tab_spec=None):
+    """
+    Run the design point of pycycle.ipynb and return the values the off-design Turbojet in
+    od_prob needs from it, as {off-design input: value in the units of that input}.
+    """
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('DESIGN', Turbojet(tab_spec=tab_spec))
+    prob.model.set_input_defaults('DESIGN.Nmech', 8070.0, units='rpm')
+    prob.model.set_input_defaults('DESIGN.inlet.MN', 0.60)
+    prob.model.set_input_defaults('DESIGN.comp.MN', 0.020)
+    prob.model.set_input_defaults('DESIGN.burner.MN', 0.020)
+    prob.model.set_input_defaults('DESIGN.turb.MN', 0.4)
+    prob.setup(check=False)
+
+    set_design_point(prob)
+    for name, val in CYCLE_PARAMS.items():
+        prob.set_val('DESIGN.' + name, val)
+    prob.set_solver_print(level=-1)
+    prob.run_model()
+
+    meta = od_prob.model.get_io_metadata(metadata_keys=('units',))
+    prom_units = {m['prom_name']: m['units'] for m in meta.values()}
+    return {tgt: prob.get_val('DESIGN.' + src, units=prom_units['OD.' + tgt])
+            for src, tgt in des_od_connections(od_prob)}
+
+
+def _solve(prob):
+    """
+    Run the model; return whether the off-design Newton solve converged and its iterations.
+    """
+    newton = prob.model.OD.nonlinear_solver
+    try:
+        prob.run_model()
+    except om.AnalysisError:
+        return False, newton._iter_count
+    return True, newton._iter_count
+
+
+def _neighbors(idx, states, shape):
+    """
+    Converged points ordered by distance from idx in normalized grid coordinates.
+    """
+    if not states:
+        return []
+    done = list(states)
+    scale = np.maximum(np.array(shape) - 1, 1)
+    dist = np.linalg.norm((np.array(done) - np.array(idx)) / scale, axis=1)
+    return [done[i] for i in np.argsort(dist, kind='stable')]
+
+
+def generate_deck(out_dir, MNs, alts, throttles, Fn_ref=11800.0, warm_start=True,
+                  max_attempts=3, commit_every=20, tab_spec=None):
+    """
+    Run the off-design Turbojet over a Mach x altitude x throttle grid into a columnar deck.
+
+    The thrust target of a point is throttle * Fn_ref * delta, with delta the ambient
+    pressure ratio of its altitude. Points are run in serpentine order, so every point
+    follows one of its grid neighbors. With warm_start, each point starts from the saved
+    solution of the nearest converged point; if its solve fails, it is retried from the
+    next nearest ones and finally from the default guesses, up to max_attempts starts.
+    Without warm_start, every point starts from the default guesses.
+
+    Points are appended to out_dir with case_columns.ColumnWriter and published every
+    commit_every points. Points already in out_dir are skipped, so an interrupted deck is
+    finished by calling this again with the same arguments.
+
+    Returns
+    -------
+    dict
+        Points run, failures, total Newton iterations and wall time.
+    """
+    shape = (len(MNs), len(alts), len(throttles))
+
+    done = set()
+    if os.path.isfile(os.path.join(out_dir, MANIFEST)):
+        done = set(load_columns(out_dir)['counter'].tolist())
+
+    prob = build_od_problem(tab_spec)
+    design = design_values(prob, tab_spec)
+    outputs = prob.model._outputs
+    cold = outputs.asarray().copy()
+
+    writer = ColumnWriter(out_dir)
+    states = {}
+    summary = {'points': 0, 'failures': 0, 'newton_iters': 0, 'time': 0.0}
+    st = time.time()
+
+    for idx in serpentine(shape):
+        counter = int(np.ravel_multi_index(idx, shape))
+        if counter in done:
+            continue
+        i, j, k = idx
+        Fn_target = throttles[k] * Fn_ref * pressure_ratio(alts[j])
+
+        starts = _neighbors(idx, states, shape)[:max_attempts - 1] if warm_start else []
+        starts.append(None)
+
+        iters = 0
+        for attempt, start in enumerate(starts):
+            # Restore the state first: it holds the flight conditions of the start point too.
+            outputs.set_val(cold if start is None else states[start])
+            prob.set_val('OD.fc.MN', MNs[i])
+            prob.set_val('OD.fc.alt', alts[j], units='ft')
+            prob.set_val('OD.balance.Fn_target', Fn_target, units='lbf')
+            for tgt, val in design.items():
+                prob.set_val('OD.' + tgt, val)
+
+            converged, n = _solve(prob)
+            iters += n
+            if converged:
+                break
+
+        if converged and warm_start:
+            states[idx] = outputs.asarray().copy()
+
+        vals = {'MN': MNs[i], 'alt': alts[j], 'throttle': throttles[k],
+                'Fn_target': Fn_target, 'converged': float(converged),
+                'newton_iters': float(iters), 'attempts': float(attempt + 1)}
+        for name in DECK_OUTPUTS:
+            vals[name] = prob.get_val('OD.' + name)[0] if converged else np.nan
+        writer.append(counter, vals)
+
+        summary['points'] += 1
+        summary['failures'] += not converged
+        summary['newton_iters'] += iters
+        if summary['points'] % commit_every == 0:
+            writer.commit()
+
+    writer.close()
+    summary['time'] = time.time() - st
+    return summary
+
+
+if __name__ == '__main__':
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    MNs = np.linspace(0.000001, 0.8, n)
+    alts = np.linspace(0.0, 35000.0, n)
+    throttles = np.linspace(1.0, 0.5, n)
+
+    for label, warm_start in (('default guesses', False), ('continuation', True)):
+        out_dir = 'turbojet_deck_%s' % ('warm' if warm_start else 'cold')
+        shutil.rmtree(out_dir, ignore_errors=True)
+        s = generate_deck(out_dir, MNs, alts, throttles, warm_start=warm_start)
+        print('%-16s %d points, %d failed, %.1f Newton iterations per point, %.1f s' %
+              (label, s['points'], s['failures'], s['newton_iters'] / s['points'], s['time']))
+
+    deck = load_columns('turbojet_deck_warm')
+    print('Deck columns:', ', '.join(sorted(deck)))
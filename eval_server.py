@@ -0,0 +1,283 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+# A message is a 4 byte header length, a JSON header and the raw bytes of the arrays the
+# header lists under 'arrays' as [dtype, shape], in order.
+_LEN = struct.Struct('!I')
+
+
+class EvalServerError(Exception):
+    """
+    An error raised by the server while handling a request.
+    """
+    pass
+
+
+def _send(sock, header, arrays=()):
+    arrays = [np.require(a, requirements='C') for a in arrays]
+    header = dict(header, arrays=[[a.dtype.str, list(a.shape)] for a in arrays])
+    head = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    parts = [memoryview(_LEN.pack(len(head))), memoryview(head)]
+    parts.extend(memoryview(a.reshape(-1).view(np.uint8)) for a in arrays if a.nbytes)
+
+    # sendmsg writes all parts with one system call, but may stop part way.
+    while parts:
+        sent = sock.sendmsg(parts)
+        while parts and sent >= parts[0].nbytes:
+            sent -= parts[0].nbytes
+            parts.pop(0)
+        if sent:
+            parts[0] = parts[0][sent:]
+
+
+def _recv_into(sock, view):
+    pos = 0
+    while pos < view.nbytes:
+        n = sock.recv_into(view[pos:])
+        if n == 0:
+            raise EOFError('Connection closed')
+        pos += n
+
+
+def _recv(sock):
+    size = bytearray(_LEN.size)
+    _recv_into(sock, memoryview(size))
+    head = bytearray(_LEN.unpack(size)[0])
+    _recv_into(sock, memoryview(head))
+    header = json.loads(head)
+
+    arrays = []
+    for dtype, shape in header.pop('arrays'):
+        arr = np.empty(shape, dtype=dtype)
+        if arr.nbytes:
+            _recv_into(sock, memoryview(arr.reshape(-1).view(np.uint8)))
+        arrays.append(arr)
+    return header, arrays
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """
+    Serves the requests of one client connection until it closes.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                header, arrays = _recv(self.request)
+            except EOFError:
+                return
+            try:
+                reply, out = self.server.dispatch(header, arrays)
+            except Exception as err:
+                reply, out = {'error': '%s: %s' % (type(err).__name__, err)}, []
+            _send(self.request, reply, out)
+
+
+class EvalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Keeps named, set-up Problems resident and evaluates them for clients on a Unix socket.
+
+    Every client connection gets a thread; requests to the same Problem are serialized by a
+    lock. The requests are
+
+    - problems: names of the resident Problems
+    - set_val: set 'names' (with optional 'units') to the arrays of the request
+    - get_val: values of 'names' (with optional 'units')
+    - run_model
+    - compute_totals: totals of 'of' with respect to 'wrt', one array per pair, of-major
+    - evaluate: set_val, run_model and get_val of 'outputs' in one round trip
+
+    Parameters
+    ----------
+    path : str
+        Socket file; an existing one is replaced.
+    problems : dict
+        {name: function returning a set-up Problem}. All are built at startup.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, problems):
+        self.problems = {}
+        self.locks = {}
+        for name, build in problems.items():
+            prob = build()
+            prob.final_setup()
+            prob.set_solver_print(level=-1)
+            self.problems[name] = prob
+            self.locks[name] = threading.Lock()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+    def dispatch(self, header, arrays):
+        op = header['op']
+        if op == 'problems':
+            return {'problems': sorted(self.problems)}, []
+
+        name = header['problem']
+        if name not in self.problems:
+            raise KeyError("No problem named '%s'" % name)
+        prob = self.problems[name]
+
+        with self.locks[name]:
+            if op in ('set_val', 'evaluate'):
+                units = header.get('units') or [None] * len(header['names'])
+                for var, u, val in zip(header['names'], units, arrays):
+                    prob.set_val(var, val, units=u)
+            if op in ('run_model', 'evaluate'):
+                prob.run_model()
+
+            if op == 'evaluate':
+                return {}, [prob.get_val(var) for var in header['outputs']]
+            if op == 'get_val':
+                units = header.get('units') or [None] * len(header['names'])
+                return {}, [prob.get_val(var, units=u) for var, u in zip(header['names'], units)]
+            if op == 'compute_totals':
+                totals = prob.compute_totals(of=header['of'], wrt=header['wrt'])
+                return {}, [totals[of, wrt] for of in header['of'] for wrt in header['wrt']]
+            if op in ('set_val', 'run_model'):
+                return {}, []
+
+        raise ValueError("Unknown request '%s'" % op)
+
+
+class EvalClient(object):
+    """
+    Client of an EvalServer, for one Problem on it (or any, with the problem argument).
+    """
+
+    def __init__(self, path, problem=None):
+        self.problem = problem
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def _call(self, op, arrays=(), problem=None, **kwargs):
+        header = dict(kwargs, op=op, problem=problem or self.problem)
+        _send(self.sock, header, arrays)
+        reply, out = _recv(self.sock)
+        if 'error' in reply:
+            raise EvalServerError(reply['error'])
+        return reply, out
+
+    def problems(self):
+        return self._call('problems')[0]['problems']
+
+    def set_val(self, name, val, units=None, problem=None):
+        self._call('set_val', [np.asarray(val, dtype=float)], problem, names=[name],
+                   units=[units])
+
+    def get_val(self, name, units=None, problem=None):
+        return self._call('get_val', (), problem, names=[name], units=[units])[1][0]
+
+    def run_model(self, problem=None):
+        self._call('run_model', (), problem)
+
+    def compute_totals(self, of, wrt, problem=None):
+        out = iter(self._call('compute_totals', (), problem, of=of, wrt=wrt)[1])
+        return {(o, w): next(out) for o in of for w in wrt}
+
+    def evaluate(self, inputs, outputs, problem=None):
+        """
+        Set inputs ({name: value}), run the model and return {name: value} of outputs.
+        """
+        names = list(inputs)
+        out = self._call('evaluate', [np.asarray(inputs[n], dtype=float) for n in names],
+                         problem, names=names, outputs=list(outputs))[1]
+        return dict(zip(outputs, out))
+
+
+def _serve(path, names=None):
+    from benchmark_examples import BENCHMARKS
+
+    os.environ['OPENMDAO_REPORTS'] = '0'
+    names = names or list(BENCHMARKS)
+    st = time.time()
+    server = EvalServer(path, {name: BENCHMARKS[name] for name in names})
+    print('Serving %s on %s (startup %.2f s)' % (', '.join(names), path, time.time() - st),
+          flush=True)
+    return server
+
+
+if __name__ == '__main__':
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'bench'
+    path = sys.argv[2] if len(sys.argv) > 2 else '/tmp/openmdao_eval.sock'
+
+    if command == 'serve':
+        server = _serve(path, sys.argv[3:])
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+    else:
+        # Cold start: a fresh interpreter that imports OpenMDAO, sets up and runs once.
+        st = time.time()
+        subprocess.run([sys.executable, '-c',
+                        'from benchmark_examples import BENCHMARKS; BENCHMARKS["sellar"]().run_model()'],
+                       check=True, env=dict(os.environ, OPENMDAO_REPORTS='0'),
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        cold = time.time() - st
+
+        server = _serve(path, ['sellar', 'actuator_disc'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        with EvalClient(path, 'sellar') as client:
+            n = 1000
+            st = time.perf_counter()
+            for i in range(n):
+                client.get_val('obj_cmp.obj')
+            get_time = (time.perf_counter() - st) / n
+
+            st = time.perf_counter()
+            for i in range(n):
+                out = client.evaluate({'x': 2.0 + i * 1e-3, 'z': [-1., -1.]},
+                                      ['obj_cmp.obj', 'con_cmp1.con1'])
+            eval_time = (time.perf_counter() - st) / n
+
+            st = time.perf_counter()
+            for i in range(100):
+                client.compute_totals(['obj_cmp.obj'], ['x', 'z'])
+            totals_time = (time.perf_counter() - st) / 100
+
+            bins = client.get_val('Vu', problem='actuator_disc')
+            st = time.perf_counter()
+            client.set_val('Vu', bins * 1.1, units='m/s', problem='actuator_disc')
+            aep = client.evaluate({}, ['AEP'], problem='actuator_disc')['AEP']
+            aep_time = time.perf_counter() - st
+
+        server.shutdown()
+        server.server_close()
+
+        print('cold start + one evaluation: %10.1f ms' % (cold * 1e3))
+        print('get_val round trip:          %10.1f us' % (get_time * 1e6))
+        print('evaluate round trip:         %10.1f us' % (eval_time * 1e6))
+        print('compute_totals round trip:   %10.1f us' % (totals_time * 1e6))
+        print('actuator disc set + evaluate: %9.1f us, AEP %g' % (aep_time * 1e6, aep[0]))
@@ -0,0 +1,280 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+
+
+MU_EARTH = 398600.4418  # km**3/s**2
+
+
+class VCircComp(om.ExplicitComponent):
+    """
+    Computes the circular orbit velocity given a radius and gravitational
+    parameter, for num_nodes independent orbits at once.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_input('r', val=np.ones(nn), desc='Radius from central body', units='km')
+        self.add_input('mu', val=np.ones(nn), desc='Gravitational parameter of central body',
+                       units='km**3/s**2')
+
+        self.add_output('vcirc', val=np.ones(nn), desc='Circular orbit velocity at given radius '
+                                                       'and gravitational parameter',
+                        units='km/s')
+
+        # Every node is independent of the others, so only the diagonal is nonzero.
+        ar = np.arange(nn)
+        self.declare_partials(of='vcirc', wrt='r', rows=ar, cols=ar)
+        self.declare_partials(of='vcirc', wrt='mu', rows=ar, cols=ar)
+
+    def compute(self, inputs, outputs):
+        r = inputs['r']
+        mu = inputs['mu']
+
+        outputs['vcirc'] = np.sqrt(mu / r)
+
+    def compute_partials(self, inputs, partials):
+        r = inputs['r']
+        mu = inputs['mu']
+        vcirc = np.sqrt(mu / r)
+
+        partials['vcirc', 'mu'] = 0.5 / (r * vcirc)
+        partials['vcirc', 'r'] = -0.5 * mu / (vcirc * r ** 2)
+
+
+class TransferOrbitComp(om.ExplicitComponent):
+    """
+    Computes the periapsis and apoapsis velocities of num_nodes Hohmann
+    transfer orbits.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_input('mu', val=np.ones(nn), desc='Gravitational parameter of central body',
+                       units='km**3/s**2')
+        self.add_input('rp', val=7000.0 * np.ones(nn), desc='periapsis radius', units='km')
+        self.add_input('ra', val=42164.0 * np.ones(nn), desc='apoapsis radius', units='km')
+
+        self.add_output('vp', val=np.zeros(nn), desc='periapsis velocity', units='km/s')
+        self.add_output('va', val=np.zeros(nn), desc='apoapsis velocity', units='km/s')
+
+        ar = np.arange(nn)
+        self.declare_partials(of='*', wrt='*', rows=ar, cols=ar)
+
+    def compute(self, inputs, outputs):
+        mu = inputs['mu']
+        rp = inputs['rp']
+        ra = inputs['ra']
+
+        # a * (1 - e**2) with a = (ra + rp) / 2 and e = (ra - rp) / (ra + rp)
+        p = 2.0 * ra * rp / (ra + rp)
+        h = np.sqrt(mu * p)
+
+        outputs['vp'] = h / rp
+        outputs['va'] = h / ra
+
+    def compute_partials(self, inputs, partials):
+        mu = inputs['mu']
+        rp = inputs['rp']
+        ra = inputs['ra']
+
+        p = 2.0 * ra * rp / (ra + rp)
+        h = np.sqrt(mu * p)
+
+        dp_drp = 2.0 * ra ** 2 / (ra + rp) ** 2
+        dp_dra = 2.0 * rp ** 2 / (ra + rp) ** 2
+
+        dh_dmu = 0.5 * p / h
+        dh_drp = 0.5 * mu / h * dp_drp
+        dh_dra = 0.5 * mu / h * dp_dra
+
+        partials['vp', 'mu'] = dh_dmu / rp
+        partials['vp', 'rp'] = dh_drp / rp - h / rp ** 2
+        partials['vp', 'ra'] = dh_dra / rp
+
+        partials['va', 'mu'] = dh_dmu / ra
+        partials['va', 'rp'] = dh_drp / ra
+        partials['va', 'ra'] = dh_dra / ra - h / ra ** 2
+
+
+class DeltaVComp(om.ExplicitComponent):
+    """
+    Compute the delta-V performed given the magnitude of two velocities
+    and the angle between them, for num_nodes independent burns.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_input('v1', val=np.ones(nn), desc='Initial velocity', units='km/s')
+        self.add_input('v2', val=np.ones(nn), desc='Final velocity', units='km/s')
+        self.add_input('dinc', val=np.ones(nn), desc='Plane change', units='rad')
+
+        self.add_output('delta_v', val=np.zeros(nn), desc='Delta-V', units='km/s')
+
+        ar = np.arange(nn)
+        self.declare_partials(of='delta_v', wrt='v1', rows=ar, cols=ar)
+        self.declare_partials(of='delta_v', wrt='v2', rows=ar, cols=ar)
+        self.declare_partials(of='delta_v', wrt='dinc', rows=ar, cols=ar)
+
+    def compute(self, inputs, outputs):
+        v1 = inputs['v1']
+        v2 = inputs['v2']
+        dinc = inputs['dinc']
+
+        outputs['delta_v'] = np.sqrt(v1 ** 2 + v2 ** 2 - 2.0 * v1 * v2 * np.cos(dinc))
+
+    def compute_partials(self, inputs, partials):
+        v1 = inputs['v1']
+        v2 = inputs['v2']
+        dinc = inputs['dinc']
+
+        delta_v = np.sqrt(v1 ** 2 + v2 ** 2 - 2.0 * v1 * v2 * np.cos(dinc))
+
+        partials['delta_v', 'v1'] = 0.5 / delta_v * (2 * v1 - 2 * v2 * np.cos(dinc))
+        partials['delta_v', 'v2'] = 0.5 / delta_v * (2 * v2 - 2 * v1 * np.cos(dinc))
+        partials['delta_v', 'dinc'] = 0.5 / delta_v * (2 * v1 * v2 * np.sin(dinc))
+
+
+class HohmannGroup(om.Group):
+    """
+    The Hohmann transfer model from OpenMDAO-examples-hohmann-transfer.py,
+    evaluated for num_nodes (r1, r2, dinc) combinations at once.
+
+    Only the first plane change dinc1 is free; dinc2 = dinc - dinc1, so each
+    node satisfies its total inclination change without an equality constraint.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        self.add_subsystem('leo', VCircComp(num_nodes=nn), promotes_inputs=[('r', 'r1'), 'mu'])
+        self.add_subsystem('geo', VCircComp(num_nodes=nn), promotes_inputs=[('r', 'r2'), 'mu'])
+
+        self.add_subsystem('transfer', TransferOrbitComp(num_nodes=nn),
+                           promotes_inputs=[('rp', 'r1'), ('ra', 'r2'), 'mu'])
+
+        self.add_subsystem('dinc_split',
+                           om.ExecComp('dinc2 = dinc - dinc1', has_diag_partials=True,
+                                       dinc2={'shape': nn, 'units': 'deg'},
+                                       dinc={'shape': nn, 'units': 'deg'},
+                                       dinc1={'shape': nn, 'units': 'deg'}),
+                           promotes=['dinc', 'dinc1', 'dinc2'])
+
+        self.add_subsystem('dv1', DeltaVComp(num_nodes=nn), promotes_inputs=[('dinc', 'dinc1')])
+        self.add_subsystem('dv2', DeltaVComp(num_nodes=nn), promotes_inputs=[('dinc', 'dinc2')])
+
+        self.connect('leo.vcirc', 'dv1.v1')
+        self.connect('transfer.vp', 'dv1.v2')
+        self.connect('transfer.va', 'dv2.v1')
+        self.connect('geo.vcirc', 'dv2.v2')
+
+        self.add_subsystem('dv_total',
+                           om.ExecComp('delta_v=dv1+dv2', has_diag_partials=True,
+                                       delta_v={'shape': nn, 'units': 'km/s'},
+                                       dv1={'shape': nn, 'units': 'km/s'},
+                                       dv2={'shape': nn, 'units': 'km/s'}),
+                           promotes=['delta_v'])
+
+        self.connect('dv1.delta_v', 'dv_total.dv1')
+        self.connect('dv2.delta_v', 'dv_total.dv2')
+
+        # Nodes are independent, so minimizing the mean minimizes every node. Unlike the sum,
+        # the mean stays of order one for any num_nodes.
+        self.add_subsystem('dv_mean',
+                           om.ExecComp('delta_v_mean=sum(delta_v)/%d' % nn,
+                                       delta_v_mean={'units': 'km/s'},
+                                       delta_v={'shape': nn, 'units': 'km/s'}),
+                           promotes=['delta_v', 'delta_v_mean'])
+
+        self.set_input_defaults('mu', val=MU_EARTH * np.ones(nn), units='km**3/s**2')
+        self.set_input_defaults('r1', val=6778.0 * np.ones(nn), units='km')
+        self.set_input_defaults('r2', val=42164.0 * np.ones(nn), units='km')
+        self.set_input_defaults('dinc', val=28.5 * np.ones(nn), units='deg')
+        self.set_input_defaults('dinc1', val=np.zeros(nn), units='deg')
+
+
+def optimal_delta_v_grid(r1, r2, dinc, mu=MU_EARTH):
+    """
+    Optimize the inclination split for every (r1, r2, dinc) combination in one run_driver.
+
+    Parameters
+    ----------
+    r1 : array_like
+        Initial circular orbit radii in km.
+    r2 : array_like
+        Final circular orbit radii in km.
+    dinc : array_like
+        Total plane changes in deg.
+    mu : float
+        Gravitational parameter of the central body in km**3/s**2.
+
+    Returns
+    -------
+    tuple of ndarray
+        Optimal delta-v (km/s) and optimal dinc1 (deg), each shaped (len(r1), len(r2), len(dinc)).
+    """
+    R1, R2, DINC = np.meshgrid(r1, r2, dinc, indexing='ij')
+    grid_shape = R1.shape
+    nn = R1.size
+
+    prob = om.Problem()
+    prob.model.add_subsystem('hohmann', HohmannGroup(num_nodes=nn), promotes=['*'])
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+    prob.driver.options['disp'] = False
+    # The gradient of the mean with respect to each node's dinc1 is 1/nn of that node's, so
+    # the tolerance has to shrink with nn for every node to converge.
+    prob.driver.options['tol'] = 1e-9 / nn
+    prob.driver.options['maxiter'] = 500
+
+    # dinc1 is bounded per node by that node's total plane change.
+    prob.model.add_design_var('dinc1', lower=0.0, upper=DINC.ravel(), units='deg')
+    prob.model.add_objective('delta_v_mean')
+
+    # One objective and nn design variables, so a single reverse solve gives the gradient.
+    prob.setup(mode='rev')
+
+    prob.set_val('mu', mu * np.ones(nn), units='km**3/s**2')
+    prob.set_val('r1', R1.ravel(), units='km')
+    prob.set_val('r2', R2.ravel(), units='km')
+    prob.set_val('dinc', DINC.ravel(), units='deg')
+    prob.set_val('dinc1', np.zeros(nn), units='deg')
+
+    prob.run_driver()
+
+    delta_v = prob.get_val('delta_v', units='km/s').reshape(grid_shape)
+    dinc1 = prob.get_val('dinc1', units='deg').reshape(grid_shape)
+
+    return delta_v, dinc1
+
+
+if __name__ == '__main__':
+
+    r1 = np.linspace(6578.0, 7378.0, 9)
+    r2 = np.linspace(26000.0, 42164.0, 9)
+    dinc = np.linspace(0.0, 28.5, 7)
+
+    st = time.time()
+    delta_v, dinc1 = optimal_delta_v_grid(r1, r2, dinc)
+    print('Optimized %d transfers in %.3f s' % (delta_v.size, time.time() - st))
+
+    # LEO (6778 km) -> GEO (42164 km) with 28.5 deg plane change, as in the scalar example.
+    dv, d1 = optimal_delta_v_grid([6778.0], [42164.0], [28.5])
+    print('Optimized Delta-V (km/s):', dv.ravel()[0])
+    print('Inclination change split (deg):', d1.ravel()[0], 28.5 - d1.ravel()[0])
+
+    print('Minimum Delta-V over grid (km/s):', delta_v.min())
+    print('Maximum Delta-V over grid (km/s):', delta_v.max())
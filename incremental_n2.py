@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import openmdao.api as om
+
+from compact_n2 import compress_model, decompress_model
+from model_signature import structure_hash
+
+
+_MODEL_RE = re.compile(r'var compressedModel = "([^"]*)"')
+
+
+def values_hash(prob):
+    """
+    Hash of the current input and output values of a Problem.
+    """
+    model = prob.model
+    sha = hashlib.sha1()
+    for vec in (model._inputs, model._outputs):
+        sha.update(np.ascontiguousarray(vec.asarray()).tobytes())
+    return sha.hexdigest()
+
+
+def _patch_values(node, prob, path=''):
+    """
+    Refresh the values shown for every variable in the N2 tree below node.
+    """
+    for child in node.get('children', []):
+        child_path = child['name'] if not path else path + '.' + child['name']
+        if child['type'] not in ('input', 'output'):
+            _patch_values(child, prob, child_path)
+            continue
+        if child.get('is_discrete') or 'val' not in child:
+            continue
+
+        val = np.asarray(prob.model._abs_get_val(child_path, flat=False))
+        if child['val'] is not None:
+            child['val'] = val.tolist()
+        if val.size > 0 and 'val_min' in child:
+            imin, imax = np.argmin(val), np.argmax(val)
+            child['val_min'] = float(val.flat[imin])
+            child['val_max'] = float(val.flat[imax])
+            child['val_min_indices'] = [int(i) for i in np.unravel_index(imin, val.shape)]
+            child['val_max_indices'] = [int(i) for i in np.unravel_index(imax, val.shape)]
+
+
+def n2_incremental(prob, outfile='n2.html', **kwargs):
+    """
+    Write an N2 diagram only as far as it is out of date.
+
+    A sidecar file next to outfile stores the structure hash of the model (systems,
+    options, variables, connections, design vars, responses and solvers) and a hash of its
+    values. If both match, the file is left alone. If only the values changed, the
+    compressed model data embedded in the file is decoded, its values are refreshed from
+    the Problem and it is written back, without rebuilding the diagram. Otherwise om.n2 is
+    called with kwargs.
+
+    Works for pages written by om.n2 and by compact_n2.
+
+    Returns
+    -------
+    str
+        'reused', 'patched' or 'generated'.
+    """
+    prob.final_setup()
+
+    key_file = outfile + '.key'
+    keys = {'structure': structure_hash(prob, extra=kwargs, solvers=True),
+            'values': values_hash(prob)}
+
+    old = None
+    if os.path.isfile(outfile) and os.path.isfile(key_file):
+        with open(key_file) as f:
+            old = json.load(f)
+
+    if old is not None and old['structure'] == keys['structure']:
+        if old['values'] == keys['values']:
+            return 'reused'
+
+        with open(outfile) as f:
+            html = f.read()
+        match = _MODEL_RE.search(html)
+        if match is not None:
+            data = decompress_model(match.group(1))
+            _patch_values(data['tree'], prob)
+            html = html[:match.start(1)] + compress_model(data) + html[match.end(1):]
+            _write(outfile, html)
+            _write(key_file, json.dumps(keys))
+            return 'patched'
+
+    kwargs.setdefault('show_browser', False)
+    om.n2(prob, outfile=outfile, **kwargs)
+    _write(key_file, json.dumps(keys))
+    return 'generated'
+
+
+def _write(path, text):
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+
+    from wind_farm import build_farm
+
+    prob = build_farm(8, 8)
+    prob.setup()
+    prob.set_val('V_inf', 10.0, units='m/s')
+    prob.set_val('rho', 1.225, units='kg/m**3')
+    for step in ('first call', 'unchanged', 'new values', 'unchanged'):
+        if step == 'new values':
+            prob.run_model()
+        st = time.time()
+        action = n2_incremental(prob, outfile='farm_n2_incremental.html')
+        print('%-12s %-10s %.3f s' % (step, action, time.time() - st))
@@ -0,0 +1,342 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from openmdao.utils.coloring import compute_total_coloring
+
+from circle_packing import build_circle_packing, set_initial_values
+
+
+def _flat_indices(meta, full_size):
+    idx = meta.get('indices')
+    if idx is None:
+        return np.arange(full_size)
+    try:
+        return idx.shaped_array(flat=True)
+    except Exception:
+        return np.asarray(idx).ravel()
+
+
+def _total_info(prob):
+    """
+    (source, full size, flat indices) of the design vars and of the nonlinear responses.
+
+    Seeds and results are keyed by source, since compute_jacvec_product does not resolve
+    promoted input names (design vars connected to auto_ivc outputs) on every version.
+    """
+    desvars = prob.model.get_design_vars(recurse=True, get_sizes=True)
+    responses = [meta for meta in
+                 prob.model.get_responses(recurse=True, get_sizes=True).values()
+                 if not meta.get('linear')]
+
+    info = []
+    for metas in (desvars.values(), responses):
+        entries = []
+        for meta in metas:
+            full = prob.get_val(meta['source']).size
+            entries.append((meta['source'], full, _flat_indices(meta, full)))
+        info.append(entries)
+    return info
+
+
+def _jvp(prob, mode, seeds, results, seed_name, k):
+    seed = {name: np.zeros(full) for name, full, _ in seeds}
+    seed[seed_name][k] = 1.0
+    of, wrt = (results, seeds) if mode == 'fwd' else (seeds, results)
+    return prob.compute_jacvec_product([info[0] for info in of], [info[0] for info in wrt],
+                                       mode, seed)
+
+
+def _modes(prob):
+    """
+    Modes in which prob can solve: both if it was set up in 'auto' mode.
+    """
+    return ('fwd', 'rev') if prob._orig_mode == 'auto' else (prob._orig_mode,)
+
+
+def total_sparsity(prob):
+    """
+    Sparsity of the driver's total Jacobian (nonlinear responses x design vars).
+
+    The pattern is found with one Jacobian-vector product per design var entry (fwd) or
+    per response entry (rev), whichever is fewer if prob was set up in 'auto' mode, and
+    is kept sparse, so it is feasible for sizes where the dense total Jacobian would not
+    fit in memory.
+
+    Parameters
+    ----------
+    prob : Problem
+        A set-up Problem whose model has been run at a representative point.
+
+    Returns
+    -------
+    scipy.sparse.csc_matrix
+        Boolean pattern of the total Jacobian.
+    """
+    wrt_info, of_info = _total_info(prob)
+    n_wrt = sum(info[2].size for info in wrt_info)
+    n_of = sum(info[2].size for info in of_info)
+
+    modes = _modes(prob)
+    mode = modes[0] if len(modes) == 1 else ('fwd' if n_wrt <= n_of else 'rev')
+    seeds, results = (wrt_info, of_info) if mode == 'fwd' else (of_info, wrt_info)
+
+    # compute_jacvec_product only solves the linear system, with the partials of the last
+    # linearization.
+    prob.model.run_linearize()
+
+    rows, cols = [], []
+    seed_offset = 0
+    for seed_name, _, seed_idx in seeds:
+        for k in seed_idx:
+            jvp = _jvp(prob, mode, seeds, results, seed_name, k)
+
+            res_offset = 0
+            for res_name, _, res_idx in results:
+                nz = np.nonzero(np.asarray(jvp[res_name]).ravel()[res_idx])[0] + res_offset
+                rows.append(nz)
+                cols.append(np.full(nz.size, seed_offset))
+                res_offset += res_idx.size
+            seed_offset += 1
+
+    res_entries = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    seed_entries = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+
+    if mode == 'fwd':
+        r, c = res_entries, seed_entries
+    else:
+        r, c = seed_entries, res_entries
+
+    return sp.csc_matrix((np.ones(r.size, dtype=bool), (r, c)), shape=(n_of, n_wrt))
+
+
+def solve_time(prob, mode, num_solves=10):
+    """
+    Mean seconds per linear solve of mode ('fwd' or 'rev'), timed over num_solves
+    Jacobian-vector products at the partials of the last linearization.
+    """
+    wrt_info, of_info = _total_info(prob)
+    seeds, results = (wrt_info, of_info) if mode == 'fwd' else (of_info, wrt_info)
+    entries = [(name, k) for name, _, idx in seeds for k in idx]
+    picks = np.linspace(0, len(entries) - 1, min(num_solves, len(entries))).astype(int)
+
+    st = time.perf_counter()
+    for i in picks:
+        _jvp(prob, mode, seeds, results, *entries[i])
+    return (time.perf_counter() - st) / max(picks.size, 1)
+
+
+def column_colors(J):
+    """
+    Largest-first greedy coloring of the columns of sparse J, as an array of colors.
+
+    Two columns may share a color (and so a linear solve) when no row has a nonzero in both.
+    """
+    J = sp.csc_matrix(J, dtype=float)
+    n_cols = J.shape[1]
+    colors = np.full(n_cols, -1)
+    if n_cols == 0:
+        return colors
+
+    G = (J.T @ J).tocsr()
+    order = np.argsort(-np.diff(G.indptr), kind='stable')
+    for c in order:
+        nbr_colors = colors[G.indices[G.indptr[c]:G.indptr[c + 1]]]
+        used = set(nbr_colors[nbr_colors >= 0].tolist())
+        color = 0
+        while color in used:
+            color += 1
+        colors[c] = color
+
+    return colors
+
+
+def greedy_column_colors(J):
+    """
+    Number of colors of a largest-first greedy coloring of the columns of sparse J.
+    """
+    J = sp.csc_matrix(J, dtype=float)
+    n_rows, n_cols = J.shape
+    if n_cols == 0:
+        return 0
+
+    # A full row couples every column, so nothing can share a color.
+    if np.any(np.diff(J.tocsr().indptr) == n_cols) and n_cols > 1:
+        return n_cols
+
+    return column_colors(J).max() + 1
+
+
+def plan_derivative_mode(prob, expected_iterations=50, num_full_jacs=3):
+    """
+    Pick the cheapest of fwd/rev, colored/uncolored for the driver's total derivatives.
+
+    The cost of every option is estimated in seconds: its linear solves per gradient over
+    the expected number of optimizer iterations, times the time of a solve in its mode,
+    measured on the model. A Problem set up in 'auto' mode can solve in both modes; if it
+    was set up in one mode, solves in the other are assumed to take as long. Colored modes also pay once for the num_full_jacs Jacobians
+    OpenMDAO computes in their mode to find the sparsity before coloring. The probe of
+    the planner itself (total_sparsity and the timed solves) is part of every option.
+
+    Parameters
+    ----------
+    prob : Problem
+        A set-up Problem whose model has been run at a representative point.
+    expected_iterations : int
+        Number of gradient evaluations the cost is amortized over.
+    num_full_jacs : int
+        Full Jacobians OpenMDAO computes to detect the total sparsity when coloring.
+
+    Returns
+    -------
+    dict
+        'mode' ('fwd' or 'rev'), 'colored' (bool), 'solves' (linear solves per gradient
+        for every option), 'solve_time' (seconds per solve in fwd and rev), 'probe_time'
+        (seconds the planner spent), 'cost' (estimated seconds for every option) and
+        'reason', a printable summary.
+    """
+    st = time.perf_counter()
+    J = total_sparsity(prob)
+    n_of, n_wrt = J.shape
+    t_solve = {mode: solve_time(prob, mode) for mode in _modes(prob)}
+    for mode in ('fwd', 'rev'):
+        t_solve.setdefault(mode, t_solve[_modes(prob)[0]])
+    probe_time = time.perf_counter() - st
+
+    solves = {
+        ('fwd', False): n_wrt,
+        ('rev', False): n_of,
+        ('fwd', True): greedy_column_colors(J),
+        ('rev', True): greedy_column_colors(J.T),
+    }
+    full_jac = {'fwd': n_wrt, 'rev': n_of}
+    cost = {(mode, colored): probe_time + t_solve[mode] *
+            (expected_iterations * n + (num_full_jacs * full_jac[mode] if colored else 0))
+            for (mode, colored), n in solves.items()}
+
+    mode, colored = min(cost, key=lambda key: (cost[key], key[1]))
+
+    lines = ['mode planner: total Jacobian is %d x %d with %d nonzeros (%.2f%% dense), '
+             'solves take %.2e s fwd and %.2e s rev, probe %.3f s' %
+             (n_of, n_wrt, J.nnz, 100. * J.nnz / max(n_of * n_wrt, 1), t_solve['fwd'],
+              t_solve['rev'], probe_time)]
+    for key in sorted(cost):
+        lines.append('mode planner:   %s %-9s %6d solves/gradient, cost %.3f s' %
+                     (key[0], 'colored' if key[1] else 'uncolored', solves[key], cost[key]))
+    lines.append('mode planner: choosing %s %s (%d iterations expected)' %
+                 (mode, 'colored' if colored else 'uncolored', expected_iterations))
+
+    return {'mode': mode, 'colored': colored,
+            'solves': {'%s%s' % (k[0], '_colored' if k[1] else ''): v for k, v in solves.items()},
+            'solve_time': t_solve, 'probe_time': probe_time,
+            'cost': {'%s%s' % (k[0], '_colored' if k[1] else ''): v for k, v in cost.items()},
+            'reason': '\n'.join(lines)}
+
+
+def setup_with_planned_mode(prob, initialize=None, **kwargs):
+    """
+    Set up prob in the derivative mode chosen by plan_derivative_mode.
+
+    Parameters
+    ----------
+    prob : Problem
+        A Problem with a driver, design vars and responses that has not been set up.
+    initialize : callable or None
+        Called with prob after every setup to set initial values.
+    **kwargs : dict
+        Passed on to plan_derivative_mode.
+
+    Returns
+    -------
+    dict
+        The plan.
+    """
+    # In 'auto' mode, OpenMDAO sets up the transfers of both modes.
+    prob.setup(mode='auto')
+    if initialize is not None:
+        initialize(prob)
+    prob.run_model()
+
+    plan = plan_derivative_mode(prob, **kwargs)
+
+    if plan['colored']:
+        prob.driver.declare_coloring()
+    prob.setup(mode=plan['mode'])
+    if initialize is not None:
+        initialize(prob)
+
+    return plan
+
+
+def _time_totals(SIZE, mode, coloring_file=None, repeat=3):
+    """
+    Best time of repeat gradients, after a first one that also sets up the total jacobian
+    and the coloring.
+    """
+    p = build_circle_packing(SIZE)
+    if coloring_file is not None:
+        p.driver.use_fixed_coloring(coloring_file)
+    p.setup(mode=mode)
+    set_initial_values(p, SIZE)
+    p.run_model()
+    p.driver._compute_totals()
+
+    best = np.inf
+    for _ in range(repeat):
+        st = time.perf_counter()
+        p.driver._compute_totals()
+        best = min(best, time.perf_counter() - st)
+    return best
+
+
+if __name__ == '__main__':
+
+    sizes = [int(s) for s in sys.argv[1:]] or [10, 100, 1000, 10000]
+
+    # OpenMDAO computes the total sparsity densely when coloring, so only measure the
+    # colored modes while a dense total Jacobian stays below this many bytes.
+    dense_budget = 2e9
+
+    tmpdir = tempfile.mkdtemp()
+
+    expected_iterations = 50
+
+    for SIZE in sizes:
+        p = build_circle_packing(SIZE)
+        plan = setup_with_planned_mode(p, initialize=lambda prob: set_initial_values(prob, SIZE),
+                                       expected_iterations=expected_iterations)
+        planned = plan['mode'] + ('_colored' if plan['colored'] else '')
+        print(plan['reason'])
+
+        # Seconds per gradient, and the one-off cost of computing the coloring.
+        measured = {}
+        overhead = {}
+        n_of, n_wrt = plan['solves']['rev'], plan['solves']['fwd']
+        for mode in ('fwd', 'rev'):
+            measured[mode] = _time_totals(SIZE, mode)
+            overhead[mode] = 0.
+
+            if 8. * n_of * n_wrt < dense_budget:
+                fname = os.path.join(tmpdir, 'coloring_%d_%s.pkl' % (SIZE, mode))
+                pc = build_circle_packing(SIZE)
+                pc.setup(mode=mode)
+                set_initial_values(pc, SIZE)
+                pc.run_model()
+                st = time.perf_counter()
+                compute_total_coloring(pc, mode=mode, fname=fname)
+                overhead[mode + '_colored'] = time.perf_counter() - st
+                measured[mode + '_colored'] = _time_totals(SIZE, mode, coloring_file=fname)
+
+        # Like the planner, amortize the coloring over the expected iterations.
+        total = {key: expected_iterations * t + overhead[key] for key, t in measured.items()}
+        fastest = min(total, key=total.get)
+        print('SIZE %6d: planned %-12s measured fastest over %d gradients %-12s %s' %
+              (SIZE, planned, expected_iterations, fastest,
+               'OK' if fastest == planned else 'MISMATCH'))
+        for key in sorted(measured):
+            print('    %-12s %10.4f s/gradient %10.4f s coloring %10.4f s total  (%d solves)' %
+                  (key, measured[key], overhead[key], total[key], plan['solves'][key]))
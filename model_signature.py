@@ -0,0 +1,111 @@
+import hashlib
+
+import numpy as np
+
+
+def _stable(val):
+    """
+    Convert a value to something whose repr does not change between processes.
+    """
+    if isinstance(val, np.ndarray):
+        data = np.ascontiguousarray(val)
+        return ('ndarray', data.dtype.str, data.shape, hashlib.sha1(data.tobytes()).hexdigest())
+    if isinstance(val, (bool, int, float, complex, str, type(None), np.number)):
+        return val
+    if isinstance(val, (list, tuple)):
+        return tuple(_stable(v) for v in val)
+    if isinstance(val, dict):
+        return tuple(sorted((str(k), _stable(v)) for k, v in val.items()))
+    if isinstance(val, type):
+        return '%s.%s' % (val.__module__, val.__qualname__)
+    # Objects (functions, solvers, ...) whose repr carries a memory address.
+    return type(val).__name__
+
+
+def _indices(idx):
+    """
+    Flat index array of src_indices or design var/response indices, None if unset.
+    """
+    if idx is None:
+        return None
+    try:
+        # Indexer objects in recent OpenMDAO versions
+        return idx.shaped_array(flat=True)
+    except Exception:
+        arr = np.asarray(idx)
+        return str(idx) if arr.dtype == object else arr.ravel()
+
+
+def _system_items(model, solvers):
+    for system in model.system_iter(include_self=True, recurse=True):
+        cls = type(system)
+        yield ('system', system.pathname, '%s.%s' % (cls.__module__, cls.__qualname__),
+               _stable(dict(system.options.items())), _stable(getattr(system, '_exprs', None)))
+
+        if solvers and hasattr(system, 'nonlinear_solver'):
+            for kind in ('nonlinear_solver', 'linear_solver'):
+                solver = getattr(system, kind)
+                if solver is not None:
+                    yield ('solver', system.pathname, kind, type(solver).__name__,
+                           _stable(dict(solver.options.items())))
+
+
+def _variable_items(model):
+    meta = model.get_io_metadata(iotypes=('input', 'output'),
+                                 metadata_keys=('shape', 'units', 'size'),
+                                 get_remote=True, return_rel_names=False)
+    for name in sorted(meta):
+        yield ('var', name, _stable(meta[name]))
+
+
+def _connection_items(model):
+    abs2meta_in = model._var_abs2meta['input']
+    for tgt, src in sorted(model._conn_global_abs_in2out.items()):
+        src_indices = abs2meta_in[tgt].get('src_indices') if tgt in abs2meta_in else None
+        yield ('conn', tgt, src, _stable(_indices(src_indices)))
+
+
+def _response_items(model):
+    for kind, meta_dict in (('desvar', model.get_design_vars(recurse=True, get_sizes=True)),
+                            ('response', model.get_responses(recurse=True, get_sizes=True))):
+        for name in sorted(meta_dict):
+            meta = meta_dict[name]
+            yield (kind, name, meta.get('source'), meta.get('size'), meta.get('type'),
+                   meta.get('linear'), _stable(_indices(meta.get('indices'))))
+
+
+def structure_hash(prob, extra=None, solvers=False):
+    """
+    Hash of the structure of a set-up Problem.
+
+    Covers the system tree (classes and options), variable shapes and units, connections
+    with their src_indices, design vars and responses, the derivative mode, plus anything
+    passed in extra.
+
+    final_setup is run first if needed: the sizes of the design vars and responses and the
+    mode that 'auto' resolves to are only known after it.
+
+    Parameters
+    ----------
+    prob : Problem
+        A Problem that has been set up; final_setup is run if it has not been.
+    extra : dict or None
+        Additional values the caller wants in the key (e.g. problem sizes).
+    solvers : bool
+        If True, also include the solvers attached to every group.
+
+    Returns
+    -------
+    str
+        Hex digest identifying the structure.
+    """
+    prob.final_setup()
+    model = prob.model
+    sha = hashlib.sha1()
+    sha.update(repr(('mode', prob._mode)).encode('utf-8'))
+    for items in (_system_items(model, solvers), _variable_items(model),
+                  _connection_items(model), _response_items(model)):
+        for item in items:
+            sha.update(repr(item).encode('utf-8'))
+    sha.update(repr(_stable(extra)).encode('utf-8'))
+    return sha.hexdigest()
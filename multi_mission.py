@@ -0,0 +1,274 @@
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import openmdao.api as om
+
+from vehicle_timeseries import Propulsion, Power, Mass, drive_cycle
+
+
+# Design inputs shared by every mission, with their units.
+MISSION_INPUTS = (('E_capacity_batt', 'J'), ('x', None), ('C_rate_batt', None))
+
+# Per-mission outputs, with their units.
+MISSION_OUTPUTS = (('P_margin_KS', 'W'), ('SoC_final', None), ('P_fuelcell_max', 'W'))
+
+# Profiles of the missions and their Problems, per process and by pool, so that several
+# MultiMission components using threads do not share them. Filled by _init_missions in
+# every worker process (or in this process for threads) and built lazily.
+_MISSIONS = {}
+_MISSION_PROBLEMS = {}
+_POOL_KEYS = itertools.count()
+
+
+class MissionModel(om.Group):
+    """
+    Propulsion and power subtree of the vehicle for one mission profile.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        ivc = om.IndepVarComp()
+        ivc.add_output('SoC_initial', val=1.0)
+        ivc.add_output('P_req_shaft', val=np.zeros(nn), units='W')
+        ivc.add_output('dt', val=np.ones(nn), units='s')
+        ivc.add_output('x', val=0.7)
+        ivc.add_output('E_capacity_batt', val=30*3600, units='J')
+        ivc.add_output('C_rate_batt', val=1.0)
+        self.add_subsystem('ivc', ivc, promotes=['*'])
+
+        self.add_subsystem('propulsion', Propulsion(num_nodes=nn))
+        self.add_subsystem('power', Power(num_nodes=nn))
+
+        self.connect('P_req_shaft', 'propulsion.P_req_shaft')
+        self.connect('propulsion.motor.P_in', 'power.powersplitter.P_out')
+        self.connect('x', 'power.powersplitter.x')
+        self.connect('SoC_initial', 'power.soc.SoC_initial')
+        self.connect('dt', 'power.soc.dt')
+        self.connect('E_capacity_batt', ['power.soc.E_capacity_batt',
+                                         'power.battery.E_capacity_batt'])
+        self.connect('C_rate_batt', 'power.battery.C_rate_batt')
+
+
+def _init_missions(key, missions):
+    _MISSIONS[key] = missions
+    _MISSION_PROBLEMS[key] = {}
+
+
+def _drop_missions(key):
+    _MISSIONS.pop(key, None)
+    _MISSION_PROBLEMS.pop(key, None)
+
+
+def _mission_problem(key, index):
+    prob = _MISSION_PROBLEMS[key].get(index)
+    if prob is None:
+        P_req_shaft, dt = _MISSIONS[key][index]
+        prob = om.Problem(MissionModel(num_nodes=P_req_shaft.size), reports=False)
+        # Three shared inputs and thousands of outputs per mission
+        prob.setup(mode='fwd')
+        prob.set_val('P_req_shaft', P_req_shaft, units='W')
+        prob.set_val('dt', dt, units='s')
+        _MISSION_PROBLEMS[key][index] = prob
+    return prob
+
+
+def _run_mission(args):
+    """
+    Run one mission and return its outputs and their total derivatives.
+    """
+    key, index, design = args
+    prob = _mission_problem(key, index)
+
+    for name, units in MISSION_INPUTS:
+        prob.set_val(name, design[name], units=units)
+
+    st = time.perf_counter()
+    prob.run_model()
+
+    wrt = [name for name, _ in MISSION_INPUTS]
+    totals = prob.compute_totals(of=['power.battery.P_margin_KS', 'power.soc.SoC',
+                                     'power.fuelcell.P_fuelcell'], wrt=wrt)
+
+    P_fc = prob.get_val('power.fuelcell.P_fuelcell', units='W')
+    peak = np.argmax(P_fc)
+    outputs = {'P_margin_KS': prob.get_val('power.battery.P_margin_KS', units='W')[0],
+               'SoC_final': prob.get_val('power.soc.SoC')[-1],
+               'P_fuelcell_max': P_fc[peak]}
+
+    jac = {}
+    for name in wrt:
+        jac['P_margin_KS', name] = totals['power.battery.P_margin_KS', name][0, 0]
+        jac['SoC_final', name] = totals['power.soc.SoC', name][-1, 0]
+        jac['P_fuelcell_max', name] = totals['power.fuelcell.P_fuelcell', name][peak, 0]
+
+    return index, outputs, jac, time.perf_counter() - st
+
+
+class MultiMission(om.ExplicitComponent):
+    """
+    Propulsion and power of one vehicle evaluated over many missions concurrently.
+
+    Every mission is a separate Problem living in a worker of a thread or process pool.
+    compute sends the shared design inputs to all missions at once; each worker runs its
+    mission and its total derivatives, so compute_partials only stacks the per-mission
+    rows. Wall time is that of the slowest mission, not the sum.
+    """
+    def initialize(self):
+        self.options.declare('missions', types=list,
+                             desc='List of (P_req_shaft, dt) arrays, one pair per mission')
+        self.options.declare('executor', default='process', values=('process', 'thread'))
+        self.options.declare('max_workers', default=None, allow_none=True)
+
+    def setup(self):
+        n = len(self.options['missions'])
+
+        for name, units in MISSION_INPUTS:
+            self.add_input(name, val=1.0, units=units)
+        for name, units in MISSION_OUTPUTS:
+            self.add_output(name, val=np.zeros(n), units=units)
+
+        self.declare_partials('*', '*')
+
+        self._pool = None
+        self._pool_key = None
+        self._design = None
+        self._mission_outputs = None
+        self._jac = None
+        self.mission_times = np.zeros(n)
+
+    def _get_pool(self):
+        if self._pool is None:
+            missions = [(np.asarray(P, dtype=float), np.asarray(dt, dtype=float))
+                        for P, dt in self.options['missions']]
+            workers = self.options['max_workers'] or len(missions)
+            self._pool_key = next(_POOL_KEYS)
+            if self.options['executor'] == 'process':
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_missions,
+                                                 initargs=(self._pool_key, missions))
+            else:
+                _init_missions(self._pool_key, missions)
+                self._pool = ThreadPoolExecutor(max_workers=workers)
+        return self._pool
+
+    def shutdown(self):
+        """
+        Stop the worker pool.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            _drop_missions(self._pool_key)
+
+    def _run_missions(self, inputs):
+        """
+        Run every mission at the current inputs, unless that was the last point run.
+        """
+        design = {name: float(inputs[name][0]) for name, _ in MISSION_INPUTS}
+        if design == self._design:
+            return
+
+        pool = self._get_pool()
+        n = len(self.options['missions'])
+        tasks = [(self._pool_key, i, design) for i in range(n)]
+
+        self._mission_outputs = {name: np.zeros(n) for name, _ in MISSION_OUTPUTS}
+        self._jac = {}
+        for i, mission_outputs, jac, elapsed in pool.map(_run_mission, tasks):
+            for name, _ in MISSION_OUTPUTS:
+                self._mission_outputs[name][i] = mission_outputs[name]
+            for key, val in jac.items():
+                self._jac.setdefault(key, np.zeros(n))[i] = val
+            self.mission_times[i] = elapsed
+        self._design = design
+
+    def compute(self, inputs, outputs):
+        self._run_missions(inputs)
+        for name, _ in MISSION_OUTPUTS:
+            outputs[name] = self._mission_outputs[name]
+
+    def compute_partials(self, inputs, partials):
+        # The mission totals come with the outputs; the missions only run again if the
+        # inputs changed since (or compute did not run first).
+        self._run_missions(inputs)
+        for key, val in self._jac.items():
+            partials[key] = val
+
+
+class MultiMissionVehicle(om.Group):
+    """
+    One vehicle sized for many missions: the missions run in parallel and share the Mass group.
+    """
+    def initialize(self):
+        self.options.declare('missions', types=list)
+        self.options.declare('executor', default='process', values=('process', 'thread'))
+        self.options.declare('max_workers', default=None, allow_none=True)
+
+    def setup(self):
+        n = len(self.options['missions'])
+
+        ivc = om.IndepVarComp()
+        ivc.add_output('x', val=0.7)
+        ivc.add_output('E_capacity_batt', val=30*3600, units='J')
+        ivc.add_output('C_rate_batt', val=1.0)
+        ivc.add_output('P_fuelcell_rated', val=400.0, units='W')
+        ivc.add_output('fuelcell_power_density', val=1000, units='W/kg')
+        ivc.add_output('battery_energy_density', val=25*3600, units='J/kg')
+        self.add_subsystem('ivc', ivc, promotes=['*'])
+
+        self.add_subsystem('missions', MultiMission(missions=self.options['missions'],
+                                                    executor=self.options['executor'],
+                                                    max_workers=self.options['max_workers']),
+                           promotes_inputs=['x', 'E_capacity_batt', 'C_rate_batt'])
+        self.add_subsystem('fc_limit', om.ExecComp('fc_margin = P_max - P_rated',
+                                                   fc_margin={'shape': n, 'units': 'W'},
+                                                   P_max={'shape': n, 'units': 'W'},
+                                                   P_rated={'units': 'W'}),
+                           promotes_inputs=[('P_rated', 'P_fuelcell_rated')])
+        self.add_subsystem('mass', Mass())
+
+        self.connect('missions.P_fuelcell_max', 'fc_limit.P_max')
+        self.connect('P_fuelcell_rated', 'mass.total_mass.P_fuelcell')
+        self.connect('E_capacity_batt', 'mass.total_mass.E_battery')
+        self.connect('fuelcell_power_density', 'mass.total_mass.fuelcell_power_density')
+        self.connect('battery_energy_density', 'mass.total_mass.battery_energy_density')
+
+
+if __name__ == '__main__':
+
+    missions = [drive_cycle(nn, P_mean=P_mean, seed=seed)
+                for seed, (nn, P_mean) in enumerate([(3000, 80.), (5000, 100.), (2000, 150.),
+                                                     (4000, 120.), (6000, 60.), (1000, 200.)])]
+
+    for executor, max_workers in (('thread', 1), ('process', None)):
+        prob = om.Problem(MultiMissionVehicle(missions=missions, executor=executor,
+                                              max_workers=max_workers))
+        model = prob.model
+
+        model.add_design_var('E_capacity_batt', lower=1*3600, upper=1000*3600, ref=50*3600)
+        model.add_design_var('P_fuelcell_rated', lower=1.0, upper=2000.0, ref=100.0)
+        model.add_objective('mass.total_mass.mass_total')
+        model.add_constraint('missions.P_margin_KS', upper=0.0, ref=100.0)
+        model.add_constraint('missions.SoC_final', lower=0.2)
+        model.add_constraint('fc_limit.fc_margin', upper=0.0, ref=100.0)
+
+        prob.driver = om.ScipyOptimizeDriver(optimizer='SLSQP', tol=1e-8, disp=False)
+        prob.setup()
+
+        st = time.time()
+        prob.run_driver()
+        elapsed = time.time() - st
+        model.missions.shutdown()
+
+        print('%s pool, %s workers: %.3f s for %d iterations, slowest mission %.3f s, '
+              'sum of missions %.3f s' % (executor, max_workers or len(missions), elapsed,
+                                          prob.driver.iter_count, model.missions.mission_times.max(),
+                                          model.missions.mission_times.sum()))
+        print('    E_capacity_batt = %.3f Wh, P_fuelcell_rated = %.2f W, mass = %.4f kg' %
+              (prob.get_val('E_capacity_batt', units='W*h')[0],
+               prob.get_val('P_fuelcell_rated', units='W')[0],
+               prob.get_val('mass.total_mass.mass_total', units='kg')[0]))
@@ -0,0 +1,310 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+import numpy as np
+from scipy.stats import qmc
+
+import openmdao.api as om
+
+from hohmann_porkchop import HohmannGroup
+from vehicle_timeseries import VehicleMission
+
+
+StartResult = namedtuple('StartResult', ['index', 'start', 'x', 'objective', 'success',
+                                         'cancelled', 'iterations', 'time'])
+
+
+class _StartCancelled(Exception):
+    """
+    Raised inside a start once it cannot beat, or is converging to, an optimum another start
+    already found.
+    """
+    pass
+
+
+class BasinAwareScipyDriver(om.ScipyOptimizeDriver):
+    """
+    ScipyOptimizeDriver that gives up early on starts that other starts make redundant.
+
+    Two tests against the optima already found by other starts cancel a run:
+
+    - Dominance, checked at every gradient (once per SLSQP iteration) from bound_iterations
+      on: the objective is still worse than the best known optimum by more than
+      bound_margin times its magnitude. This is cheap and fires after a couple of
+      iterations, at the price of also dropping a start that would have gone on to a better
+      optimum after a slow beginning.
+    - Basin, checked after each function evaluation: the design vector (normalized by the
+      design variable bounds) stays within basin_radius of a known optimum for
+      basin_patience consecutive evaluations without improving on its objective. This
+      catches starts heading for the best known optimum, but only once they are close.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.known_optima = []
+        self.bounds = None
+        self.basin_radius = 0.05
+        self.basin_patience = 3
+        self.bound_iterations = 2
+        self.bound_margin = 0.01
+        self._basin_hits = 0
+        self._grad_count = 0
+        self._f_last = None
+
+    def _normalized_design(self):
+        dv_vals = self.get_design_var_values(driver_scaling=False)
+        x = np.concatenate([np.atleast_1d(dv_vals[name]).ravel() for name in self.bounds])
+        return _normalize(x, self.bounds)
+
+    def _objfunc(self, x_new):
+        f_new = super()._objfunc(x_new)
+        self._f_last = float(np.asarray(f_new).ravel()[0])
+
+        if self.bounds is not None and len(self.known_optima) > 0:
+            x = self._normalized_design()
+            f = self._f_last
+            in_basin = False
+            for x_opt, f_opt in list(self.known_optima):
+                if np.max(np.abs(x - x_opt)) < self.basin_radius and f >= f_opt - 1e-12:
+                    in_basin = True
+                    break
+
+            self._basin_hits = self._basin_hits + 1 if in_basin else 0
+            # Raised outside the base class try/except, so it unwinds scipy.optimize.minimize.
+            if self._basin_hits >= self.basin_patience:
+                raise _StartCancelled()
+
+        return f_new
+
+    def _gradfunc(self, x_new):
+        grad = super()._gradfunc(x_new)
+        self._grad_count += 1
+
+        # SLSQP asks for the gradient at the point it just evaluated, so _f_last is the
+        # objective of the current iterate.
+        if self._grad_count >= self.bound_iterations and len(self.known_optima) > 0:
+            f_best = min(f_opt for _, f_opt in list(self.known_optima))
+            if self._f_last > f_best + self.bound_margin * abs(f_best):
+                raise _StartCancelled()
+
+        return grad
+
+
+def _design_space(prob):
+    """
+    Return {name: (lower, upper, units)} in model units for the design vars of a set-up Problem.
+    """
+    bounds = {}
+    for name, meta in prob.model.get_design_vars(recurse=True, get_sizes=True).items():
+        size = meta['size']
+        scaler = 1.0 if meta['scaler'] is None else meta['scaler']
+        adder = 0.0 if meta['adder'] is None else meta['adder']
+
+        # add_design_var stores the bounds with scaler/adder already applied.
+        lower = np.broadcast_to(meta['lower'], (size,)) / scaler - adder
+        upper = np.broadcast_to(meta['upper'], (size,)) / scaler - adder
+        if np.any(np.abs(lower) >= 1e30) or np.any(np.abs(upper) >= 1e30):
+            raise ValueError("Design var '%s' needs finite lower and upper bounds "
+                             "for a multi-start search." % name)
+
+        bounds[name] = (np.array(lower, dtype=float), np.array(upper, dtype=float), meta['units'])
+    return bounds
+
+
+def _normalize(x, bounds):
+    lower = np.concatenate([b[0] for b in bounds.values()])
+    upper = np.concatenate([b[1] for b in bounds.values()])
+    span = np.where(upper > lower, upper - lower, 1.0)
+    return (x - lower) / span
+
+
+def _latin_hypercube_starts(bounds, num_starts, seed):
+    lower = np.concatenate([b[0] for b in bounds.values()])
+    upper = np.concatenate([b[1] for b in bounds.values()])
+    sampler = qmc.LatinHypercube(d=lower.size, seed=seed)
+    return lower + sampler.random(num_starts) * (upper - lower)
+
+
+def _run_start(build_problem, index, start, known_optima, basin_radius, basin_patience,
+               bound_iterations, bound_margin):
+    """
+    Run one optimization from the given start. Executed in a worker process.
+    """
+    st = time.time()
+    prob = build_problem()
+
+    # Swap in the basin-aware driver, keeping the user's driver settings.
+    old_driver = prob.driver
+    driver = BasinAwareScipyDriver()
+    for name, val in old_driver.options.items():
+        driver.options[name] = val
+    driver.opt_settings.update(old_driver.opt_settings)
+    driver.options['disp'] = False
+    prob.driver = driver
+
+    prob.setup()
+    bounds = _design_space(prob)
+
+    i = 0
+    for name, (lower, upper, units) in bounds.items():
+        prob.set_val(name, start[i:i + lower.size], units=units)
+        i += lower.size
+
+    driver.bounds = bounds
+    driver.known_optima = known_optima
+    driver.basin_radius = basin_radius
+    driver.basin_patience = basin_patience
+    driver.bound_iterations = bound_iterations
+    driver.bound_margin = bound_margin
+
+    cancelled = False
+    try:
+        failed = prob.run_driver()
+    except _StartCancelled:
+        failed = True
+        cancelled = True
+
+    dv_vals = driver.get_design_var_values(driver_scaling=False)
+    x = np.concatenate([np.atleast_1d(dv_vals[name]).ravel() for name in bounds])
+    # Known optima are compared against the driver-scaled objective inside _objfunc.
+    f_scaled = list(driver.get_objective_values().values())[0]
+    f_model = list(driver.get_objective_values(driver_scaling=False).values())[0]
+    objective = float(np.atleast_1d(f_model)[0])
+    success = not failed
+
+    if success:
+        known_optima.append((_normalize(x, bounds), float(np.atleast_1d(f_scaled)[0])))
+
+    return StartResult(index, start, x, objective, success, cancelled, driver.iter_count,
+                       time.time() - st)
+
+
+def run_multistart(build_problem, num_starts=8, max_workers=None, seed=0,
+                   basin_radius=0.05, basin_patience=3, bound_iterations=2, bound_margin=0.01,
+                   distinct_tol=1e-3):
+    """
+    Optimize from num_starts Latin-hypercube starts on a local process pool.
+
+    Parameters
+    ----------
+    build_problem : callable
+        Module-level (picklable) function returning a Problem that has a ScipyOptimizeDriver,
+        design vars with finite bounds and an objective, but has not been set up.
+    num_starts : int
+        Number of starting points.
+    max_workers : int or None
+        Size of the process pool. Defaults to the number of CPUs.
+    seed : int
+        Seed for the Latin hypercube.
+    basin_radius : float
+        Normalized (by design var bounds) distance under which a start counts as inside a
+        known basin.
+    basin_patience : int
+        Consecutive evaluations inside a known basin before a start is cancelled.
+    bound_iterations : int
+        Iteration from which a start whose objective is worse than the best known optimum
+        is cancelled.
+    bound_margin : float
+        Relative margin (of the best known objective) a start may be worse by before it is
+        cancelled.
+    distinct_tol : float
+        Normalized distance under which two converged optima are considered the same.
+
+    Returns
+    -------
+    tuple
+        (best, optima, results): the best StartResult, the list of distinct local optima
+        sorted by objective, and the StartResult of every start.
+    """
+    prob = build_problem()
+    prob.setup()
+    bounds = _design_space(prob)
+    starts = _latin_hypercube_starts(bounds, num_starts, seed)
+
+    results = []
+    with Manager() as manager:
+        known_optima = manager.list()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_run_start, build_problem, i, start, known_optima,
+                                   basin_radius, basin_patience, bound_iterations,
+                                   bound_margin)
+                       for i, start in enumerate(starts)]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    results.sort(key=lambda r: r.index)
+
+    optima = []
+    for res in sorted((r for r in results if r.success), key=lambda r: r.objective):
+        x = _normalize(res.x, bounds)
+        if all(np.max(np.abs(x - _normalize(o.x, bounds))) >= distinct_tol for o in optima):
+            optima.append(res)
+
+    best = optima[0] if optima else None
+
+    return best, optima, results
+
+
+def build_hohmann():
+    """
+    The scalar Hohmann transfer problem, optimizing the inclination split.
+    """
+    prob = om.Problem()
+    prob.model.add_subsystem('hohmann', HohmannGroup(), promotes=['*'])
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+
+    prob.model.add_design_var('dinc1', lower=0.0, upper=28.5, units='deg')
+    prob.model.add_objective('delta_v_mean')
+
+    return prob
+
+
+def build_battery():
+    """
+    The battery sizing case of test4.py: a 100 W shaft power demand, here over 600 one-second
+    steps, optimizing the battery capacity and the power split.
+    """
+    prob = om.Problem()
+    prob.model.add_subsystem('mission', VehicleMission(num_nodes=600), promotes=['*'])
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+    prob.driver.options['tol'] = 1e-6
+
+    prob.model.add_design_var('E_capacity_batt', lower=1*3600, upper=100*3600, units='J',
+                              ref=10*3600)
+    prob.model.add_design_var('x', lower=0.0, upper=1.0)
+    prob.model.add_objective('mass.total_mass.mass_total')
+    prob.model.add_constraint('power.fuelcell.P_fuelcell', upper=400.0, ref=100.0)
+    prob.model.add_constraint('power.battery.P_margin_KS', upper=0.0, ref=100.0)
+    prob.model.add_constraint('power.soc.SoC', indices=[-1], lower=0.2)
+
+    return prob
+
+
+def _report(label, build_problem, **kwargs):
+    st = time.time()
+    best, optima, results = run_multistart(build_problem, num_starts=8, **kwargs)
+    elapsed = time.time() - st
+
+    print('%s: %d distinct local optima, best objective %.6f at %s' %
+          (label, len(optima), best.objective, np.array2string(best.x, precision=4)))
+    for res in results:
+        status = 'cancelled' if res.cancelled else ('converged' if res.success else 'failed')
+        print('    start %d: objective %.6f  %-9s after %2d evaluations, %.3f s' %
+              (res.index, res.objective, status, res.iterations, res.time))
+    print('    %d evaluations in total, %.3f s' % (sum(r.iterations for r in results), elapsed))
+
+
+if __name__ == '__main__':
+
+    # The starts run one after the other on a single worker (as on a one-CPU machine), so
+    # the later ones are tested against the optima of the earlier ones from their start.
+    _report('Hohmann transfer', build_hohmann, max_workers=1)
+    _report('Battery sizing', build_battery, max_workers=1)
+    _report('Battery sizing without the dominance test', build_battery, max_workers=1,
+            bound_iterations=10**6)
@@ -1,6 +1,8 @@
 import openmdao.api as om
 
-class Paraboloid(om.ExplicitComponent):
+from partials_sparsity import SparsePartialsMixin
+
+class Paraboloid(SparsePartialsMixin, om.ExplicitComponent):
     """
     Evaluates the equation f(x,y) = (x-3)^2 + xy + (y+4)^2 - 3.
     """
@@ -12,8 +14,8 @@ class Paraboloid(om.ExplicitComponent):
         self.add_output('f_xy', val=0.0)
 
     def setup_partials(self):
-        # Finite difference all partials.
-        self.declare_partials('*', '*', method='fd')
+        # Finite difference the partials that are nonzero, one evaluation per color.
+        self.declare_sparse_partials(method='fd')
 
     def compute(self, inputs, outputs):
         """
@@ -0,0 +1,244 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+import scipy.sparse as sp
+
+from mode_planner import column_colors
+
+
+# Sparsity found by the probe, by (component class, options, input shapes, output shapes).
+_PATTERNS = {}
+
+
+def _options_key(options):
+    """
+    Hashable form of the option values; arrays and other unhashable values by their text.
+    """
+    items = []
+    for name in sorted(options):
+        try:
+            val = options[name]
+        except RuntimeError:  # required option that was never set
+            val = None
+        if isinstance(val, np.ndarray):
+            val = (val.shape, val.dtype.str, val.tobytes())
+        else:
+            try:
+                hash(val)
+            except TypeError:
+                val = repr(val)
+        items.append((name, val))
+    return tuple(items)
+
+
+class SparsePartialsMixin(object):
+    """
+    Finite difference or complex step partials of an ExplicitComponent, with the sparsity
+    found by probing compute instead of '*', '*' being treated as dense.
+
+    Call declare_sparse_partials() in setup_partials instead of
+    declare_partials('*', '*', method=...), and put the mixin first in the bases:
+
+        class MyComp(SparsePartialsMixin, om.ExplicitComponent):
+
+    The class must not define compute_partials. compute is called with plain dicts of
+    arrays, so it may only index its inputs and outputs by name.
+    """
+
+    def declare_sparse_partials(self, method='fd', step=None, num_probes=3, seed=0):
+        """
+        Probe the sparsity of compute and declare the nonzero partials with rows/cols.
+
+        At num_probes random points in [0.5, 1.5], every input entry is perturbed in turn;
+        an output entry depends on it if it changed (or stopped being finite). The union
+        over the probes is the pattern. It is computed once per component class, option
+        values and variable shapes and reused by later instances.
+
+        Its columns are colored so that compute_partials needs one evaluation per color
+        rather than one per input entry.
+
+        Parameters
+        ----------
+        method : str
+            'fd' or 'cs'.
+        step : float or None
+            Step size, 1e-6 for fd and 1e-40 for cs if None.
+        num_probes : int
+            Number of random points of the probe.
+        seed : int
+            Seed of the random points.
+        """
+        if method not in ('fd', 'cs'):
+            raise ValueError("method must be 'fd' or 'cs', not '%s'" % method)
+
+        ins = self._flat_shapes('input')
+        outs = self._flat_shapes('output')
+        key = (type(self), _options_key(self.options), tuple(ins), tuple(outs))
+        if key not in _PATTERNS:
+            _PATTERNS[key] = self._probe_sparsity(ins, outs, num_probes, seed)
+        rows, cols, colors = _PATTERNS[key]
+
+        in_offsets = np.cumsum([0] + [int(np.prod(shape)) for _, shape in ins])
+        out_offsets = np.cumsum([0] + [int(np.prod(shape)) for _, shape in outs])
+
+        # Slices of the nonzeros of every (of, wrt) pair, in declaration order.
+        blocks = []
+        for i, (of, _) in enumerate(outs):
+            for j, (wrt, _) in enumerate(ins):
+                nz = np.where((rows >= out_offsets[i]) & (rows < out_offsets[i + 1]) &
+                              (cols >= in_offsets[j]) & (cols < in_offsets[j + 1]))[0]
+                if nz.size:
+                    self.declare_partials(of, wrt, rows=rows[nz] - out_offsets[i],
+                                          cols=cols[nz] - in_offsets[j])
+                    blocks.append((of, wrt, nz))
+
+        self._sparse_partials = {
+            'ins': ins, 'outs': outs, 'rows': rows, 'cols': cols, 'blocks': blocks,
+            'groups': [np.where(colors[cols] == c)[0] for c in range(colors.max() + 1)]
+            if cols.size else [],
+            'method': method,
+            'step': step if step is not None else (1e-6 if method == 'fd' else 1e-40),
+        }
+
+    def _flat_shapes(self, iotype):
+        meta = self.get_io_metadata(iotypes=iotype, metadata_keys=('shape',))
+        return [(name, tuple(m['shape'])) for name, m in meta.items() if not m['discrete']]
+
+    def _eval_flat(self, ins, outs, x):
+        """
+        compute at the flat input vector x, returning the flat output vector.
+        """
+        inputs = {}
+        start = 0
+        for name, shape in ins:
+            size = int(np.prod(shape))
+            inputs[name] = x[start:start + size].reshape(shape)
+            start += size
+        outputs = {name: np.zeros(shape, dtype=x.dtype) for name, shape in outs}
+        self.compute(inputs, outputs)
+        return np.concatenate([np.asarray(outputs[name]).ravel() for name, _ in outs])
+
+    def _probe_sparsity(self, ins, outs, num_probes, seed):
+        n_in = sum(int(np.prod(shape)) for _, shape in ins)
+        n_out = sum(int(np.prod(shape)) for _, shape in outs)
+        rng = np.random.default_rng(seed)
+
+        mask = np.zeros((n_out, n_in), dtype=bool)
+        with np.errstate(all='ignore'):
+            for _ in range(num_probes):
+                x0 = rng.uniform(0.5, 1.5, n_in)
+                f0 = self._eval_flat(ins, outs, x0)
+                for j in range(n_in):
+                    x = x0.copy()
+                    x[j] += 1e-3 * rng.uniform(0.5, 1.5)
+                    diff = self._eval_flat(ins, outs, x) - f0
+                    mask[:, j] |= (diff != 0) | ~np.isfinite(diff)
+
+        rows, cols = np.nonzero(mask)
+        colors = column_colors(sp.csc_matrix(mask)) if n_in else np.zeros(0, dtype=int)
+        return rows, cols, colors
+
+    def compute_partials(self, inputs, partials):
+        info = self._sparse_partials
+        ins, outs = info['ins'], info['outs']
+        rows, cols, h = info['rows'], info['cols'], info['step']
+
+        x0 = np.concatenate([np.asarray(inputs[name], dtype=float).ravel() for name, _ in ins])
+        if info['method'] == 'fd':
+            # Evaluated here rather than read from the output vector: a solver may linearize
+            # at outputs that are not compute(x0), Newton without solve_subsystems does.
+            f0 = self._eval_flat(ins, outs, x0)
+        else:
+            x0 = x0.astype(complex)
+
+        vals = np.zeros(rows.size)
+        for nz in info['groups']:
+            x = x0.copy()
+            if info['method'] == 'fd':
+                x[cols[nz]] += h
+                df = (self._eval_flat(ins, outs, x) - f0) / h
+            else:
+                x[cols[nz]] += 1j * h
+                df = self._eval_flat(ins, outs, x).imag / h
+            # Within a color, each row has at most one nonzero, so df is unambiguous.
+            vals[nz] = df[rows[nz]].real
+
+        for of, wrt, nz in info['blocks']:
+            partials[of, wrt] = vals[nz]
+
+
+class DenseSquares(om.ExplicitComponent):
+    """
+    y = x**2 + sin(x) elementwise, with '*', '*' fd partials.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('x', val=np.ones(nn))
+        self.add_output('y', val=np.ones(nn))
+        self.compute_count = 0
+
+    def setup_partials(self):
+        self.declare_partials('*', '*', method='fd')
+
+    def compute(self, inputs, outputs):
+        self.compute_count += 1
+        outputs['y'] = inputs['x']**2 + np.sin(inputs['x'])
+
+
+class SparseSquares(SparsePartialsMixin, DenseSquares):
+    """
+    DenseSquares with probed sparsity.
+    """
+    def setup_partials(self):
+        self.declare_sparse_partials()
+
+
+if __name__ == '__main__':
+
+    nn = 500
+    for comp_class in (DenseSquares, SparseSquares):
+        prob = om.Problem(reports=False)
+        comp = prob.model.add_subsystem('comp', comp_class(num_nodes=nn), promotes=['*'])
+
+        st = time.time()
+        prob.setup()
+        prob.set_val('x', np.linspace(0., 2., nn))
+        prob.run_model()
+        setup_time = time.time() - st
+
+        comp.compute_count = 0
+        st = time.time()
+        J = prob.compute_totals('y', 'x')['y', 'x']
+        totals_time = time.time() - st
+
+        exact = np.diag(2 * prob.get_val('x') + np.cos(prob.get_val('x')))
+        print('%-13s setup + run %.3f s, compute_totals %.4f s with %d compute calls, '
+              'max error %.1e' % (comp_class.__name__, setup_time, totals_time,
+                                  comp.compute_count, np.abs(J - exact).max()))
+
+    # Partials where the outputs are not compute(inputs): check_partials before run_model
+    # (OpenMDAO 3.27 does not run the model for it), and Newton without solve_subsystems,
+    # which linearizes at its current iterate. It solves x**2 + sin(x) = 3 from y = 100.
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('comp', SparseSquares(num_nodes=nn), promotes=['*'])
+    bal = prob.model.add_subsystem('balance', om.BalanceComp(), promotes=['*'])
+    bal.add_balance('x', val=np.ones(nn), lhs_name='y', rhs_val=3.0)
+    prob.model.nonlinear_solver = om.NewtonSolver(solve_subsystems=False, maxiter=20, iprint=-1,
+                                                  err_on_non_converge=False)
+    prob.model.linear_solver = om.DirectSolver()
+    prob.setup(force_alloc_complex=True)
+    prob.set_val('y', 100.)
+    data = prob.check_partials(includes=['comp'], method='cs', out_stream=None)
+    error = data['comp']['y', 'x']['abs error'][0]
+
+    prob.set_val('x', 1.)
+    prob.set_val('y', 100.)
+    prob.run_model()
+    print('unconverged outputs: check_partials max abs error %.1e, Newton %d iterations, '
+          'max |x**2 + sin(x) - 3| %.1e' %
+          (error, prob.model.nonlinear_solver._iter_count,
+           np.abs(prob.get_val('y') - 3.).max()))
@@ -0,0 +1,321 @@
+import hashlib
+import importlib
+import inspect
+import io
+import marshal
+import os
+import pickle
+import sys
+import time
+import types
+import weakref
+
+import numpy as np
+import openmdao
+import openmdao.api as om
+from openmdao.utils.options_dictionary import OptionsDictionary
+from openmdao.vectors.vector import Vector
+
+
+SNAPSHOT_VERSION = 2
+
+
+def _load_code(data):
+    return marshal.loads(data)
+
+
+def _load_function(code, module, name, defaults, closure):
+    return types.FunctionType(code, importlib.import_module(module).__dict__, name, defaults,
+                              closure)
+
+
+def _cell(contents):
+    return types.CellType(contents)
+
+
+def _new(cls):
+    return cls.__new__(cls)
+
+
+def _set_state(obj, state):
+    state, slots = state if isinstance(state, tuple) else (state, None)
+    if state:
+        obj.__dict__.update(state)
+    for name, val in (slots or {}).items():
+        object.__setattr__(obj, name, val)
+
+
+def _view(root, offset, shape, strides, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=root, offset=offset, strides=strides)
+
+
+class _Gone(object):
+    pass
+
+
+def _dead_ref():
+    return weakref.ref(_Gone())
+
+
+_warmed_up = False
+
+
+def _warm_up():
+    """
+    Set up a tiny Problem once per process.
+
+    Some OpenMDAO modules fill module globals the first time setup uses them (the Component
+    class in the assembled jacobians, the ExecComp function table), which loading a snapshot
+    skips.
+    """
+    global _warmed_up
+    if not _warmed_up:
+        prob = om.Problem(reports=False)
+        prob.model.add_subsystem('comp', om.ExecComp('y = 2.0 * x'), promotes=['*'])
+        prob.model.options['assembled_jac_type'] = 'csc'
+        prob.model.linear_solver = om.DirectSolver()
+        prob.setup()
+        prob.final_setup()
+        _warmed_up = True
+
+
+def _root(arr):
+    root = arr
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    return root
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickler for set-up Problems.
+
+    Array views (the variable views of the vectors, for instance) are saved as views into
+    their base array, so they still share memory after loading instead of becoming copies.
+    Weak references, weak dictionaries, code objects (ExecComp), functions defined inside
+    functions and imported modules are saved too, which the default pickler refuses.
+
+    Vectors and options dictionaries are saved whole; their __getstate__, meant for case
+    recording, leaves out the owning system and the options that are not recordable.
+
+    Objects whose __getattr__ answers for any name (a missing __setstate__ included) get
+    their state restored explicitly.
+
+    Methods wrapped by hooks (the reports) are saved as the original method. The targets of
+    the weak references are collected in targets, so that the loaded Problem can keep the
+    ones that were only alive through objects outside of it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.targets = []
+
+    def reducer_override(self, obj):
+        if type(obj) is np.ndarray and obj.base is not None:
+            root = _root(obj)
+            if type(root) is np.ndarray and root.flags.c_contiguous and root.dtype != object:
+                offset = obj.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+                return _view, (root, offset, obj.shape, obj.strides, obj.dtype)
+        elif type(obj) is weakref.ref:
+            target = obj()
+            if target is None:
+                return _dead_ref, ()
+            self.targets.append(target)
+            return weakref.ref, (target,)
+        elif isinstance(obj, (weakref.WeakValueDictionary, weakref.WeakKeyDictionary)):
+            return type(obj), (dict(obj.items()),)
+        elif isinstance(obj, (Vector, OptionsDictionary)):
+            return _new, (type(obj),), obj.__dict__
+        elif isinstance(obj, types.CodeType):
+            return _load_code, (marshal.dumps(obj),)
+        elif isinstance(obj, types.FunctionType):
+            if hasattr(obj, '_hashook_'):
+                return getattr, (obj._hashook_.__self__, obj._hashook_.__name__)
+            if '<locals>' in obj.__qualname__:
+                return _load_function, (obj.__code__, obj.__module__, obj.__name__,
+                                        obj.__defaults__, obj.__closure__)
+        elif isinstance(obj, types.CellType):
+            return _cell, (obj.cell_contents,)
+        elif (not isinstance(obj, type) and hasattr(type(obj), '__getattr__') and
+              not hasattr(type(obj), '__setstate__')):
+            rv = obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+            if isinstance(rv, tuple) and len(rv) > 2 and rv[2] is not None:
+                return (rv + (None, None))[:5] + (_set_state,)
+        elif isinstance(obj, types.ModuleType) and sys.modules.get(obj.__name__) is obj:
+            return importlib.import_module, (obj.__name__,)
+        return NotImplemented
+
+
+def _classes(prob):
+    """
+    Classes the set-up Problem is made of: systems, solvers, line searches and driver, with
+    their base classes.
+    """
+    objs = [prob.driver]
+    for system in prob.model.system_iter(include_self=True, recurse=True):
+        objs.append(system)
+        for solver in (system.nonlinear_solver, system.linear_solver):
+            if solver is not None:
+                objs.append(solver)
+                objs.append(getattr(solver, 'linesearch', None))
+    classes = set()
+    for obj in objs:
+        if obj is not None:
+            classes.update(type(obj).__mro__)
+    return classes
+
+
+def _source_hash(module):
+    try:
+        source = inspect.getsource(module)
+    except (OSError, TypeError):
+        return None
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def source_hashes(prob, extra=()):
+    """
+    {module name: hash of its source} of every module that defines a class of the Problem
+    or one of the functions, classes or modules in extra, except OpenMDAO itself (its
+    version is checked separately).
+
+    Whole modules are hashed, so the helpers that the classes and the build function call
+    are covered too, as long as they live in one of these modules; pass the modules of
+    any others in extra.
+    """
+    hashes = {}
+    for obj in list(_classes(prob)) + list(extra):
+        if isinstance(obj, types.ModuleType):
+            module = obj
+        else:
+            module = sys.modules.get(getattr(obj, '__module__', None) or '')
+        if module is None or module.__name__ == 'builtins' or \
+                module.__name__.split('.')[0] == 'openmdao' or module.__name__ in hashes:
+            continue
+        hashes[module.__name__] = _source_hash(module)
+        if hashes[module.__name__] is None:
+            raise ValueError("Can't read the source of module '%s' (of %r), so a snapshot "
+                             "could never be checked against it" % (module.__name__, obj))
+    return hashes
+
+
+def _current_hash(name):
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        return 'missing'
+    return _source_hash(module)
+
+
+def _environment():
+    return {'snapshot': SNAPSHOT_VERSION, 'python': sys.version.split()[0],
+            'openmdao': openmdao.__version__, 'numpy': np.__version__}
+
+
+def save_snapshot(prob, path, extra=()):
+    """
+    Save a Problem after final_setup, with everything setup built: variable tables,
+    connections, vectors, sparsity, colorings and solvers.
+
+    The file starts with a small header holding the source hashes of the modules of the
+    classes (and of the objects in extra, such as the function that built the model), read
+    by load_snapshot to decide whether the snapshot is still valid. Raises ValueError if
+    the source of one of these modules can't be read.
+    """
+    prob.final_setup()
+    header = {'environment': _environment(), 'sources': source_hashes(prob, extra)}
+
+    buf = io.BytesIO()
+    pickle.dump(header, buf, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler = _SnapshotPickler(buf, protocol=pickle.HIGHEST_PROTOCOL)
+    # targets is pickled after prob, when it holds every weak reference target.
+    pickler.dump((prob, pickler.targets))
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(buf.getvalue())
+    os.replace(path + '.tmp', path)
+
+
+def snapshot_valid(path):
+    """
+    Whether path holds a snapshot from this environment whose modules are all unchanged.
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+    if header['environment'] != _environment():
+        return False
+    return all(h is not None and _current_hash(key) == h
+               for key, h in header['sources'].items())
+
+
+def load_snapshot(path):
+    """
+    Problem saved by save_snapshot, or None if the snapshot is missing or out of date.
+
+    The Problem is ready for run_model, compute_totals or run_driver; setup and configure
+    are not run again.
+    """
+    if not snapshot_valid(path):
+        return None
+    _warm_up()
+    with open(path, 'rb') as f:
+        pickle.load(f)  # header
+        prob, targets = pickle.load(f)
+    prob._snapshot_targets = targets
+    return prob
+
+
+def cached_setup(build, path, **setup_kwargs):
+    """
+    Set-up Problem from a snapshot if it is valid, otherwise from build() and setup, in
+    which case the snapshot is written.
+
+    Parameters
+    ----------
+    build : callable
+        Returns the Problem before setup. The source of its module is part of the snapshot
+        check.
+    path : str
+        Snapshot file.
+    **setup_kwargs
+        Passed to Problem.setup.
+    """
+    prob = load_snapshot(path)
+    if prob is None:
+        prob = build()
+        prob.setup(**setup_kwargs)
+        save_snapshot(prob, path, extra=(build,))
+    return prob
+
+
+if __name__ == '__main__':
+
+    from wind_farm import build_farm
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    path = 'farm_%dx%d.snapshot' % (n, n)
+
+    def build():
+        return build_farm(n, n)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    results = []
+    for label in ('setup + save', 'from snapshot'):
+        st = time.time()
+        prob = cached_setup(build, path)
+        prob.final_setup()
+        elapsed = time.time() - st
+
+        prob.set_val('V_inf', 10.0, units='m/s')
+        prob.set_val('rho', 1.225, units='kg/m**3')
+        prob.set_val('a', 0.3)
+        prob.run_model()
+        results.append(prob.get_val('power', units='kW')[0])
+        print('%-14s %.3f s, farm power %.3f kW' % (label, elapsed, results[-1]))
+
+    print('snapshot size %d bytes, same result: %s' %
+          (os.path.getsize(path), np.isclose(results[0], results[1])))
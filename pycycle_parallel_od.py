@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import openmdao.api as om
+
+from pycycle_tab_cache import compile_tab_spec, load_tab_spec
+from pycycle_turbojet import Turbojet, set_design_point, set_off_design_guesses
+
+
+# Off-design results returned for every point.
+OD_OUTPUTS = ('perf.Fn', 'perf.TSFC', 'burner.Wfuel', 'balance.Nmech', 'balance.W',
+              'balance.FAR')
+
+# Cycle parameters shared by the design and off-design points, as in MPTurbojet.
+CYCLE_PARAMS = {'burner.dPqP': 0.03, 'nozz.Cv': 0.99}
+
+# Off-design Problems built in this worker process, by point index, and the shared memory
+# blocks it has attached to.
+_OD_PROBLEMS = {}
+_SHARED = {}
+
+
+def _od_problem(point, tab_cache=None):
+    """
+    A set-up Problem with one off-design Turbojet at point = (MN, alt in ft, Fn in lbf).
+    """
+    MN, alt, Fn = point
+    tab_spec = load_tab_spec(tab_cache) if tab_cache is not None else None
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('OD', Turbojet(design=False, tab_spec=tab_spec))
+    prob.model.set_input_defaults('OD.fc.MN', MN)
+    prob.model.set_input_defaults('OD.fc.alt', alt, units='ft')
+    prob.model.set_input_defaults('OD.balance.Fn_target', Fn, units='lbf')
+    prob.setup(check=False, mode='rev')
+    prob.set_solver_print(level=-1)
+    # A point that stops at maxiter without meeting the tolerances has not converged.
+    prob.model.OD.nonlinear_solver.options['err_on_non_converge'] = True
+
+    for name, val in CYCLE_PARAMS.items():
+        prob.set_val('OD.' + name, val)
+    set_off_design_guesses(prob, 'OD')
+    return prob
+
+
+def des_od_connections(prob):
+    """
+    (design output, off-design input) pairs the off-design Turbojet in prob needs from the
+    design point: the defaults of every element, as in pyc_use_default_des_od_conns, and
+    the nozzle throat area that sets the off-design mass flow.
+    """
+    conns = []
+    for elem in prob.model.OD.system_iter(recurse=False):
+        for src, tgt in getattr(elem, 'default_des_od_conns', []):
+            conns.append(('%s.%s' % (elem.name, src), '%s.%s' % (elem.name, tgt)))
+    conns.append(('nozz.Throat:stat:area', 'balance.rhs:W'))
+    return conns
+
+
+def _set_point(prob, point):
+    MN, alt, Fn = point
+    prob.set_val('OD.fc.MN', MN)
+    prob.set_val('OD.fc.alt', alt, units='ft')
+    prob.set_val('OD.balance.Fn_target', Fn, units='lbf')
+
+
+def _solve(prob, point, start, steps):
+    """
+    Run the off-design point; if Newton fails, restart from the default guesses and walk
+    from the start point to it in steps, warm starting each from the last.
+    """
+    try:
+        prob.run_model()
+        return True
+    except om.AnalysisError:
+        pass
+
+    set_off_design_guesses(prob, 'OD')
+    try:
+        for t in np.linspace(0., 1., steps + 1):
+            _set_point(prob, [(1. - t) * a + t * b for a, b in zip(start, point)])
+            prob.run_model()
+        return True
+    except om.AnalysisError:
+        _set_point(prob, point)
+        return False
+
+
+def _run_point(args):
+    """
+    Run one off-design point with the design values found in shared memory.
+
+    Returns the point's outputs and their total derivatives with respect to the design
+    values, in the units of the off-design Turbojet.
+    """
+    index, point, start, steps, shm_name, targets, units, tab_cache = args
+
+    prob = _OD_PROBLEMS.get(index)
+    if prob is None:
+        prob = _OD_PROBLEMS[index] = _od_problem(point, tab_cache)
+
+    shm = _SHARED.get(shm_name)
+    if shm is None:
+        shm = _SHARED[shm_name] = shared_memory.SharedMemory(name=shm_name)
+    design = np.ndarray((len(targets),), dtype=np.float64, buffer=shm.buf)
+
+    for tgt, val, u in zip(targets, design, units):
+        prob.set_val('OD.' + tgt, val, units=u)
+
+    st = time.perf_counter()
+    converged = _solve(prob, point, start, steps)
+
+    of = ['OD.' + name for name in OD_OUTPUTS]
+    wrt = ['OD.' + tgt for tgt in targets]
+    outputs = np.array([prob.get_val(name)[0] for name in of])
+    jac = np.zeros((len(of), len(wrt)))
+    if converged:
+        totals = prob.compute_totals(of=of, wrt=wrt)
+        for i, name in enumerate(of):
+            for j, w in enumerate(wrt):
+                jac[i, j] = totals[name, w][0, 0]
+    else:
+        # Don't warm start the next evaluation from a failed solve.
+        set_off_design_guesses(prob, 'OD')
+
+    return index, outputs, jac, converged, time.perf_counter() - st
+
+
+class ParallelOffDesign(om.ExplicitComponent):
+    """
+    Off-design points of the Turbojet evaluated concurrently on a process pool.
+
+    The inputs are the design point values the off-design cycles depend on. compute copies
+    them once into a shared memory block that every worker reads, and each worker runs its
+    own off-design Problem (warm started from its previous solution). A point Newton can't
+    solve from there is solved again by continuation from the first point, which should
+    converge from the default guesses. The totals of every
+    point with respect to the design values are computed in the workers along with the
+    solution, so compute_partials only assembles them. Outputs are arrays over points.
+    """
+    def initialize(self):
+        self.options.declare('points', types=list, desc='List of (MN, alt in ft, Fn in lbf)')
+        self.options.declare('max_workers', default=None, allow_none=True,
+                             desc='Number of worker processes, one per point (up to the '
+                                  'number of cores) if None')
+        self.options.declare('tab_cache', default=None, allow_none=True,
+                             desc='Thermo data cache from pycycle_tab_cache.compile_tab_spec')
+        self.options.declare('continuation_steps', default=4, types=int,
+                             desc='Steps from the first point to a point that fails')
+
+    def setup(self):
+        points = self.options['points']
+        n = len(points)
+
+        # The units and connections come from a template off-design point.
+        template = _od_problem(points[0], self.options['tab_cache'])
+        self.des_od_conns = des_od_connections(template)
+        meta = template.model.get_io_metadata(metadata_keys=('units',))
+        prom_units = {m['prom_name']: m['units'] for m in meta.values()}
+
+        self._targets = [tgt for _, tgt in self.des_od_conns]
+        self._units = [prom_units['OD.' + tgt] for tgt in self._targets]
+        for tgt, u in zip(self._targets, self._units):
+            self.add_input(self._input_name(tgt), val=1.0, units=u)
+
+        for name in OD_OUTPUTS:
+            self.add_output(name.replace('.', ':'), val=np.zeros(n),
+                            units=prom_units['OD.' + name])
+        self.add_output('converged', val=np.zeros(n))
+
+        self.declare_partials([name.replace('.', ':') for name in OD_OUTPUTS], '*')
+
+        self._pool = None
+        self._shm = None
+        self._converged = None
+        self._design = None
+        self._vals = None
+        self._jac = None
+        self.point_times = np.zeros(n)
+
+    @staticmethod
+    def _input_name(tgt):
+        return 'des:' + tgt.replace('.', ':')
+
+    def _start(self):
+        if self._pool is None:
+            workers = self.options['max_workers'] or min(len(self.options['points']),
+                                                         os.cpu_count())
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+            self._shm = shared_memory.SharedMemory(create=True, size=8 * len(self._targets))
+
+    def shutdown(self):
+        """
+        Stop the workers and free the shared memory.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _run_points(self, inputs):
+        """
+        Run every off-design point at the current design, unless that was the last one run.
+        """
+        design = np.array([inputs[self._input_name(tgt)][0] for tgt in self._targets])
+        if self._design is not None and np.array_equal(design, self._design):
+            return
+
+        self._start()
+        np.ndarray(design.shape, dtype=np.float64, buffer=self._shm.buf)[:] = design
+
+        points = self.options['points']
+        tasks = [(i, point, points[0], self.options['continuation_steps'], self._shm.name,
+                  self._targets, self._units, self.options['tab_cache'])
+                 for i, point in enumerate(points)]
+
+        self._design = None
+        self._vals = np.zeros((len(OD_OUTPUTS), len(tasks)))
+        self._converged = np.zeros(len(tasks))
+        self._jac = np.zeros((len(OD_OUTPUTS), len(tasks), len(self._targets)))
+        for i, vals, jac, converged, elapsed in self._pool.map(_run_point, tasks):
+            self._vals[:, i] = vals
+            self._converged[i] = converged
+            self._jac[:, i, :] = jac
+            self.point_times[i] = elapsed
+        self._design = design
+
+    def compute(self, inputs, outputs):
+        self._run_points(inputs)
+
+        for k, name in enumerate(OD_OUTPUTS):
+            outputs[name.replace('.', ':')] = self._vals[k]
+        outputs['converged'] = self._converged
+
+        failed = np.where(self._converged == 0)[0].tolist()
+        if failed:
+            raise om.AnalysisError('Off-design points %s did not converge' % failed)
+
+    def compute_partials(self, inputs, partials):
+        # The point derivatives come with the outputs; the points only run again if the
+        # design changed since (or compute did not run first).
+        self._run_points(inputs)
+        for k, name in enumerate(OD_OUTPUTS):
+            for j, tgt in enumerate(self._targets):
+                partials[name.replace('.', ':'), self._input_name(tgt)] = self._jac[k, :, j]
+
+
+class ParallelMPTurbojet(om.Group):
+    """
+    The Turbojet design point of MPTurbojet, with its off-design points run in parallel.
+    """
+    def initialize(self):
+        self.options.declare('points', types=list, desc='List of (MN, alt in ft, Fn in lbf)')
+        self.options.declare('max_workers', default=None, allow_none=True)
+        self.options.declare('tab_cache', default=None, allow_none=True)
+
+    def setup(self):
+        tab_cache = self.options['tab_cache']
+        tab_spec = load_tab_spec(tab_cache) if tab_cache is not None else None
+        self.add_subsystem('DESIGN', Turbojet(tab_spec=tab_spec))
+
+        self.set_input_defaults('DESIGN.Nmech', 8070.0, units='rpm')
+        self.set_input_defaults('DESIGN.inlet.MN', 0.60)
+        self.set_input_defaults('DESIGN.comp.MN', 0.020)
+        self.set_input_defaults('DESIGN.burner.MN', 0.020)
+        self.set_input_defaults('DESIGN.turb.MN', 0.4)
+        for name, val in CYCLE_PARAMS.items():
+            self.set_input_defaults('DESIGN.' + name, val)
+
+        self.od = self.add_subsystem('od', ParallelOffDesign(points=self.options['points'],
+                                                             max_workers=self.options['max_workers'],
+                                                             tab_cache=tab_cache))
+
+    def configure(self):
+        for src, tgt in self.od.des_od_conns:
+            self.connect('DESIGN.' + src, 'od.' + ParallelOffDesign._input_name(tgt))
+
+
+if __name__ == '__main__':
+
+    import pycycle.api as pyc
+
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    # Up to 10000 ft, where the Turbojet sized for 11800 lbf still makes 8000 lbf; above
+    # that the off-design balances have no solution.
+    MNs = np.linspace(0.000001, 0.8, num_points)
+    alts = np.linspace(0.0, 10000.0, num_points)
+    points = [(MN, alt, 8000.0) for MN, alt in zip(MNs, alts)]
+
+    tab_cache = compile_tab_spec(pyc.AIR_JETA_TAB_SPEC)
+
+    for max_workers in (1, None):
+        prob = om.Problem(ParallelMPTurbojet(points=points, max_workers=max_workers,
+                                             tab_cache=tab_cache))
+        prob.setup(check=False)
+        set_design_point(prob)
+        prob.set_solver_print(level=-1)
+
+        od = prob.model.od
+        try:
+            st = time.time()
+            prob.run_model()
+            run_time = time.time() - st
+
+            st = time.time()
+            totals = prob.compute_totals(of=['od.perf:TSFC'],
+                                         wrt=['DESIGN.comp.PR', 'DESIGN.comp.eff'])
+            totals_time = time.time() - st
+        finally:
+            # Also frees the shared memory when a point fails.
+            od.shutdown()
+
+        print('%d workers: run_model %.2f s (points %.2f s in total), compute_totals %.2f s' %
+              (max_workers or min(num_points, os.cpu_count()), run_time, od.point_times.sum(),
+               totals_time))
+        print('    TSFC', prob.get_val('od.perf:TSFC'))
+        print('    dTSFC/dPR', totals['od.perf:TSFC', 'DESIGN.comp.PR'].ravel())
@@ -0,0 +1,216 @@
+"""
+Memory-mapped caches of large custom tabular thermo specs, shared by pyCycle workers.
+
+This is only a memory-sharing aid: the tables are stored as is, and the interpolants are
+still built by pyCycle's thermo setup in every process. Importing pycycle already loads
+pyc.AIR_JETA_TAB_SPEC in every process, so caching the stock spec gains neither memory nor
+setup time; the saving is for larger custom tables each worker would otherwise load itself.
+"""
+import hashlib
+import os
+import pickle
+import resource
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Key of the placeholders that stand for arrays in the pickled skeleton of a cached spec.
+# Plain dicts rather than a class, so the skeleton unpickles without this module.
+_ARRAY_KEY = '__mapped_array__'
+
+
+def _split(obj, arrays, path):
+    """
+    Copy of obj with every ndarray replaced by a placeholder, collecting the arrays.
+    """
+    if isinstance(obj, np.ndarray) and obj.dtype != object:
+        fname = '%03d_%s.npy' % (len(arrays), path.replace('/', '_')[-60:])
+        arrays[fname] = obj
+        return {_ARRAY_KEY: fname}
+    if isinstance(obj, dict):
+        return type(obj)((k, _split(v, arrays, '%s.%s' % (path, k))) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_split(v, arrays, '%s.%d' % (path, i)) for i, v in enumerate(obj))
+    return obj
+
+
+def _join(obj, cache_dir):
+    if isinstance(obj, dict) and _ARRAY_KEY in obj:
+        return np.load(os.path.join(cache_dir, obj[_ARRAY_KEY]), mmap_mode='r')
+    if isinstance(obj, dict):
+        return type(obj)((k, _join(v, cache_dir)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_join(v, cache_dir) for v in obj)
+    return obj
+
+
+def _module_data(module):
+    """
+    Plain data attributes of a spec module (functions, classes and modules are left out).
+    """
+    return {name: val for name, val in vars(module).items()
+            if not name.startswith('__') and
+            not isinstance(val, (types.ModuleType, types.FunctionType, type))}
+
+
+def compile_tab_spec(spec, cache_dir='thermo_cache', name=None):
+    """
+    Write a tabular thermo spec (a module or dict of tables) to a memory-mappable cache.
+
+    Every array of the spec becomes an .npy file; everything else goes into a small pickled
+    skeleton. The cache directory is named after a hash of the contents, so a changed spec
+    gets a new cache.
+
+    Returns
+    -------
+    str
+        The cache directory to pass to load_tab_spec.
+    """
+    if isinstance(spec, types.ModuleType):
+        kind, data = 'module', _module_data(spec)
+        name = name or spec.__name__.rsplit('.', 1)[-1]
+    else:
+        kind, data = 'object', spec
+        name = name or type(spec).__name__
+
+    arrays = {}
+    skeleton = _split(data, arrays, name)
+
+    sha = hashlib.sha1(pickle.dumps((kind, skeleton), protocol=4))
+    for fname in sorted(arrays):
+        sha.update(np.ascontiguousarray(arrays[fname]).tobytes())
+    path = os.path.join(cache_dir, '%s_%s' % (name, sha.hexdigest()[:16]))
+
+    if not os.path.isdir(path):
+        tmp = path + '.tmp%d' % os.getpid()
+        os.makedirs(tmp)
+        for fname, arr in arrays.items():
+            np.save(os.path.join(tmp, fname), np.ascontiguousarray(arr))
+        with open(os.path.join(tmp, 'skeleton.pkl'), 'wb') as f:
+            pickle.dump({'kind': kind, 'name': name, 'data': skeleton}, f, protocol=4)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process compiled the same spec first
+            pass
+
+    return path
+
+
+def load_tab_spec(path):
+    """
+    Tabular thermo spec from a cache written by compile_tab_spec.
+
+    The arrays are read-only memory maps, so nothing is computed or copied at load time
+    and all processes using the same cache share the pages of the tables. Only the pages
+    that are read get loaded, and MetaModelStructuredComp only reads the table cells it
+    interpolates in.
+    """
+    with open(os.path.join(path, 'skeleton.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+
+    data = _join(meta['data'], path)
+    if meta['kind'] == 'module':
+        spec = types.ModuleType(meta['name'])
+        spec.__dict__.update(data)
+        return spec
+    return data
+
+
+def _memory_mb():
+    """
+    Proportional set size of this process (shared pages split between the processes
+    mapping them), or the peak RSS where /proc is not available.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def _refined_spec(spec, factor):
+    """
+    Copy of a tabular spec with factor times finer P and T grids, linearly interpolated.
+    """
+    from scipy.interpolate import RegularGridInterpolator
+
+    def refine(grid):
+        return np.interp(np.arange((grid.size - 1) * factor + 1) / factor,
+                         np.arange(grid.size), grid)
+
+    grid = (spec['FAR'], spec['P'], spec['T'])
+    fine = dict(spec, P=refine(spec['P']), T=refine(spec['T']))
+    points = np.stack(np.meshgrid(fine['FAR'], fine['P'], fine['T'], indexing='ij'), axis=-1)
+    for name, val in spec.items():
+        if isinstance(val, np.ndarray) and val.shape == tuple(g.size for g in grid):
+            fine[name] = RegularGridInterpolator(grid, val)(points)
+    return fine
+
+
+def _worker_setup(source):
+    """
+    Set up and run the turbojet design point; report setup time and memory.
+
+    source is a pickle file of a spec or a cache directory.
+    """
+    import openmdao.api as om
+    from pycycle_turbojet import Turbojet, set_design_point
+
+    st = time.perf_counter()
+    if source.endswith('.pkl'):
+        with open(source, 'rb') as f:
+            tab_spec = pickle.load(f)
+    else:
+        tab_spec = load_tab_spec(source)
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem('DESIGN', Turbojet(tab_spec=tab_spec))
+    prob.model.set_input_defaults('DESIGN.Nmech', 8070.0, units='rpm')
+    prob.model.set_input_defaults('DESIGN.inlet.MN', 0.60)
+    prob.model.set_input_defaults('DESIGN.comp.MN', 0.020)
+    prob.model.set_input_defaults('DESIGN.burner.MN', 0.020)
+    prob.model.set_input_defaults('DESIGN.turb.MN', 0.4)
+    prob.setup(check=False)
+    prob.final_setup()
+    setup_time = time.perf_counter() - st
+
+    set_design_point(prob)
+    prob.set_val('DESIGN.burner.dPqP', 0.03)
+    prob.set_val('DESIGN.nozz.Cv', 0.99)
+    prob.set_solver_print(level=-1)
+    prob.run_model()
+
+    return setup_time, _memory_mb()
+
+
+if __name__ == '__main__':
+
+    import pycycle.api as pyc
+
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    # A spec pycycle does not load by itself, which each worker would otherwise unpickle.
+    os.makedirs('thermo_cache', exist_ok=True)
+    fine = _refined_spec(pyc.AIR_JETA_TAB_SPEC, 2)
+    fine_pkl = os.path.join('thermo_cache', 'air_jetA_fine.pkl')
+    with open(fine_pkl, 'wb') as f:
+        pickle.dump(fine, f, protocol=4)
+    fine_cache = compile_tab_spec(fine, name='air_jetA_fine')
+    print('Compiled %s (%.1f MB of tables)' %
+          (fine_cache, sum(v.nbytes for v in fine.values() if isinstance(v, np.ndarray)) / 2**20))
+
+    for label, source in (('fine spec, unpickled', fine_pkl),
+                          ('fine spec, memory-mapped', fine_cache)):
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            results = list(pool.map(_worker_setup, [source] * num_workers))
+        setup_times, memory = zip(*results)
+        print('%-25s %d workers: mean setup %.3f s, mean memory %.1f MB' %
+              (label, num_workers, np.mean(setup_times), np.mean(memory)))
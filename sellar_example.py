@@ -1,14 +1,19 @@
 import openmdao.api as om
 import numpy as np
 
+from incremental_n2 import n2_incremental
+from partials_sparsity import SparsePartialsMixin
 
-class SellarDis1(om.ExplicitComponent):
+
+class SellarDis1(SparsePartialsMixin, om.ExplicitComponent):
     def setup(self):
         self.add_input('z', val=np.zeros(2))
         self.add_input('x', val=0.)
         self.add_input('y2', val=1.0)
         self.add_output('y1', val=1.0)
-        self.declare_partials('*', '*', method='fd')
+
+    def setup_partials(self):
+        self.declare_sparse_partials(method='fd')
 
     def compute(self, inputs, outputs):
         z1 = inputs['z'][0]
@@ -18,12 +23,14 @@ class SellarDis1(om.ExplicitComponent):
 
         outputs['y1'] = z1**2 + z2 + x1 - 0.2*y2
 
-class SellarDis2(om.ExplicitComponent):
+class SellarDis2(SparsePartialsMixin, om.ExplicitComponent):
     def setup(self):
         self.add_input('z', val=np.zeros(2))
         self.add_input('y1', val=1.0)
         self.add_output('y2', val=1.0)
-        self.declare_partials('*', '*', method='fd')
+
+    def setup_partials(self):
+        self.declare_sparse_partials(method='fd')
 
     def compute(self, inputs, outputs):
         z1 = inputs['z'][0]
@@ -57,6 +64,7 @@ model = prob.model
 model.add_subsystem('sellar_mda', SellarMDA())
 prob.setup()
 
-om.n2(prob, outfile="coupled_no_solver.html", display_in_notebook=False)
+# Only regenerated when the model changed
+n2_incremental(prob, outfile="coupled_no_solver.html", display_in_notebook=False)
 prob.run_model()
 prob.model.list_outputs();
\ No newline at end of file
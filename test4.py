@@ -21,7 +21,7 @@ class Motor(om.ExplicitComponent):
         motor_efficiency = 1
         outputs['P_in'] = P_req_shaft / motor_efficiency
 
-    def compute_partials(self, partials):
+    def compute_partials(self, inputs, partials):
         motor_efficiency = 1
         partials['P_in', 'P_req_shaft'] = 1.0 / motor_efficiency
 
@@ -43,7 +43,7 @@ class PowerSplitter(om.ExplicitComponent):
         outputs['P_fuelcell'] = x * P_out  # 70% from fuel cell
         outputs['P_battery'] = (1 - x) * P_out  # 30% from battery
 
-    def compute_partials(self, partials):
+    def compute_partials(self, inputs, partials):
         x = 0.7
         partials['P_fuelcell', 'P_out'] = x
         partials['P_battery', 'P_out'] = 1 - x
@@ -62,33 +62,45 @@ class FuelCell(om.ExplicitComponent):
         # Calculate P_fuelcell
         outputs['P_fuelcell'] = P_fc  # Modify this as needed
 
-    def compute_partials(self, partials):
+    def compute_partials(self, inputs, partials):
         partials['P_fuelcell', 'P_fc'] = 1.0
 
 
 class Battery(om.ExplicitComponent):
+    def initialize(self):
+        # Number of time points evaluated at once
+        self.options.declare('num_nodes', default=1, types=int)
+
     def setup(self):
-        self.add_input('P_batt', val=0.0, units='W')
+        nn = self.options['num_nodes']
+        self.add_input('P_batt', val=np.zeros(nn), units='W')
         #self.add_input('E_capacity_batt', val=30*3600, units='J') # 1 Wh = 3600 J
         self.add_input('E_capacity_batt', units='J') # 1 Wh = 3600 J
         self.add_input('SoC_initial')
         # 0.25C means 60min/0.25 (4h), 0.5C means 60min/0.5 (2h), 1C means 60 min,
         # 2C means 60min/2, 5C means 60min/5
         self.add_input('C_rate_batt') # 1C
-        self.add_input('time', units='s') # 1 s
-        self.add_output('E_final_batt', val=0.0, units='J')
-        self.add_output('SoC_final', val=0.0)
+        self.add_input('time', val=np.ones(nn), units='s') # 1 s
+        self.add_output('E_final_batt', val=np.zeros(nn), units='J')
+        self.add_output('SoC_final', val=np.zeros(nn))
         self.add_output('E_in_battery', val=0.0, units ='J')
+        # Battery power minus the maximum power allowed by the C-rate. Constrained to be <= 0
+        # instead of raising in compute, so the optimizer sees a smooth limit.
+        self.add_output('P_margin', val=np.zeros(nn), units='W')
 
     def setup_partials(self):
-        #self.declare_partials('E_final_batt', 'P_batt')
-        #self.declare_partials('SoC_final', 'P_batt')
-        #self.declare_partials('E_in_battery', 'P_batt')
-        self.declare_partials('E_final_batt', ['P_batt', 'E_capacity_batt', 'SoC_initial', 'time', 'C_rate_batt'])
-        self.declare_partials('SoC_final', ['P_batt', 'E_capacity_batt', 'SoC_initial', 'time', 'C_rate_batt'])
-        self.declare_partials('E_in_battery', ['P_batt', 'E_capacity_batt', 'SoC_initial', 'time', 'C_rate_batt'])
-
-        # Shouldn't there be with respect to all *?
+        nn = self.options['num_nodes']
+        ar = np.arange(nn)
+        zeros = np.zeros(nn, dtype=int)
+
+        # Each time point only depends on its own P_batt and time, the rest are shared scalars
+        self.declare_partials(['E_final_batt', 'SoC_final'], ['P_batt', 'time'], rows=ar, cols=ar)
+        self.declare_partials(['E_final_batt', 'SoC_final'], ['E_capacity_batt', 'SoC_initial'],
+                              rows=ar, cols=zeros)
+        self.declare_partials('E_in_battery', 'E_capacity_batt', val=1.0)
+        self.declare_partials('P_margin', 'P_batt', rows=ar, cols=ar, val=1.0)
+        self.declare_partials('P_margin', ['E_capacity_batt', 'SoC_initial', 'C_rate_batt'],
+                              rows=ar, cols=zeros)
 
     def compute(self, inputs, outputs):
         P_batt = inputs['P_batt']
@@ -98,13 +110,7 @@ class Battery(om.ExplicitComponent):
         C_rate_batt = inputs['C_rate_batt']
 
         max_power_allowed = (E_capacity_batt * SoC_initial * C_rate_batt) / (60 * 60) # [J]*[~]*[~]/[s]
-        tolerance = 1e-14  # or whatever small value you consider appropriate
-        if P_batt > max_power_allowed + tolerance:
-        #if P_batt > max_power_allowed:
-            #pdb.set_trace()  # Execution will stop here
-            #print(f'P_batt: {P_batt}, E_capacity_batt: {E_capacity_batt}, max_power_allowed: {max_power_allowed}, SoC_initial: {SoC_initial}, time: {time}, C_rate_batt: {C_rate_batt}')
-            #print(f'P_batt: {[f"{num:.14f}" for num in P_batt]}, E_capacity_batt: {[f"{num:.14f}" for num in E_capacity_batt]}, max_power_allowed: {[f"{num:.14f}" for num in max_power_allowed]}, SoC_initial: {[f"{num:.14f}" for num in SoC_initial]}, time: {[f"{num:.14f}" for num in time]}, C_rate_batt: {[f"{num:.14f}" for num in C_rate_batt]}')
-            raise ValueError('Battery power exceeds maximum power allowed by C-rate')
+        outputs['P_margin'] = P_batt - max_power_allowed
         # Calculate the final energy in the battery
         outputs['E_final_batt'] = (E_capacity_batt * SoC_initial) - (P_batt * time)
         # Calculate change in SoC for the particular time step which is 1 [s]
@@ -119,24 +125,21 @@ class Battery(om.ExplicitComponent):
         E_capacity_batt = inputs['E_capacity_batt']
         SoC_initial = inputs['SoC_initial']
         time = inputs['time']
+        C_rate_batt = inputs['C_rate_batt']
 
         partials['E_final_batt', 'P_batt'] = -1 * time
         partials['E_final_batt', 'E_capacity_batt'] = SoC_initial
         partials['E_final_batt', 'SoC_initial'] = E_capacity_batt
         partials['E_final_batt', 'time'] = -1 * P_batt
-        partials['E_final_batt', 'C_rate_batt'] = 0  # C_rate_batt does not affect E_final_batt directly
 
         partials['SoC_final', 'P_batt'] = time / E_capacity_batt
         partials['SoC_final', 'E_capacity_batt'] = -1 * (P_batt * time) / (E_capacity_batt ** 2)
         partials['SoC_final', 'SoC_initial'] = 1
         partials['SoC_final', 'time'] = P_batt / E_capacity_batt
-        partials['SoC_final', 'C_rate_batt'] = 0  # C_rate_batt does not affect SoC_final directly
 
-        partials['E_in_battery', 'E_capacity_batt'] = 1
-        partials['E_in_battery', 'P_batt'] = 0  # P_batt does not affect E_in_battery directly
-        partials['E_in_battery', 'SoC_initial'] = 0  # SoC_initial does not affect E_in_battery directly
-        partials['E_in_battery', 'time'] = 0  # time does not affect E_in_battery directly
-        partials['E_in_battery', 'C_rate_batt'] = 0  # C_rate_batt does not affect E_in_battery directly
+        partials['P_margin', 'E_capacity_batt'] = -SoC_initial * C_rate_batt / (60 * 60)
+        partials['P_margin', 'SoC_initial'] = -E_capacity_batt * C_rate_batt / (60 * 60)
+        partials['P_margin', 'C_rate_batt'] = -E_capacity_batt * SoC_initial / (60 * 60)
 
 
 class TotalMass(om.ExplicitComponent):
@@ -245,6 +248,8 @@ prob.model.add_design_var('E_capacity_batt', lower=1*60*60, upper=100*60*60) # 1
 
 prob.model.add_objective('mass.total_mass.mass_total')
 prob.model.add_constraint('power.fuelcell.P_fuelcell', upper=400.0)
+# Battery power must stay within what the C-rate allows
+prob.model.add_constraint('power.battery.P_margin', upper=0.0, ref=100.0)
 
 # Define the driver
 prob.driver = om.ScipyOptimizeDriver()
@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openmdao.api as om
+
+from vehicle_timeseries import VehicleMission, drive_cycle
+
+
+# Per-cell results stored in the carpet file, all with the shape of the grid.
+RESULT_NAMES = ('mass_total', 'E_capacity_batt', 'P_fuelcell_rated', 'success', 'iterations')
+
+
+def build_sizing_problem(num_nodes=1):
+    """
+    Minimum mass sizing of the fuel cell / battery vehicle over a drive cycle.
+
+    The design vars are the battery capacity and the rated fuel cell power; the fuel cell
+    power must stay below its rating and the battery power within its C-rate limit at
+    every step. The split ratio x and the two densities are left as inputs to sweep.
+    """
+    nn = num_nodes
+    prob = om.Problem()
+    model = prob.model
+
+    model.add_subsystem('mission', VehicleMission(num_nodes=nn), promotes=['*'])
+    model.add_subsystem('fc_limit', om.ExecComp('fc_margin = P_fc - P_rated', has_diag_partials=True,
+                                                fc_margin={'shape': nn, 'units': 'W'},
+                                                P_fc={'shape': nn, 'units': 'W'},
+                                                P_rated={'shape': nn, 'units': 'W'}))
+    model.connect('power.fuelcell.P_fuelcell', 'fc_limit.P_fc')
+    model.connect('P_fuelcell_rated', 'fc_limit.P_rated', src_indices=np.zeros(nn, dtype=int))
+
+    model.add_design_var('E_capacity_batt', lower=1*3600, upper=1000*3600, ref=50*3600)
+    model.add_design_var('P_fuelcell_rated', lower=1.0, upper=2000.0, ref=100.0)
+    model.add_objective('mass.total_mass.mass_total')
+    model.add_constraint('power.battery.P_margin_KS', upper=0.0, ref=100.0)
+    model.add_constraint('fc_limit.fc_margin', upper=0.0, ref=100.0)
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+    prob.driver.options['maxiter'] = 200
+    prob.driver.options['tol'] = 1e-8
+    prob.driver.options['disp'] = False
+
+    prob.setup()
+    return prob
+
+
+def serpentine(shape):
+    """
+    Multi-indices of a grid in boustrophedon order, so consecutive cells are neighbors.
+
+    The last axis alternates direction on every row, the axis before it on every plane, and
+    so on, which lets each optimization start from the optimum of the cell just before it.
+    """
+    order = [()]
+    for n in shape:
+        new = []
+        for k, prefix in enumerate(order):
+            rng = range(n) if k % 2 == 0 else range(n - 1, -1, -1)
+            new.extend(prefix + (i,) for i in rng)
+        order = new
+    return order
+
+
+def _sweep_chunk(args):
+    """
+    Optimize the cells of one split ratio plane in serpentine order, warm starting each
+    cell from the previous optimum.
+    """
+    i, x, power_densities, energy_densities, P_req_shaft, dt = args
+
+    prob = build_sizing_problem(num_nodes=P_req_shaft.size)
+    prob.set_val('P_req_shaft', P_req_shaft, units='W')
+    prob.set_val('dt', dt, units='s')
+    prob.set_val('x', x)
+
+    shape = (power_densities.size, energy_densities.size)
+    results = {name: np.zeros(shape) for name in RESULT_NAMES}
+    results['success'] = np.zeros(shape, dtype=bool)
+    results['iterations'] = np.zeros(shape, dtype=int)
+
+    last_good = None
+    for j, k in serpentine(shape):
+        prob.set_val('fuelcell_power_density', power_densities[j], units='W/kg')
+        prob.set_val('battery_energy_density', energy_densities[k], units='W*h/kg')
+
+        # Start from the last converged optimum, normally the neighboring cell.
+        if last_good is not None:
+            prob.set_val('E_capacity_batt', last_good[0], units='J')
+            prob.set_val('P_fuelcell_rated', last_good[1], units='W')
+
+        prob.run_driver()
+        success = prob.driver.result.success
+
+        E = prob.get_val('E_capacity_batt', units='J')[0]
+        P = prob.get_val('P_fuelcell_rated', units='W')[0]
+        results['mass_total'][j, k] = prob.get_val('mass.total_mass.mass_total', units='kg')[0]
+        results['E_capacity_batt'][j, k] = E
+        results['P_fuelcell_rated'][j, k] = P
+        results['success'][j, k] = success
+        results['iterations'][j, k] = prob.driver.iter_count
+
+        if success:
+            last_good = (E, P)
+
+    return i, results
+
+
+def carpet_sweep(path, splits, power_densities, energy_densities, P_req_shaft=None, dt=None,
+                 max_workers=None):
+    """
+    Optimal vehicle mass over a grid of split ratio x power density x energy density.
+
+    Every split ratio plane is a separate task on a process pool; inside a plane the cells
+    are swept in serpentine order with warm starts. The results are written to path as an
+    .npz file of arrays with the shape of the grid, read back with load_carpet.
+
+    Parameters
+    ----------
+    path : str
+        Output .npz file.
+    splits : array_like
+        Fractions of the power supplied by the fuel cell.
+    power_densities : array_like
+        Fuel cell power densities in W/kg.
+    energy_densities : array_like
+        Battery energy densities in Wh/kg.
+    P_req_shaft : ndarray or None
+        Shaft power of the drive cycle in W, a single 100 W step if None.
+    dt : ndarray or None
+        Time steps of the drive cycle in s, 1 s per step if None.
+    max_workers : int or None
+        Size of the process pool. 1 runs serially in this process.
+
+    Returns
+    -------
+    dict
+        The carpet, as returned by load_carpet.
+    """
+    splits = np.asarray(splits, dtype=float)
+    power_densities = np.asarray(power_densities, dtype=float)
+    energy_densities = np.asarray(energy_densities, dtype=float)
+    if P_req_shaft is None:
+        P_req_shaft = np.array([100.0])
+    P_req_shaft = np.asarray(P_req_shaft, dtype=float)
+    dt = np.ones(P_req_shaft.size) if dt is None else np.asarray(dt, dtype=float)
+
+    shape = (splits.size, power_densities.size, energy_densities.size)
+    carpet = {name: np.zeros(shape) for name in RESULT_NAMES}
+    carpet['success'] = np.zeros(shape, dtype=bool)
+    carpet['iterations'] = np.zeros(shape, dtype=int)
+
+    tasks = [(i, x, power_densities, energy_densities, P_req_shaft, dt)
+             for i, x in enumerate(splits)]
+
+    st = time.time()
+    if max_workers == 1:
+        chunks = list(map(_sweep_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunks = list(pool.map(_sweep_chunk, tasks))
+
+    for i, results in chunks:
+        for name in RESULT_NAMES:
+            carpet[name][i] = results[name]
+
+    print('Swept %d cells in %.2f s, %d did not converge' %
+          (carpet['success'].size, time.time() - st, np.count_nonzero(~carpet['success'])))
+
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, x=splits, fuelcell_power_density=power_densities,
+             battery_energy_density=energy_densities, **carpet)
+    os.replace(tmp, path)
+
+    return load_carpet(path)
+
+
+def load_carpet(path):
+    """
+    Read a carpet written by carpet_sweep.
+
+    Returns
+    -------
+    dict
+        The grid axes 'x', 'fuelcell_power_density' (W/kg) and 'battery_energy_density'
+        (Wh/kg), and one array per result with shape (x, power density, energy density).
+    """
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def carpet_lookup(carpet, x, fuelcell_power_density, battery_energy_density):
+    """
+    Results of the grid cell nearest to the given split ratio and densities.
+    """
+    idx = tuple(int(np.argmin(np.abs(carpet[axis] - val))) for axis, val in
+                (('x', x), ('fuelcell_power_density', fuelcell_power_density),
+                 ('battery_energy_density', battery_energy_density)))
+    return {name: carpet[name][idx] for name in RESULT_NAMES}
+
+
+if __name__ == '__main__':
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vehicle_carpet.npz'
+
+    P_req_shaft, dt = drive_cycle(600)
+    carpet = carpet_sweep(path,
+                          splits=np.linspace(0.3, 0.9, 7),
+                          power_densities=np.linspace(500., 1500., 11),
+                          energy_densities=np.linspace(15., 45., 11),
+                          P_req_shaft=P_req_shaft, dt=dt)
+
+    best = np.unravel_index(np.argmin(np.where(carpet['success'], carpet['mass_total'], np.inf)),
+                            carpet['mass_total'].shape)
+    print('Lightest vehicle: x = %.2f, %g W/kg, %g Wh/kg -> %.4f kg' %
+          (carpet['x'][best[0]], carpet['fuelcell_power_density'][best[1]],
+           carpet['battery_energy_density'][best[2]], carpet['mass_total'][best]))
+    print('Mean SLSQP iterations per cell: %.1f' % carpet['iterations'].mean())
+    print(carpet_lookup(carpet, 0.7, 1000., 25.))
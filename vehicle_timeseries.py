@@ -0,0 +1,350 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+
+
+class Motor(om.ExplicitComponent):
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('motor_efficiency', default=1.0)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('P_req_shaft', val=np.zeros(nn), units='W')
+        self.add_output('P_in', val=np.zeros(nn), units='W')
+
+    def setup_partials(self):
+        ar = np.arange(self.options['num_nodes'])
+        self.declare_partials('P_in', 'P_req_shaft', rows=ar, cols=ar,
+                              val=1.0 / self.options['motor_efficiency'])
+
+    def compute(self, inputs, outputs):
+        outputs['P_in'] = inputs['P_req_shaft'] / self.options['motor_efficiency']
+
+
+class PowerSplitter(om.ExplicitComponent):
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('P_out', val=np.zeros(nn), units='W')
+        # Fraction of the power supplied by the fuel cell
+        self.add_input('x', val=0.7)
+        self.add_output('P_fuelcell', val=np.zeros(nn), units='W')
+        self.add_output('P_battery', val=np.zeros(nn), units='W')
+
+    def setup_partials(self):
+        nn = self.options['num_nodes']
+        ar = np.arange(nn)
+        zeros = np.zeros(nn, dtype=int)
+        self.declare_partials(['P_fuelcell', 'P_battery'], 'P_out', rows=ar, cols=ar)
+        self.declare_partials(['P_fuelcell', 'P_battery'], 'x', rows=ar, cols=zeros)
+
+    def compute(self, inputs, outputs):
+        P_out = inputs['P_out']
+        x = inputs['x']
+        # Split power between fuel cell and battery
+        outputs['P_fuelcell'] = x * P_out
+        outputs['P_battery'] = (1 - x) * P_out
+
+    def compute_partials(self, inputs, partials):
+        P_out = inputs['P_out']
+        x = inputs['x']
+        partials['P_fuelcell', 'P_out'] = x
+        partials['P_battery', 'P_out'] = 1 - x
+        partials['P_fuelcell', 'x'] = P_out
+        partials['P_battery', 'x'] = -P_out
+
+
+class FuelCell(om.ExplicitComponent):
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('P_fc', val=np.zeros(nn), units='W')
+        self.add_output('P_fuelcell', val=np.zeros(nn), units='W')
+
+    def setup_partials(self):
+        ar = np.arange(self.options['num_nodes'])
+        self.declare_partials('P_fuelcell', 'P_fc', rows=ar, cols=ar, val=1.0)
+
+    def compute(self, inputs, outputs):
+        outputs['P_fuelcell'] = inputs['P_fc']
+
+
+class BatterySoC(om.ImplicitComponent):
+    """
+    State of charge after every time step of the cycle.
+
+    The residual of step i is SoC[i] - SoC[i-1] + P_batt[i] * dt[i] / E_capacity_batt,
+    with SoC[-1] = SoC_initial. Its Jacobian with respect to SoC is lower bidiagonal,
+    so the nonlinear and linear solves are a cumulative sum.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('P_batt', val=np.zeros(nn), units='W')
+        self.add_input('dt', val=np.ones(nn), units='s')
+        self.add_input('E_capacity_batt', val=30*3600, units='J')
+        self.add_input('SoC_initial', val=1.0)
+        self.add_output('SoC', val=np.ones(nn))
+
+    def setup_partials(self):
+        nn = self.options['num_nodes']
+        ar = np.arange(nn)
+
+        rows = np.concatenate([ar, ar[1:]])
+        cols = np.concatenate([ar, ar[:-1]])
+        self.declare_partials('SoC', 'SoC', rows=rows, cols=cols,
+                              val=np.concatenate([np.ones(nn), -np.ones(nn - 1)]))
+        self.declare_partials('SoC', ['P_batt', 'dt'], rows=ar, cols=ar)
+        self.declare_partials('SoC', 'E_capacity_batt', rows=ar, cols=np.zeros(nn, dtype=int))
+        self.declare_partials('SoC', 'SoC_initial', rows=[0], cols=[0], val=-1.0)
+
+    def apply_nonlinear(self, inputs, outputs, residuals):
+        SoC = outputs['SoC']
+        previous = np.concatenate([inputs['SoC_initial'], SoC[:-1]])
+        residuals['SoC'] = SoC - previous + inputs['P_batt'] * inputs['dt'] / inputs['E_capacity_batt']
+
+    def solve_nonlinear(self, inputs, outputs):
+        dSoC = inputs['P_batt'] * inputs['dt'] / inputs['E_capacity_batt']
+        outputs['SoC'] = inputs['SoC_initial'] - np.cumsum(dSoC)
+
+    def linearize(self, inputs, outputs, partials):
+        P_batt = inputs['P_batt']
+        dt = inputs['dt']
+        E = inputs['E_capacity_batt']
+
+        partials['SoC', 'P_batt'] = dt / E
+        partials['SoC', 'dt'] = P_batt / E
+        partials['SoC', 'E_capacity_batt'] = -P_batt * dt / E ** 2
+
+    def solve_linear(self, d_outputs, d_residuals, mode):
+        if mode == 'fwd':
+            d_outputs['SoC'] = np.cumsum(d_residuals['SoC'])
+        else:
+            d_residuals['SoC'] = np.cumsum(d_outputs['SoC'][::-1])[::-1]
+
+
+class Battery(om.ExplicitComponent):
+    """
+    Energy left in the battery and how far every step is from the C-rate power limit.
+
+    P_margin = P_batt - E_capacity_batt * SoC * C_rate_batt / 3600 must be <= 0. It is
+    available per step and aggregated with a Kreisselmeier-Steinhauser function into
+    P_margin_KS, a smooth, conservative estimate of its maximum over the cycle.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('ks_rho', default=50.0, desc='KS aggregation factor')
+        self.options.declare('ks_ref', default=100.0, desc='Power (W) P_margin is scaled by '
+                                                           'before aggregation')
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_input('P_batt', val=np.zeros(nn), units='W')
+        self.add_input('SoC', val=np.ones(nn))
+        self.add_input('E_capacity_batt', val=30*3600, units='J')  # 1 Wh = 3600 J
+        self.add_input('C_rate_batt', val=1.0)  # 1C
+        self.add_output('E_final_batt', val=np.zeros(nn), units='J')
+        self.add_output('E_in_battery', val=0.0, units='J')
+        self.add_output('P_margin', val=np.zeros(nn), units='W')
+        self.add_output('P_margin_KS', val=0.0, units='W')
+
+    def setup_partials(self):
+        nn = self.options['num_nodes']
+        ar = np.arange(nn)
+        zeros = np.zeros(nn, dtype=int)
+        self.declare_partials('E_final_batt', 'SoC', rows=ar, cols=ar)
+        self.declare_partials('E_final_batt', 'E_capacity_batt', rows=ar, cols=zeros)
+        self.declare_partials('E_in_battery', 'E_capacity_batt', val=1.0)
+        self.declare_partials('P_margin', 'P_batt', rows=ar, cols=ar, val=1.0)
+        self.declare_partials('P_margin', 'SoC', rows=ar, cols=ar)
+        self.declare_partials('P_margin', ['E_capacity_batt', 'C_rate_batt'], rows=ar, cols=zeros)
+        self.declare_partials('P_margin_KS', ['P_batt', 'SoC', 'E_capacity_batt', 'C_rate_batt'])
+
+    def _ks_weights(self, P_margin):
+        rho = self.options['ks_rho']
+        g = P_margin / self.options['ks_ref']
+        g_max = np.max(g)
+        w = np.exp(rho * (g - g_max))
+        w_sum = np.sum(w)
+        return g_max + np.log(w_sum) / rho, w / w_sum
+
+    def compute(self, inputs, outputs):
+        E = inputs['E_capacity_batt']
+        SoC = inputs['SoC']
+        # Energy left in the battery after every step
+        outputs['E_final_batt'] = E * SoC
+        outputs['E_in_battery'] = E
+
+        outputs['P_margin'] = P_margin = inputs['P_batt'] - E * SoC * inputs['C_rate_batt'] / 3600.
+        ks, _ = self._ks_weights(P_margin)
+        outputs['P_margin_KS'] = self.options['ks_ref'] * ks
+
+    def compute_partials(self, inputs, partials):
+        E = inputs['E_capacity_batt']
+        SoC = inputs['SoC']
+        C = inputs['C_rate_batt']
+
+        partials['E_final_batt', 'SoC'] = E
+        partials['E_final_batt', 'E_capacity_batt'] = SoC
+
+        partials['P_margin', 'SoC'] = -E * C / 3600.
+        partials['P_margin', 'E_capacity_batt'] = -SoC * C / 3600.
+        partials['P_margin', 'C_rate_batt'] = -E * SoC / 3600.
+
+        # d(P_margin_KS)/d(P_margin) are the normalized KS weights
+        _, w = self._ks_weights(inputs['P_batt'] - E * SoC * C / 3600.)
+        partials['P_margin_KS', 'P_batt'] = w
+        partials['P_margin_KS', 'SoC'] = -w * E * C / 3600.
+        partials['P_margin_KS', 'E_capacity_batt'] = -np.dot(w, SoC) * C / 3600.
+        partials['P_margin_KS', 'C_rate_batt'] = -np.dot(w, SoC) * E / 3600.
+
+
+class TotalMass(om.ExplicitComponent):
+    def setup(self):
+        self.add_input('P_fuelcell', val=0.0, units='W')  # rated fuel cell power
+        self.add_input('E_battery', val=0.0, units='J')
+        self.add_input('fuelcell_power_density', val=1000, units='W/kg')
+        self.add_input('battery_energy_density', val=25*3600, units='J/kg')
+        self.add_output('mass_total', val=0.0, units='kg')
+
+    def setup_partials(self):
+        self.declare_partials('mass_total', '*')
+
+    def compute(self, inputs, outputs):
+        # Fuel cell mass + battery mass
+        outputs['mass_total'] = inputs['P_fuelcell'] / inputs['fuelcell_power_density'] + \
+            inputs['E_battery'] / inputs['battery_energy_density']
+
+    def compute_partials(self, inputs, partials):
+        fuelcell_power_density = inputs['fuelcell_power_density']
+        battery_energy_density = inputs['battery_energy_density']
+        partials['mass_total', 'P_fuelcell'] = 1.0 / fuelcell_power_density
+        partials['mass_total', 'E_battery'] = 1.0 / battery_energy_density
+        partials['mass_total', 'fuelcell_power_density'] = \
+            -inputs['P_fuelcell'] / fuelcell_power_density ** 2
+        partials['mass_total', 'battery_energy_density'] = \
+            -inputs['E_battery'] / battery_energy_density ** 2
+
+
+class Propulsion(om.Group):
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_subsystem('motor', Motor(num_nodes=nn), promotes_inputs=['P_req_shaft'])
+
+
+class Power(om.Group):
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+        self.add_subsystem('powersplitter', PowerSplitter(num_nodes=nn))
+        self.add_subsystem('fuelcell', FuelCell(num_nodes=nn))
+        self.add_subsystem('soc', BatterySoC(num_nodes=nn))
+        self.add_subsystem('battery', Battery(num_nodes=nn))
+
+        self.connect('powersplitter.P_fuelcell', 'fuelcell.P_fc')
+        self.connect('powersplitter.P_battery', ['soc.P_batt', 'battery.P_batt'])
+        self.connect('soc.SoC', 'battery.SoC')
+
+
+class Mass(om.Group):
+    def setup(self):
+        self.add_subsystem('total_mass', TotalMass())
+
+
+class VehicleMission(om.Group):
+    """
+    Fuel cell / battery vehicle flown over a drive cycle of num_nodes time steps.
+    """
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        nn = self.options['num_nodes']
+
+        ivc = om.IndepVarComp()
+        ivc.add_output('SoC_initial', val=1.0)
+        ivc.add_output('P_req_shaft', val=100 * np.ones(nn), units='W')
+        ivc.add_output('dt', val=np.ones(nn), units='s')
+        ivc.add_output('x', val=0.7)
+        ivc.add_output('E_capacity_batt', val=30*3600, units='J')  # 30 Wh
+        ivc.add_output('C_rate_batt', val=1.0)  # 1C
+        ivc.add_output('P_fuelcell_rated', val=400.0, units='W')
+        ivc.add_output('fuelcell_power_density', val=1000, units='W/kg')
+        ivc.add_output('battery_energy_density', val=25*3600, units='J/kg')
+        self.add_subsystem('ivc', ivc, promotes=['*'])
+
+        self.add_subsystem('propulsion', Propulsion(num_nodes=nn))
+        self.add_subsystem('power', Power(num_nodes=nn))
+        self.add_subsystem('mass', Mass())
+
+        self.connect('P_req_shaft', 'propulsion.P_req_shaft')
+        self.connect('propulsion.motor.P_in', 'power.powersplitter.P_out')
+        self.connect('x', 'power.powersplitter.x')
+
+        self.connect('SoC_initial', 'power.soc.SoC_initial')
+        self.connect('dt', 'power.soc.dt')
+        self.connect('E_capacity_batt', ['power.soc.E_capacity_batt',
+                                         'power.battery.E_capacity_batt'])
+        self.connect('C_rate_batt', 'power.battery.C_rate_batt')
+
+        self.connect('P_fuelcell_rated', 'mass.total_mass.P_fuelcell')
+        self.connect('power.battery.E_in_battery', 'mass.total_mass.E_battery')
+        self.connect('fuelcell_power_density', 'mass.total_mass.fuelcell_power_density')
+        self.connect('battery_energy_density', 'mass.total_mass.battery_energy_density')
+
+
+def drive_cycle(num_nodes, dt=1.0, P_mean=100.0, seed=0):
+    """
+    Synthetic shaft power demand for a drive cycle, with short regenerative braking phases.
+
+    Returns
+    -------
+    tuple of ndarray
+        Shaft power (W) and time step (s) at every node.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_nodes) * dt
+    P = P_mean * (1.0 + 0.5 * np.sin(2 * np.pi * t / 600.0) + 0.3 * np.sin(2 * np.pi * t / 47.0))
+    P += 0.1 * P_mean * rng.standard_normal(num_nodes)
+    return np.maximum(P, -0.3 * P_mean), dt * np.ones(num_nodes)
+
+
+if __name__ == '__main__':
+
+    nn = 10000
+    P_req_shaft, dt = drive_cycle(nn)
+
+    prob = om.Problem()
+    prob.model.add_subsystem('mission', VehicleMission(num_nodes=nn), promotes=['*'])
+    prob.setup()
+
+    prob.set_val('P_req_shaft', P_req_shaft, units='W')
+    prob.set_val('dt', dt, units='s')
+    # 150 Wh covers the 84 Wh the battery supplies over the cycle, within its C-rate.
+    prob.set_val('E_capacity_batt', 150*3600, units='J')
+
+    st = time.time()
+    prob.run_model()
+    print('run_model for %d steps: %.4f s' % (nn, time.time() - st))
+
+    st = time.time()
+    totals = prob.compute_totals(of=['power.soc.SoC', 'mass.total_mass.mass_total'],
+                                 wrt=['E_capacity_batt', 'x'])
+    print('compute_totals: %.4f s' % (time.time() - st))
+
+    print('SoC_final:', prob.get_val('power.soc.SoC')[-1])
+    print('P_margin_KS (W, <= 0 within the C-rate):', prob.get_val('power.battery.P_margin_KS'))
+    print('mass_total (kg):', prob.get_val('mass.total_mass.mass_total'))
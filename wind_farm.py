@@ -0,0 +1,223 @@
+import time
+
+import numpy as np
+import openmdao.api as om
+from openmdao.utils.coloring import dynamic_total_coloring
+
+from actuator_disc_aep import ActuatorDisc
+
+
+def grid_layout(n_rows, n_cols, spacing_x=25.0, spacing_y=18.0):
+    """
+    Turbine positions on a regular grid, with the wind blowing along +x.
+
+    Returns
+    -------
+    tuple of ndarray
+        x and y positions in m.
+    """
+    x, y = np.meshgrid(np.arange(n_rows) * spacing_x, np.arange(n_cols) * spacing_y,
+                       indexing='ij')
+    return x.ravel(), y.ravel()
+
+
+def wake_coefficients(x, y, radius, k=0.05, max_length=np.inf, chunk=1024):
+    """
+    Jensen top-hat wake coefficients c_ij for turbine i sitting in the wake of turbine j.
+
+    Only pairs where i is downstream of j and inside j's wake cone get a coefficient,
+    so the result is returned in sparse (rows, cols, vals) form.
+
+    Parameters
+    ----------
+    x : ndarray
+        Streamwise turbine positions in m.
+    y : ndarray
+        Crosswise turbine positions in m.
+    radius : float
+        Rotor radius in m.
+    k : float
+        Wake expansion rate.
+    max_length : float
+        Streamwise distance beyond which a wake is ignored, in m.
+    chunk : int
+        Number of downstream turbines tested at a time, bounding the temporary memory.
+
+    Returns
+    -------
+    tuple of ndarray
+        rows (downstream turbine), cols (upstream turbine) and coefficient values.
+    """
+    rows, cols, vals = [], [], []
+    for start in range(0, x.size, chunk):
+        dx = x[start:start + chunk, np.newaxis] - x[np.newaxis, :]
+        dy = np.abs(y[start:start + chunk, np.newaxis] - y[np.newaxis, :])
+        wake_radius = radius + k * dx
+
+        i, j = np.nonzero((dx > 0.0) & (dx < max_length) & (dy < wake_radius))
+        rows.append(i + start)
+        cols.append(j)
+        vals.append((radius / wake_radius[i, j]) ** 2)
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+class WakeComp(om.ExplicitComponent):
+    """
+    Upstream velocity of every turbine in the farm from the free stream and the
+    linearly superposed wakes of the turbines upstream of it.
+
+    The deficit a turbine leaves behind, Vu - Vd, is written as 2 * (Vr - Vd) so that it
+    only depends on the actuator disc outputs.
+    """
+    def initialize(self):
+        self.options.declare('x', types=np.ndarray, desc='Streamwise turbine positions in m')
+        self.options.declare('y', types=np.ndarray, desc='Crosswise turbine positions in m')
+        self.options.declare('radius', default=1.784, desc='Rotor radius in m')
+        self.options.declare('k', default=0.05, desc='Wake expansion rate')
+        self.options.declare('max_length', default=np.inf, desc='Wake length cutoff in m')
+
+    def setup(self):
+        x = self.options['x']
+        nt = x.size
+
+        self.add_input('V_inf', 10.0, units="m/s", desc="Free stream velocity")
+        self.add_input('Vr', np.zeros(nt), units="m/s", desc="Velocity at each rotor exit plane")
+        self.add_input('Vd', np.zeros(nt), units="m/s", desc="Slipstream velocity of each turbine")
+
+        self.add_output('Vu', 10.0 * np.ones(nt), units="m/s",
+                        desc="Velocity upstream of each turbine")
+
+        rows, cols, coeffs = wake_coefficients(x, self.options['y'], self.options['radius'],
+                                               self.options['k'], self.options['max_length'])
+        self._wake = (rows, cols, coeffs)
+
+        # The model is linear in the velocities, so every partial is constant.
+        self.declare_partials('Vu', 'V_inf', val=np.ones(nt), rows=np.arange(nt),
+                              cols=np.zeros(nt, dtype=int))
+        if rows.size > 0:
+            self.declare_partials('Vu', 'Vr', val=-2.0 * coeffs, rows=rows, cols=cols)
+            self.declare_partials('Vu', 'Vd', val=2.0 * coeffs, rows=rows, cols=cols)
+
+    def compute(self, inputs, outputs):
+        rows, cols, coeffs = self._wake
+
+        deficit = 2.0 * (inputs['Vr'] - inputs['Vd'])
+
+        Vu = inputs['V_inf'] * np.ones(self.options['x'].size)
+        np.subtract.at(Vu, rows, coeffs * deficit[cols])
+        outputs['Vu'] = Vu
+
+
+class WindFarm(om.Group):
+    """
+    Farm of actuator discs coupled through their wakes.
+
+    Every turbine state is an array over the turbines, and the wake coupling is
+    converged with a Newton solver on a sparse assembled Jacobian.
+    """
+    def initialize(self):
+        self.options.declare('x', types=np.ndarray, desc='Streamwise turbine positions in m')
+        self.options.declare('y', types=np.ndarray, desc='Crosswise turbine positions in m')
+        self.options.declare('radius', default=1.784, desc='Rotor radius in m')
+        self.options.declare('k', default=0.05, desc='Wake expansion rate')
+        self.options.declare('max_length', default=np.inf, desc='Wake length cutoff in m')
+
+    def setup(self):
+        x = self.options['x']
+        y = self.options['y']
+        nt = x.size
+        radius = self.options['radius']
+
+        self.add_subsystem('wake', WakeComp(x=x, y=y, radius=radius, k=self.options['k'],
+                                            max_length=self.options['max_length']),
+                           promotes_inputs=['V_inf'])
+        self.add_subsystem('turbines', ActuatorDisc(num_nodes=nt),
+                           promotes_inputs=['a', 'Area', 'rho'])
+
+        self.connect('wake.Vu', 'turbines.Vu')
+        self.connect('turbines.Vr', 'wake.Vr')
+        self.connect('turbines.Vd', 'wake.Vd')
+
+        self.add_subsystem('farm_power',
+                           om.ExecComp('P=sum(turbine_power)',
+                                       P={'units': 'W'},
+                                       turbine_power={'shape': nt, 'units': 'W'}),
+                           promotes_outputs=[('P', 'power')])
+        self.connect('turbines.power', 'farm_power.turbine_power')
+
+        # The coupling is linear in the velocities, so Newton converges in one iteration.
+        self.options['assembled_jac_type'] = 'csc'
+        newton = self.nonlinear_solver = om.NewtonSolver(solve_subsystems=False)
+        newton.options['maxiter'] = 10
+        newton.options['atol'] = 1e-10
+        newton.options['iprint'] = -1
+        self.linear_solver = om.DirectSolver(assemble_jac=True)
+
+        self.set_input_defaults('a', 0.3 * np.ones(nt))
+        self.set_input_defaults('Area', np.pi * radius ** 2, units='m**2')
+
+
+def build_farm(n_rows, n_cols, thrust_max=400.0, max_length=100.0):
+    """
+    Maximize farm power over the turbine induction factors, with a thrust limit per turbine.
+
+    Wakes are cut off after max_length (in m), so a turbine's wake only reaches the few
+    turbines right behind it, whatever the farm size. Through them it still reaches the
+    whole row of turbines downwind, so the number of colors grows with the depth of the
+    farm but not with its width.
+    """
+    x, y = grid_layout(n_rows, n_cols)
+
+    prob = om.Problem()
+    prob.model.add_subsystem('farm', WindFarm(x=x, y=y, max_length=max_length),
+                             promotes=['*'])
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options['optimizer'] = 'SLSQP'
+    prob.driver.options['disp'] = False
+
+    # Thrust constraints only couple turbines within a (finite) wake cone, so the total
+    # Jacobian is sparse and colors well. The dense objective row is handled by
+    # the bidirectional coloring OpenMDAO computes when the mode is left on 'auto'.
+    # The sparse LU leaves roundoff of about 1e-13 (relative) between turbines that do not
+    # interact, which the default tolerance would count as nonzeros.
+    prob.driver.declare_coloring(tol=1e-10)
+
+    prob.model.add_design_var('a', lower=0., upper=0.45)
+    prob.model.add_objective('power', ref=-1e3 * x.size)
+    prob.model.add_constraint('turbines.thrust', upper=thrust_max, ref=thrust_max)
+
+    return prob
+
+
+if __name__ == '__main__':
+
+    # The farm grows crosswind at a depth of 10 turbines, so the number of colors (linear
+    # solves per gradient) stays the same. The dense QP of SLSQP limits the optimization
+    # itself to the smaller farms.
+    for n_cols in [10, 40, 100, 400]:
+        prob = build_farm(10, n_cols)
+        prob.setup()
+        prob.set_val('V_inf', 10.0, units='m/s')
+        prob.set_val('rho', 1.225, units='kg/m**3')
+        prob.final_setup()
+
+        st = time.time()
+        coloring = dynamic_total_coloring(prob.driver, run_model=True)
+        coloring_time = time.time() - st
+
+        # The first call sets up the colored total jacobian.
+        prob.driver._compute_totals()
+        st = time.time()
+        prob.driver._compute_totals()
+        gradient_time = time.time() - st
+
+        line = '%d turbines: %d colors (found in %.2f s), %.4f s per gradient' % (
+            10 * n_cols, coloring.total_solves(), coloring_time, gradient_time)
+        if n_cols <= 40:
+            st = time.time()
+            prob.run_driver()
+            line += ', optimization %.3f s, farm power %.1f kW' % (
+                time.time() - st, prob.get_val('power', units='kW')[0])
+        print(line)